@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 from docx import Document
 from docx.shared import Pt, Cm
 from docx.oxml.ns import qn
@@ -7,9 +6,12 @@ from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.enum.section import WD_ORIENT
 import random
 import io
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from google.oauth2 import service_account
+import time
+
+import drive_client
+from artifact_store import ArtifactStore
+from drive_cache import DriveCache
+from drive_sync import DriveMirror
 
 # 主題設定
 st.set_page_config(page_title="試卷生成器", page_icon="📄", layout="wide")
@@ -17,37 +19,32 @@ st.set_page_config(page_title="試卷生成器", page_icon="📄", layout="wide"
 # Google Drive 資料夾 ID
 ROOT_FOLDER_ID = '17Bcgo8ZeHz0yVhfIxBk7L2wzoiZcyoXt'
 
-# 建立 Google Drive API 服務
-def create_drive_service():
-    service_account_info = st.secrets["service_account_json"]
-    credentials = service_account.Credentials.from_service_account_info(
-        service_account_info,
-        scopes=['https://www.googleapis.com/auth/drive.readonly']
-    )
-    return build('drive', 'v3', credentials=credentials)
-
-# 遞迴列出指定資料夾內的檔案
-def list_files(service, folder_id):
-    query = f"'{folder_id}' in parents and trashed=false"
-    result = service.files().list(q=query, fields='files(id, name, mimeType)').execute()
-    return result.get('files', [])
-
-# 批量下載檔案為二進位格式
-def download_files(service, file_ids):
-    files_content = {}
-    for file_id in file_ids:
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-        fh.seek(0)
-        files_content[file_id] = fh
-    return files_content
+# 建立 Google Drive 授權連線（整個伺服器行程共用，不會在每次重新執行時重建）
+@st.cache_resource
+def create_drive_session():
+    return drive_client.create_session(dict(st.secrets["service_account_json"]))
+
+# 已下載題庫的本機快取（依檔案 ID，以 md5Checksum 驗證）
+@st.cache_resource
+def get_drive_cache():
+    return DriveCache()
+
+# 題庫資料夾樹的本機鏡像，由背景執行緒以 Changes API 增量同步
+@st.cache_resource
+def get_drive_mirror(_session):
+    mirror = DriveMirror(ROOT_FOLDER_ID)
+    if not mirror.ready:
+        mirror.full_sync(_session)
+    mirror.start(_session)
+    return mirror
+
+# 生成的試卷暫存於磁碟，Session State 只保存代號
+@st.cache_resource
+def get_artifact_store():
+    return ArtifactStore()
 
 # 生成試卷
-def generate_exam(file_contents, class_name, exam_type, subject, num_hard_questions):
+def generate_exam(bank_frames, class_name, exam_type, subject, num_hard_questions):
     exam_papers = {}
 
     for paper_type in ["A卷", "B卷"]:
@@ -80,8 +77,7 @@ def generate_exam(file_contents, class_name, exam_type, subject, num_hard_questi
         difficulty_counts = {'難': 0, '中': 0, '易': 0}
         total_questions = 0  # 用於計算總題目數
 
-        for file_id, file_content in file_contents.items():
-            df = pd.read_excel(file_content, engine='openpyxl')
+        for file_id, df in bank_frames.items():
             random.seed(1 if paper_type == "A卷" else 2)
 
             # 優先抽取難題
@@ -152,7 +148,8 @@ def generate_exam(file_contents, class_name, exam_type, subject, num_hard_questi
     return exam_papers
 
 # 主程式
-service = create_drive_service()
+session = create_drive_session()
+mirror = get_drive_mirror(session)
 st.markdown("## 📋 志兵考卷雲端出題設定")
 class_name = st.text_input("班級名稱", value="113-X", help="請輸入班級名稱，例如：113-1")
 exam_type = st.selectbox("考試類型", ["期中", "期末"], help="選擇期中或期末考試")
@@ -161,42 +158,48 @@ num_hard_questions = st.number_input("選擇難題數量", min_value=0, max_valu
 
 if subject and subject != "請選擇":
     st.markdown(f"### 已選科目：{subject}")
-    folders = list_files(service, ROOT_FOLDER_ID)
-    subject_folder = next((folder for folder in folders if folder['name'] == subject), None)
+    subject_folder = mirror.find_child(ROOT_FOLDER_ID, subject)
 
     if subject_folder:
-        topic_files = list_files(service, subject_folder['id'])
-        topic_options = {file['name']: file['id'] for file in topic_files if file['mimeType'] == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
+        topic_files = mirror.children(subject_folder['id'])
+        topic_options = {file['name']: file for file in topic_files if file['mimeType'] == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
 
         if topic_options:
             selected_files = st.multiselect("選擇題庫檔案（限 6 個）", options=list(topic_options.keys()))
 
             if len(selected_files) == 6 and st.button("生成考卷"):
-                selected_file_ids = [topic_options[name] for name in selected_files]
                 st.info("正在生成試卷，請稍候...")
 
-                # 批量下載題庫
-                file_contents = download_files(service, selected_file_ids)
+                # 先套用最新的變動取得各檔 md5Checksum，只下載內容有變動的題庫
+                download_start = time.time()
+                mirror.sync(session)
+                selected_metas = [mirror.get(topic_options[name]['id']) or topic_options[name] for name in selected_files]
+                bank_frames, downloaded = get_drive_cache().fetch(session, selected_metas)
+                st.caption(f"題庫載入耗時：{time.time() - download_start:.2f} 秒（下載 {downloaded} 個檔案）")
 
                 # 生成考卷
-                exam_papers = generate_exam(file_contents, class_name, exam_type, subject, num_hard_questions)
+                exam_papers = generate_exam(bank_frames, class_name, exam_type, subject, num_hard_questions)
                 st.success("試卷生成完成！")
 
-                if "download_links" not in st.session_state:
-                    st.session_state.download_links = {}
-
-                st.session_state.download_links = {
-                    paper_type: file_data for paper_type, file_data in exam_papers.items()
-                }
-
-        if "download_links" in st.session_state:
-            for paper_type, file_data in st.session_state.download_links.items():
-                st.download_button(
-                    label=f"下載 {paper_type}",
-                    data=file_data,
-                    file_name=f"{class_name}_{exam_type}_{subject}_{paper_type}.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                )
+                st.session_state.download_handle = get_artifact_store().put(exam_papers)
+
+        if st.session_state.get("download_handle"):
+            store = get_artifact_store()
+            handle = st.session_state.download_handle
+            paper_types = store.names(handle)
+            if paper_types is None:
+                st.session_state.download_handle = None
+                st.warning("試卷已超過保存時間，請重新生成。")
+            else:
+                # 下載按鈕的內容每次重新執行都會整份讀入伺服器記憶體，一次只提供選取的一卷
+                paper_type = st.selectbox("選擇要下載的試卷", paper_types, key="download_choice")
+                with store.open(handle, paper_type) as file_data:
+                    st.download_button(
+                        label=f"下載 {paper_type}",
+                        data=file_data,
+                        file_name=f"{class_name}_{exam_type}_{subject}_{paper_type}.docx",
+                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                    )
         else:
             st.warning("未找到任何題庫檔案，請確認資料夾內容！")
     else:
@@ -1,17 +1,33 @@
 import streamlit as st
 import pandas as pd
-from docx import Document
-from docx.shared import Pt, Cm
-from docx.oxml.ns import qn
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.enum.section import WD_ORIENT
-import random
-import io
 import time
 
+from batch import MIME_TYPES
+from exam_engine import STUDENT_ARCHIVE, ExamConfig
+from grading import MANIFEST_NAME, grade
+from instrumentation import enable_logging
+from job_queue import DONE, FAILED, QUEUED, JobQueue
+from question_bank import load_bank
+
 # 主題設定
 st.set_page_config(page_title="試卷生成器", page_icon="📄", layout="wide")
 
+# 各階段耗時以結構化 log 輸出，方便比對哪個題庫或階段是瓶頸
+enable_logging()
+
+
+# 產生試卷在背景工作行程中執行，整個伺服器共用一個佇列
+@st.cache_resource
+def get_job_queue():
+    return JobQueue()
+
+
+def download_expired():
+    """試卷暫存已過期（或已被清除）：清除代號並提示重新生成。"""
+    st.session_state.exam_handle = None
+    st.warning("⚠️ 試卷已超過保存時間，請重新生成。")
+
+
 # 頁面標題與簡介
 st.markdown("""
 # 📄 志兵班試卷生成器WEB UI
@@ -41,6 +57,38 @@ with col1:
     # 新增列印學生考卷版本功能
     print_student_version = st.checkbox("✅列印學生考卷版本[※刪除答案與難度]", value=False)
 
+    # 另外輸出只有答案的檔案，方便閱卷
+    print_answer_key = st.checkbox("✅另外輸出答案卷檔案", value=False)
+
+    # 大梯次可一次產生多份互不重複的卷別
+    num_variants = st.number_input("卷別數量", min_value=2, max_value=26, value=2, step=1, help="A 卷、B 卷之外可再產生 C、D… 卷，各卷題目互不重複")
+
+    # 整體求解題數：題庫不足時直接指出哪個限制無法滿足，而不是少出題
+    use_solver = st.checkbox("🧮 精確控制總題數與難題數（整體求解）", value=False)
+
+    # 近似重複的題目每卷最多一題；相容模式預設不檢查，抽題結果與舊版相同
+    use_dedupe = st.checkbox("🧹 同一份試卷不出現近似重複的題目", value=use_solver,
+                             help="開啟後重複的題目會改抽其他題目，抽題結果將與舊版不同")
+
+    # 跨班級避免重複出題：排除其他班級一年內用過的題目，並記錄本次出題
+    use_history = st.checkbox("📚 避免使用其他班級近一年出過的題目", value=False)
+
+    # PDF 不需再以 Word 轉檔即可直接列印
+    output_format = st.selectbox("輸出格式", ["docx", "pdf"], format_func=lambda fmt: {"docx": "Word（DOCX）", "pdf": "PDF（直接列印）"}[fmt])
+
+    # 各卷選項順序不同，答案不再集中在題庫原本偏多的選項
+    shuffle_options = st.checkbox("🔀 各卷重排選項順序", value=False)
+
+    # 防弊：每位考生的題序與選項順序都不同，各卷答案另附 CSV
+    num_students = st.number_input("每位考生一份試卷（考生人數，0 為不使用）", min_value=0, max_value=1000, value=0, step=1,
+                                   help="只抽一份題目，依人數輸出題序與選項順序各不相同、附試卷編號的學生版試卷（ZIP）")
+
+    # A3 橫式雙欄：題目不跨欄、不跨頁，節省紙張
+    two_columns = st.checkbox("📰 A3 橫式雙欄排版", value=False)
+
+    # 效能分析（cProfile）會拖慢生成速度，僅供排查問題時使用
+    enable_profiling = st.checkbox("🔬 啟用效能分析（cProfile）", value=False)
+
 with col2:
     st.markdown("## 📤 上傳題庫")
     st.markdown("請上傳 **6 個 Excel 文件**，每個文件代表一個題庫")
@@ -53,269 +101,139 @@ if uploaded_files:
     else:
         st.subheader("檢查上傳文件頭部（前5行）")
         for i, file in enumerate(uploaded_files):
-            df = pd.read_excel(file)
             st.write(f"檔案 {i+1} 的頭部：")
-            st.write(df.head())
-
-# 初始化 Session State 中的緩存
-if "exam_papers" not in st.session_state:
-    st.session_state.exam_papers = {}
+            try:
+                _, bank = load_bank(file)
+                st.write(bank.head())
+            except Exception as e:
+                st.error(f"檔案 {i+1} 格式錯誤：{str(e)}")
 
-# 建立一個全域列表，用來記錄各題庫中 A 卷和 B 卷已抽取題目的原始索引
-used_indices = [set() for _ in range(len(uploaded_files))]
+# Session State 只保存結果代號，試卷內容留在磁碟上，下載時才讀取
+if "exam_handle" not in st.session_state:
+    st.session_state.exam_handle = None
 
 # 分隔線
 st.divider()
 
 if uploaded_files and len(uploaded_files) == 6:
     if st.button("✨ 開始生成試卷"):
-        start_time = time.time()  # 記錄開始時間
-
-        # 各題庫總抽題分配（總題數 50 題）
-        total_distribution = [9, 9, 8, 8, 8, 8]
-
-        # A 卷較偏難，設定較高難題數分配
-        A_hard_distribution = [4, 3, 3, 3, 3, 3]
-        # B 卷較偏易，設定較低難題數分配
-        B_hard_distribution = [2, 2, 2, 2, 2, 2]
-
-        # 用於保存選取的題目索引，確保學生版本與標準版本一致
-        selected_indices = {"A卷": [], "B卷": []}
-
-        # 定義生成試卷的函式
-        def generate_exam(paper_type, total_distribution, hard_distribution, student_version=False):
-            doc = Document()
-
-            # 設置頁面大小與邊距
-            section = doc.sections[-1]
-            section.page_height, section.page_width = Cm(42.0), Cm(29.7)
-            section.orientation = WD_ORIENT.LANDSCAPE
-            section.top_margin = section.bottom_margin = Cm(1.5 / 2.54)
-            section.left_margin = section.right_margin = Cm(2 / 2.54)
-
-            # 添加標題
-            header_para = doc.add_paragraph()
-            header_run = header_para.add_run(f"海巡署教育訓練測考中心{class_name}梯志願士兵司法警察專長班{exam_type}測驗階段考試（{subject}{paper_type}）")
-            header_run.font.name = '標楷體'
-            header_run.font.size = Pt(20)
-            header_run._element.rPr.rFonts.set(qn('w:eastAsia'), '標楷體')
-            header_para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-            # 添加考試信息
-            exam_info_para = doc.add_paragraph("選擇題：100％（共50題，每題2分）")
-            exam_info_para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-            for run in exam_info_para.runs:
-                run.font.name = '標楷體'
-                run.font.size = Pt(16)
-                run._element.rPr.rFonts.set(qn('w:eastAsia'), '標楷體')
-
-            question_number = 1  # 全卷題號起始值
-            difficulty_counts = {'難': 0, '中': 0, '易': 0}
-            answer_key = []
+        config = ExamConfig(
+            class_name=class_name,
+            exam_type=exam_type,
+            subject=subject,
+            show_answers=show_answers,
+            student_version=print_student_version,
+            answer_key=print_answer_key,
+            n_variants=num_variants,
+            solver=use_solver,
+            usage_history=use_history,
+            dedupe=use_dedupe,
+            output_format=output_format,
+            columns=2 if two_columns else 1,
+            shuffle_options=shuffle_options,
+            students=num_students,
+            # 使用紀錄依科目與題庫檔名識別題庫，重新存檔或修改題目後紀錄仍有效
+            bank_names=tuple(file.name for file in uploaded_files),
+        )
+        try:
+            # 題庫依內容雜湊只匯入一次，工作只帶雜湊值，由工作行程直接開啟已匯入的題庫
+            digests = [load_bank(file)[0] for file in uploaded_files]
+        except Exception as e:
+            st.error(str(e))
+            st.stop()
+        st.session_state.exam_handle = None
+        st.session_state.job_config = config
+        st.session_state.job_id = get_job_queue().submit(digests, config, profile=enable_profiling)
+
+# 背景工作進度：未完成時每秒重新整理頁面
+if st.session_state.get("job_id"):
+    job_queue = get_job_queue()
+    job = job_queue.status(st.session_state.job_id)
+    if job is None:
+        st.session_state.job_id = None
+    elif job["status"] == DONE:
+        st.session_state.exam_handle = job["id"]
+        st.session_state.job_id = None
+        # 耗時只計算實際產生的時間，排隊等候另外顯示
+        wait = job["started"] - job["created"]
+        st.success(f"🎉 試卷生成完成！耗時：{job['finished'] - job['started']:.2f} 秒"
+                   + (f"（排隊等候 {wait:.2f} 秒）" if wait >= 1 else ""))
+
+        # 各階段耗時明細
+        with st.expander("⏱️ 各階段耗時"):
+            timings = pd.DataFrame(job["timings"])
+            if not timings.empty:
+                st.write(timings.groupby("stage", sort=False)["seconds"].sum().rename("秒數").rename_axis("階段").reset_index())
+            st.write(timings)
+            if job["profile_report"]:
+                st.code(job["profile_report"])
+    elif job["status"] == FAILED:
+        st.session_state.job_id = None
+        st.error(job["error"])
+    else:
+        if job["status"] == QUEUED:
+            st.info(f"⏳ 排隊中，前面還有 {job['position']} 個工作")
+        else:
+            stage = job["stage"] or {}
+            st.info(f"⚙️ 生成中：{stage.get('stage', '準備中')}")
+        time.sleep(1)
+        # st.rerun 自 Streamlit 1.27 起才有，README 固定的 1.25 只有 experimental_rerun
+        (st.rerun if hasattr(st, "rerun") else st.experimental_rerun)()
 
-            # 如果是學生版本，使用標準版本的索引
-            if student_version and selected_indices[paper_type]:
-                all_selected_questions = pd.DataFrame()
-                for i, file in enumerate(uploaded_files):
-                    file.seek(0)
-                    df = pd.read_excel(file)
-                    
-                    if len(df.columns) < 5:
-                        st.error(f"檔案 {i+1} 的列數不足，請確保題庫格式正確！")
-                        return None
-                    
-                    expected_columns = ['序號', '難度', '答案', '題目', '選項1', '選項2', '選項3', '選項4']
-                    current_columns = df.columns.tolist()
-                    mapping = {}
-                    for expected in expected_columns:
-                        for current in current_columns:
-                            if expected.lower().strip() in current.lower().strip():
-                                mapping[current] = expected
-                    
-                    df = df.rename(columns=mapping)
-                    missing = [col for col in expected_columns if col not in df.columns]
-                    if missing:
-                        st.error(f"檔案 {i+1} 缺少必要欄位：{missing}")
-                        return None
-                    
-                    df = df.dropna(subset=['題目', '答案'])
-                    selected_questions = df.loc[df.index.isin(selected_indices[paper_type])]
-                    all_selected_questions = pd.concat([all_selected_questions, selected_questions])
+# 顯示下載按鈕
+if st.session_state.exam_handle:
+    downloads = get_job_queue().downloads
+    handle = st.session_state.exam_handle
+    paper_types = downloads.names(handle)
+    if paper_types is None:
+        download_expired()
+    else:
+        st.markdown("## 📥 下載試卷")
+        job_config = st.session_state.job_config
+        # 結果可能在這次檢查之後才過期被刪除，讀取檔案時再處理一次
+        try:
+            if job_config.students:
+                # 每位考生一份試卷時只有一個已打包好的 ZIP
+                with downloads.open(handle, STUDENT_ARCHIVE) as file_data:
+                    st.download_button(
+                        label=f"下載學生卷（{job_config.students} 份，ZIP）",
+                        data=file_data,
+                        file_name=job_config.file_name(f"學生卷{job_config.students}份", ".zip"),
+                        mime="application/zip",
+                    )
             else:
-                # 逐一處理每個題庫，生成標準版本
-                all_selected_questions = pd.DataFrame()
-                for i, file in enumerate(uploaded_files):
-                    file.seek(0)
-                    
-                    try:
-                        df = pd.read_excel(file)
-                        
-                        if len(df.columns) < 5:
-                            st.error(f"檔案 {i+1} 的列數不足，請確保題庫格式正確！")
-                            return None
-                        
-                        expected_columns = ['序號', '難度', '答案', '題目', '選項1', '選項2', '選項3', '選項4']
-                        current_columns = df.columns.tolist()
-                        mapping = {}
-                        for expected in expected_columns:
-                            for current in current_columns:
-                                if expected.lower().strip() in current.lower().strip():
-                                    mapping[current] = expected
-                        
-                        df = df.rename(columns=mapping)
-                        missing = [col for col in expected_columns if col not in df.columns]
-                        if missing:
-                            st.error(f"檔案 {i+1} 缺少必要欄位：{missing}")
-                            return None
-                        
-                        df = df.dropna(subset=['題目', '答案'])
-                        
-                        if paper_type == "B卷":
-                            df = df[~df.index.isin(used_indices[i])]
-                        
-                        df['難度'] = df['難度'].astype(str).str.strip()
-                        df.loc[~df['難度'].isin(['難', '中', '易']), '難度'] = '中'
-                        
-                        df['答案'] = df['答案'].astype(str).str.strip()
-                        df.loc[~df['答案'].isin(['1', '2', '3', '4']), '答案'] = '1'
-                        
-                        seed_shuffle = i + (100 if paper_type == "A卷" else 200)
-                        df = df.sample(frac=1, random_state=seed_shuffle)
-
-                        total_needed = total_distribution[i]
-                        desired_hard = hard_distribution[i]
-                        random_seed = (1 if paper_type == "A卷" else 2) + i
-
-                        df_hard = df[df['難度'] == '難']
-                        df_medium = df[df['難度'] == '中']
-                        df_easy = df[df['難度'] == '易']
-
-                        if paper_type == "A卷":
-                            n_hard_to_select = min(desired_hard, len(df_hard))
-                            additional_hard = df_hard.sample(n=n_hard_to_select, random_state=random_seed) if n_hard_to_select > 0 else pd.DataFrame()
-                            
-                            remaining = total_needed - len(additional_hard)
-                            df_remaining = df[~df.index.isin(additional_hard.index)]
-                            n_remaining_to_select = min(remaining, len(df_remaining))
-                            additional_questions = df_remaining.sample(n=n_remaining_to_select, random_state=random_seed) if n_remaining_to_select > 0 else pd.DataFrame()
-                            
-                            selected_questions = pd.concat([additional_hard, additional_questions]).sample(frac=1, random_state=random_seed)
-                            selected_indices["A卷"].extend(selected_questions.index.tolist())
-                            used_indices[i].update(selected_questions.index.tolist())
-                        else:
-                            n_hard_to_select = min(B_hard_distribution[i], len(df_hard))
-                            additional_hard = df_hard.sample(n=n_hard_to_select, random_state=random_seed) if n_hard_to_select > 0 else pd.DataFrame()
-                            
-                            remaining = total_needed - len(additional_hard)
-                            df_remaining = df[~df.index.isin(additional_hard.index)]
-                            n_easy_to_select = min(remaining, len(df_easy))
-                            additional_easy = df_easy.sample(n=n_easy_to_select, random_state=random_seed) if n_easy_to_select > 0 else pd.DataFrame()
-                            
-                            remaining_after_easy = remaining - len(additional_easy)
-                            df_final_remaining = df_remaining[~df_remaining.index.isin(additional_easy.index)]
-                            n_final_to_select = min(remaining_after_easy, len(df_final_remaining))
-                            additional_questions = df_final_remaining.sample(n=n_final_to_select, random_state=random_seed) if n_final_to_select > 0 else pd.DataFrame()
-                            
-                            selected_questions = pd.concat([additional_hard, additional_easy, additional_questions]).sample(frac=1, random_state=random_seed)
-                            selected_indices["B卷"].extend(selected_questions.index.tolist())
-
-                        all_selected_questions = pd.concat([all_selected_questions, selected_questions])
-
-                    except Exception as e:
-                        st.error(f"處理檔案 {i+1} 時發生錯誤: {str(e)}")
-                        return None
-
-            # 將選取的題目依序加入文件
-            for _, row in all_selected_questions.iterrows():
-                answer = row['答案']
-                question_text = row['題目']
-                options = [row['選項1'], row['選項2'], row['選項3'], row['選項4']]
-                difficulty = row['難度']
-                
-                cleaned_options = [str(opt).strip() for opt in options]
-                options_text = "".join([f"({i+1}){opt}" for i, opt in enumerate(cleaned_options)])
-
-                answer_key.append((question_number, answer))
-                
-                if student_version:
-                    question_para = doc.add_paragraph(f"(){question_number}、{question_text} {options_text}")
+                # st.download_button 每次重新執行都會把內容整份讀入伺服器記憶體，因此一次只提供
+                # 選取的一個檔案；全部試卷的 ZIP 也只在選取時才建立
+                all_papers = "全部試卷（ZIP）"
+                choice = st.selectbox("選擇要下載的檔案", paper_types + [all_papers], key="download_choice")
+                if choice == all_papers:
+                    path = downloads.zip_path(handle, job_config.file_name)
+                    file_name, mime = job_config.file_name("試卷", ".zip"), "application/zip"
                 else:
-                    if show_answers:
-                        question_para = doc.add_paragraph(f"（{answer}）{question_number}、{question_text} {options_text}（{difficulty}）")
-                    else:
-                        question_para = doc.add_paragraph(f"{question_number}、{question_text} {options_text}（{difficulty}）")
-                
-                paragraph_format = question_para.paragraph_format
-                paragraph_format.left_indent = Cm(0)
-                paragraph_format.right_indent = Cm(0)
-                paragraph_format.hanging_indent = Pt(8 * 0.35)
-                paragraph_format.space_after = Pt(0)
-                paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-                for run in question_para.runs:
-                    run.font.name = '標楷體'
-                    run.font.size = Pt(16)
-                    run._element.rPr.rFonts.set(qn('w:eastAsia'), '標楷體')
-                
-                if not student_version:
-                    difficulty_counts[difficulty] += 1
-                question_number += 1
-
-            if not student_version:
-                summary_text = f"難：{difficulty_counts['難']}，中：{difficulty_counts['中']}，易：{difficulty_counts['易']}"
-                summary_para = doc.add_paragraph(summary_text)
-                summary_para.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-            
-            if not student_version and not show_answers:
-                doc.add_page_break()
-                answer_title = doc.add_paragraph()
-                answer_title.add_run(f"{subject}{paper_type} 答案卷").bold = True
-                answer_title.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-                
-                answers_per_row = 5
-                num_rows = (len(answer_key) + answers_per_row - 1) // answers_per_row
-                
-                for row in range(num_rows):
-                    answer_row = doc.add_paragraph()
-                    for col in range(answers_per_row):
-                        idx = row * answers_per_row + col
-                        if idx < len(answer_key):
-                            q_num, ans = answer_key[idx]
-                            answer_row.add_run(f"{q_num}. {ans}     ")
-                    answer_row.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-
-            buffer = io.BytesIO()
-            doc.save(buffer)
-            buffer.seek(0)
-            return buffer.getvalue()
-
-        # 生成標準版本和學生版本
-        standard_A = generate_exam("A卷", total_distribution, A_hard_distribution, student_version=False)
-        standard_B = generate_exam("B卷", total_distribution, B_hard_distribution, student_version=False)
-
-        if print_student_version:
-            # 生成學生版本，使用相同的題目索引
-            student_A = generate_exam("A卷", total_distribution, A_hard_distribution, student_version=True)
-            student_B = generate_exam("B卷", total_distribution, B_hard_distribution, student_version=True)
-
-            st.session_state.exam_papers["A卷"] = standard_A
-            st.session_state.exam_papers["B卷"] = standard_B
-            st.session_state.exam_papers["學生A卷"] = student_A
-            st.session_state.exam_papers["學生B卷"] = student_B
+                    path = downloads.path(handle, choice)
+                    file_name = job_config.file_name(choice)
+                    mime = MIME_TYPES["csv" if choice == MANIFEST_NAME else job_config.output_format]
+                with open(path, "rb") as file_data:
+                    st.download_button(label=f"下載 {choice}", data=file_data, file_name=file_name, mime=mime)
+        except FileNotFoundError:
+            download_expired()
+
+# 批次閱卷：以產生試卷時的答案資料比對所有考生的作答
+st.divider()
+with st.expander("📝 批次閱卷"):
+    st.markdown("上傳產生試卷時附帶的 **答案資料 CSV**，以及作答 CSV（「試卷編號」欄加上以題號 1、2… 為名的作答欄）")
+    manifest_file = st.file_uploader("答案資料", type=["csv"], key="grading_manifest")
+    sheets_file = st.file_uploader("作答", type=["csv"], key="grading_sheets")
+    if manifest_file and sheets_file:
+        try:
+            scores = grade(sheets_file, manifest_file)
+        except ValueError as e:
+            st.error(f"閱卷失敗：{e}")
         else:
-            st.session_state.exam_papers["A卷"] = standard_A
-            st.session_state.exam_papers["B卷"] = standard_B
-
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-        st.success(f"🎉 試卷生成完成！耗時：{elapsed_time:.2f} 秒")
-
-# 顯示下載按鈕
-if "exam_papers" in st.session_state and st.session_state.exam_papers:
-    st.markdown("## 📥 下載試卷")
-    for paper_type, file_data in st.session_state.exam_papers.items():
-        st.download_button(
-            label=f"下載 {paper_type}",
-            data=file_data,
-            file_name=f"{class_name}_{exam_type}_{subject}_{paper_type}.docx",
-            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        )
+            st.write(scores)
+            st.download_button(
+                label="下載成績（CSV）",
+                data=scores.to_csv(index=False).encode("utf-8-sig"),
+                file_name="成績.csv",
+                mime=MIME_TYPES["csv"],
+            )
@@ -0,0 +1,111 @@
+"""已產生試卷的快取：以題庫內容雜湊與所有產生參數為鍵，相同請求直接取回 DOCX。
+
+抽題在相同題庫與設定下結果固定（相容模式的亂數種子由題庫序與卷別推得），因此
+不同使用者以相同題庫與設定產生試卷時，只有第一次需要實際抽題與排版。
+結果依原樣打包為 ZIP 存在目錄中，超過容量時依最近使用時間淘汰。
+"""
+import dataclasses
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zipfile
+
+import batch
+import exam_pdf
+
+ARTIFACT_CACHE_DIR = os.environ.get('EXAM_ARTIFACT_CACHE', os.path.join(tempfile.gettempdir(), 'exam_artifacts'))
+ARTIFACT_CACHE_BYTES = 512 * 1024 * 1024
+# 抽題或排版方式改變、使相同設定產生不同試卷時遞增，讓舊的快取失效
+ARTIFACT_VERSION = 3
+# 不影響結果的設定（題庫名稱只用於使用紀錄，開啟使用紀錄時本來就不快取）
+_IGNORED_FIELDS = ('max_workers', 'bank_names')
+
+_cache_lock = threading.Lock()
+
+
+def _font_signature():
+    """PDF 字型來源的識別：字型檔的路徑、大小與修改時間，換用或更新字型後快取鍵即不同。"""
+    source = exam_pdf.font_source()
+    if source == exam_pdf.FALLBACK_FONT:
+        return [source]
+    stat = os.stat(source)
+    return [source, stat.st_size, stat.st_mtime_ns]
+
+
+def artifact_key(bank_digests, config):
+    """回傳快取鍵；結果不固定的設定（使用紀錄、未指定種子的整體求解）回傳 None。"""
+    if config.usage_history or (config.solver and config.seed is None):
+        return None
+    if any(digest is None for digest in bank_digests):
+        return None
+    fields = {name: value for name, value in dataclasses.asdict(config).items() if name not in _IGNORED_FIELDS}
+    payload = {'version': ARTIFACT_VERSION, 'banks': list(bank_digests), 'config': fields}
+    if config.output_format == 'pdf':
+        # PDF 內嵌的字型依主機上的字型檔而定，設定相同但字型不同時內容也不同
+        payload['font'] = _font_signature()
+    # tuple 與 list 序列化後相同，網頁與背景工作（由 JSON 還原設定）會得到相同的鍵
+    payload = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ArtifactCache:
+    """目錄中每個快取鍵對應一個 <鍵>.zip（batch.zip_papers 格式）。"""
+
+    def __init__(self, cache_dir=None, max_bytes=ARTIFACT_CACHE_BYTES):
+        self.cache_dir = cache_dir or ARTIFACT_CACHE_DIR
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.zip")
+
+    def get(self, key):
+        """回傳 {名稱: DOCX bytes}；不存在時回傳 None。"""
+        path = self._path(key)
+        try:
+            with zipfile.ZipFile(path) as archive:
+                papers = {name: archive.read(name) for name in archive.namelist()}
+            # 以修改時間記錄最近使用時間，供 LRU 淘汰
+            os.utime(path)
+        except (OSError, zipfile.BadZipFile):
+            return None
+        return papers
+
+    def put(self, key, papers):
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(batch.zip_papers(papers))
+            # 同時產生相同試卷時後寫入者直接覆蓋，內容相同
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            # 寫入失敗（例如磁碟已滿）時不留下暫存檔
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        with _cache_lock:
+            self.evict()
+
+    def evict(self):
+        """總大小超過容量時刪除最久未使用的試卷。"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.zip'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort(reverse=True)
+        total = 0
+        for _, size, name in entries:
+            total += size
+            if total > self.max_bytes:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
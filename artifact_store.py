@@ -0,0 +1,122 @@
+"""產生好的試卷暫存於磁碟，Session State 只保存代號，下載時直接從檔案讀取。
+
+每次產生的結果存成 <代號>/ 目錄（各試卷一個檔案與 manifest.json），讀取時更新目錄
+修改時間；超過 ARTIFACT_TTL 秒未使用的結果在下次寫入時刪除。Session State 不再
+保存試卷內容；st.download_button 仍會將提供下載的檔案整份讀入記憶體，網頁介面因此
+一次只提供使用者選取的一個檔案，全部打包的 ZIP 也只在選取時才建立。
+"""
+import functools
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+
+ARTIFACT_STORE_DIR = os.environ.get('EXAM_ARTIFACT_STORE', os.path.join(tempfile.gettempdir(), 'exam_downloads'))
+# 暫存結果保留的秒數（自最後一次使用起算）
+ARTIFACT_TTL = 6 * 60 * 60
+
+
+class ArtifactStore:
+    def __init__(self, store_dir=None, ttl=ARTIFACT_TTL):
+        self.store_dir = store_dir or ARTIFACT_STORE_DIR
+        self.ttl = ttl
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def _dir(self, handle):
+        return os.path.join(self.store_dir, handle)
+
+    def put(self, papers, handle=None):
+        """保存 {名稱: bytes}，回傳代號。先寫入暫存目錄再改名，讀取端不會看到寫到一半的結果。"""
+        def write(fh, data):
+            fh.write(data)
+        return self._put(((name, functools.partial(write, data=data)) for name, data in papers.items()), handle)
+
+    def put_stream(self, name, write, handle=None):
+        """以 write(檔案物件) 直接將單一結果寫入磁碟（例如逐份寫入的大型 ZIP），回傳代號。"""
+        return self._put([(name, write)], handle)
+
+    def _put(self, writers, handle):
+        handle = handle or uuid.uuid4().hex
+        tmp = tempfile.mkdtemp(dir=self.store_dir, suffix='.tmp')
+        names = []
+        try:
+            for i, (name, write) in enumerate(writers):
+                # 名稱可能含使用者輸入的班級名稱，檔名只用序號
+                with open(os.path.join(tmp, f"{i}.bin"), 'wb') as fh:
+                    write(fh)
+                names.append(name)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        with open(os.path.join(tmp, 'manifest.json'), 'w', encoding='utf-8') as fh:
+            json.dump({'names': names}, fh, ensure_ascii=False)
+        shutil.rmtree(self._dir(handle), ignore_errors=True)
+        os.replace(tmp, self._dir(handle))
+        self.cleanup()
+        return handle
+
+    def names(self, handle):
+        """回傳代號內的試卷名稱；已過期或不存在時回傳 None。"""
+        try:
+            with open(os.path.join(self._dir(handle), 'manifest.json'), encoding='utf-8') as fh:
+                names = json.load(fh)['names']
+            os.utime(self._dir(handle))
+        except (OSError, ValueError, KeyError):
+            return None
+        return names
+
+    def _existing_names(self, handle):
+        names = self.names(handle)
+        if names is None:
+            raise FileNotFoundError(f"暫存結果 {handle} 已過期或不存在")
+        return names
+
+    def path(self, handle, name):
+        """一份試卷的檔案路徑；代號已過期或沒有這份試卷時拋出 FileNotFoundError。"""
+        names = self._existing_names(handle)
+        if name not in names:
+            raise FileNotFoundError(f"暫存結果 {handle} 中沒有 {name}")
+        return os.path.join(self._dir(handle), f"{names.index(name)}.bin")
+
+    def open(self, handle, name):
+        """以檔案物件開啟一份試卷，供 st.download_button 直接讀取。"""
+        return open(self.path(handle, name), 'rb')
+
+    def read_all(self, handle):
+        """讀回 {名稱: bytes}（命令列與測試使用）。"""
+        papers = {}
+        for name in self._existing_names(handle):
+            with self.open(handle, name) as fh:
+                papers[name] = fh.read()
+        return papers
+
+    def zip_path(self, handle, file_name=None):
+        """將代號內的所有試卷打包成 ZIP 並回傳路徑，只在第一次需要時建立。
+
+        file_name 將試卷名稱對應為 ZIP 內的檔名（例如 ExamConfig.file_name）。
+        代號已過期時拋出 FileNotFoundError。
+        """
+        names = self._existing_names(handle)
+        path = os.path.join(self._dir(handle), 'all.zip')
+        if not os.path.exists(path):
+            fd, tmp = tempfile.mkstemp(dir=self._dir(handle), suffix='.tmp')
+            os.close(fd)
+            # DOCX 本身已壓縮，直接存入；逐檔從磁碟寫入，不需將全部內容讀入記憶體
+            with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_STORED) as archive:
+                for i, name in enumerate(names):
+                    archive.write(os.path.join(self._dir(handle), f"{i}.bin"), file_name(name) if file_name else name)
+            os.replace(tmp, path)
+        return path
+
+    def cleanup(self, now=None):
+        """刪除超過保留時間未使用的結果（包含寫到一半而中斷的暫存目錄）。"""
+        deadline = (now or time.time()) - self.ttl
+        for entry in os.scandir(self.store_dir):
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < deadline:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                continue
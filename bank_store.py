@@ -0,0 +1,228 @@
+import json
+import os
+import struct
+import tempfile
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# 題庫欄式二進位格式（.qbank）
+#
+#   MAGIC | 標頭長度 (uint32 LE) | JSON 標頭 | 各欄位陣列（每段 8 位元組對齊）
+#
+# 難度與答案存為 uint8 代碼，文字欄位存為 UTF-8 位元組緩衝區加 int64 位移表，
+# 讀取時以 mmap 直接映射，多個行程可共用作業系統的 page cache。
+MAGIC = b'QBANK\x01\r\n'
+FORMAT_VERSION = 1
+
+DIFFICULTY_CODES = {'難': 0, '中': 1, '易': 2}
+DIFFICULTY_LABELS = np.array(['難', '中', '易'], dtype=object)
+ANSWER_LABELS = np.array(['', '1', '2', '3', '4'], dtype=object)
+TEXT_COLUMNS = ['序號', '題目', '選項1', '選項2', '選項3', '選項4']
+BANK_COLUMNS = ['序號', '難度', '答案', '題目', '選項1', '選項2', '選項3', '選項4']
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def cell_text(value):
+    # 空白欄位存為空字串；整數被 Excel 讀成浮點數時去掉小數點
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def encode_strings(values):
+    """將字串序列編碼為 (offsets, data)。"""
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return offsets, data
+
+
+def group_positions(codes):
+    """代碼陣列 → {代碼: 該代碼所有列位置（遞增）}，一次排序即可建立。"""
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind='stable').astype(np.intp)
+    values, starts = np.unique(codes[order], return_index=True)
+    bounds = np.append(starts, len(order))
+    return {int(value): order[bounds[i]:bounds[i + 1]] for i, value in enumerate(values)}
+
+
+class StringColumn:
+    """以位移表索引的 UTF-8 字串欄位，只在取用時解碼。"""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def take(self, positions):
+        return [self[i] for i in positions]
+
+
+class CompactBank:
+    """欄式題庫，陣列可為一般 ndarray 或 mmap 映射。"""
+
+    def __init__(self, arrays, digest=None, path=None):
+        self.arrays = arrays
+        self.digest = digest
+        self.path = path
+        self.index = arrays['index']
+        self.difficulty = arrays['難度']
+        self.answer = arrays['答案']
+        self.text = {col: StringColumn(arrays[f'{col}.offsets'], arrays[f'{col}.data']) for col in TEXT_COLUMNS}
+        self._groups = {}
+        self._serials = None
+
+    def groups(self, column='難度'):
+        """依代碼欄位（難度，日後可加章節等）分組的列位置索引，首次取用時建立並保留在題庫上。"""
+        if column not in self._groups:
+            self._groups[column] = group_positions(self.arrays[column])
+        return self._groups[column]
+
+    def positions_of(self, serials):
+        """序號 → 列位置（遞增），序號對照表首次取用時建立。"""
+        if self._serials is None:
+            serial_column = self.text['序號']
+            self._serials = {}
+            for position in range(len(self)):
+                self._serials.setdefault(serial_column[position], []).append(position)
+        return np.array(sorted(p for serial in serials for p in self._serials.get(serial, ())), dtype=np.intp)
+
+    def __len__(self):
+        return len(self.index)
+
+    @classmethod
+    def from_frame(cls, df, digest=None):
+        """由 question_bank.normalize_bank 的結果建立。"""
+        arrays = {
+            'index': np.asarray(df.index, dtype=np.int64),
+            '難度': df['難度'].map(DIFFICULTY_CODES).to_numpy(dtype=np.uint8),
+            '答案': df['答案'].astype(int).to_numpy(dtype=np.uint8),
+        }
+        for col in TEXT_COLUMNS:
+            arrays[f'{col}.offsets'], arrays[f'{col}.data'] = encode_strings([cell_text(v) for v in df[col]])
+        return cls(arrays, digest=digest)
+
+    def take(self, positions):
+        """只將選中的列還原為標準欄位的 DataFrame（保留原始列索引）。"""
+        positions = np.asarray(positions, dtype=np.intp)
+        df = pd.DataFrame({
+            '序號': self.text['序號'].take(positions),
+            '難度': DIFFICULTY_LABELS[self.difficulty[positions]],
+            '答案': ANSWER_LABELS[self.answer[positions]],
+            '題目': self.text['題目'].take(positions),
+            '選項1': self.text['選項1'].take(positions),
+            '選項2': self.text['選項2'].take(positions),
+            '選項3': self.text['選項3'].take(positions),
+            '選項4': self.text['選項4'].take(positions),
+        }, index=pd.Index(self.index[positions]))
+        return df[BANK_COLUMNS]
+
+    def head(self, n=5):
+        return self.take(np.arange(min(n, len(self))))
+
+    def to_frame(self):
+        return self.take(np.arange(len(self)))
+
+
+class BankBuilder:
+    """逐列累積題庫欄位，直接建立 CompactBank 的陣列，不經過 DataFrame。"""
+
+    def __init__(self):
+        self._index = array('q')
+        self._difficulty = bytearray()
+        self._answer = bytearray()
+        self._offsets = {col: array('q', [0]) for col in TEXT_COLUMNS}
+        self._data = {col: bytearray() for col in TEXT_COLUMNS}
+
+    def __len__(self):
+        return len(self._index)
+
+    def append(self, index, difficulty, answer, texts):
+        """difficulty、answer 為代碼（DIFFICULTY_CODES、1-4），texts 依 TEXT_COLUMNS 順序。"""
+        self._index.append(index)
+        self._difficulty.append(difficulty)
+        self._answer.append(answer)
+        for col, text in zip(TEXT_COLUMNS, texts):
+            data = self._data[col]
+            data += text.encode('utf-8')
+            self._offsets[col].append(len(data))
+
+    def build(self, digest=None):
+        # 文字緩衝區直接共用，不再複製；build 之後不應再 append
+        arrays = {
+            'index': np.array(self._index, dtype=np.int64),
+            '難度': np.frombuffer(self._difficulty, dtype=np.uint8),
+            '答案': np.frombuffer(self._answer, dtype=np.uint8),
+        }
+        for col in TEXT_COLUMNS:
+            arrays[f'{col}.offsets'] = np.array(self._offsets[col], dtype=np.int64)
+            arrays[f'{col}.data'] = np.frombuffer(self._data[col], dtype=np.uint8)
+        return CompactBank(arrays, digest=digest)
+
+
+def write_bank(bank, path):
+    """將 CompactBank 寫入 .qbank 檔（先寫暫存檔再替換，避免其他行程讀到半份檔案）。"""
+    entries = {}
+    offset = 0
+    for name, arr in bank.arrays.items():
+        arr = np.ascontiguousarray(arr)
+        entries[name] = {'dtype': arr.dtype.str, 'offset': offset, 'length': int(arr.shape[0])}
+        offset = _align(offset + arr.nbytes)
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'rows': len(bank),
+        'digest': bank.digest,
+        'arrays': entries,
+    }, ensure_ascii=False).encode('utf-8')
+    data_start = _align(len(MAGIC) + 4 + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(MAGIC)
+            fh.write(struct.pack('<I', len(header)))
+            fh.write(header)
+            for name, arr in bank.arrays.items():
+                fh.seek(data_start + entries[name]['offset'])
+                fh.write(np.ascontiguousarray(arr).tobytes())
+            fh.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def open_bank(path):
+    """以唯讀 mmap 開啟 .qbank 檔。"""
+    with open(path, 'rb') as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} 不是題庫檔")
+        (header_len,) = struct.unpack('<I', fh.read(4))
+        header = json.loads(fh.read(header_len).decode('utf-8'))
+    if header['version'] != FORMAT_VERSION:
+        raise ValueError(f"{path} 的格式版本 {header['version']} 不支援")
+
+    data_start = _align(len(MAGIC) + 4 + header_len)
+    mm = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        start = data_start + entry['offset']
+        arrays[name] = mm[start:start + entry['length'] * dtype.itemsize].view(dtype)
+    return CompactBank(arrays, digest=header['digest'], path=path)
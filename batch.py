@@ -0,0 +1,249 @@
+import collections
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+import sampler
+from instrumentation import NULL_TIMINGS
+import exam_docx
+import exam_pdf
+from exam_docx import ANSWER_KEY, STANDARD, STUDENT, WITH_ANSWERS
+
+PAPER_LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# 各輸出格式的排版函式與 MIME 類型
+RENDERERS = {'docx': exam_docx.render_paper_set, 'pdf': exam_pdf.render_paper_set}
+MIME_TYPES = {
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'pdf': 'application/pdf',
+    'csv': 'text/csv',
+}
+
+# 未指定行程數時，試卷份數達到此數量才使用行程池：單份排版只需數毫秒，
+# 啟動 spawn 行程池（每個行程重新載入模組）的成本遠高於少量試卷的排版
+POOL_MIN_JOBS = 32
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def paper_name(variant):
+    return f"{PAPER_LETTERS[variant]}卷"
+
+
+def paper_outputs(show_answers=False, student_version=False, answer_key=False):
+    """依介面選項決定每一卷要輸出的版本。"""
+    outputs = [WITH_ANSWERS if show_answers else STANDARD]
+    if student_version:
+        outputs.append(STUDENT)
+    if answer_key:
+        outputs.append(ANSWER_KEY)
+    return tuple(outputs)
+
+
+def output_name(paper_type, kind):
+    """各版本的顯示名稱：A卷、學生A卷、A卷答案卷。"""
+    if kind == STUDENT:
+        return f"學生{paper_type}"
+    if kind == ANSWER_KEY:
+        return f"{paper_type}答案卷"
+    return paper_type
+
+
+def default_hard_distributions(n_variants, a_hard_distribution, b_hard_distribution):
+    """沿用 A 卷偏難、B 卷偏易的設定，C、D… 依序交替。"""
+    return [a_hard_distribution if variant % 2 == 0 else b_hard_distribution for variant in range(n_variants)]
+
+
+def select_variants(banks, n_variants, total_distribution, hard_distributions, max_overlap=0, compat=True, rng=None,
+                    history=None, duplicates=None):
+    """集中抽出 N 份卷別的題目，確保卷別之間互不重複。
+
+    每一卷都排除先前卷別已抽過的題目；題庫不夠用時，每卷每個題庫最多可重用
+    max_overlap 題先前卷別的題目。偶數卷（A、C…）以難題優先，奇數卷（B、D…）
+    難題後優先補易題。compat=True 時前兩卷與舊版 A 卷／B 卷結果一致。
+
+    history 為 {題庫序: 列位置陣列}（其他班級近期用過的題目），抽題時先排除，
+    題庫不足時才從中補足。duplicates 為 dedup.DuplicateIndex，同一份試卷中每個
+    近似重複群組最多一題，重複的題目改抽同難度的其他題目。
+
+    回傳每卷一個 {題庫序: 列位置陣列} 的 dict。
+    """
+    history = history or {}
+    used = [np.empty(0, dtype=np.intp) for _ in banks]
+    selections = []
+    for variant in range(n_variants):
+        prefer_easy = variant % 2 == 1
+        selection = {}
+        taken_groups = set()
+        for i, bank in enumerate(banks):
+            recent = np.asarray(history.get(i, ()), dtype=np.intp)
+            positions = sampler.draw(
+                bank.difficulty,
+                total_distribution[i],
+                hard_distributions[variant][i],
+                bank_no=i,
+                variant=variant,
+                prefer_easy=prefer_easy,
+                exclude=np.union1d(used[i], recent) if len(recent) else used[i],
+                compat=compat,
+                rng=rng,
+                strata=bank.groups('難度'),
+            )
+            short = total_distribution[i] - len(positions)
+            if short > 0 and len(recent):
+                # 先以其他班級用過（但本次未用）的題目補足
+                fallback = np.setdiff1d(recent, np.union1d(used[i], positions))
+                if len(fallback):
+                    extra = sampler.draw(
+                        bank.difficulty,
+                        min(short, len(fallback)),
+                        0,
+                        bank_no=i,
+                        variant=variant,
+                        exclude=np.setdiff1d(np.arange(len(bank)), fallback),
+                        compat=compat,
+                        rng=rng,
+                    )
+                    positions = np.concatenate([positions, extra])
+                    short -= len(extra)
+            if short > 0 and max_overlap > 0 and len(used[i]):
+                # 從先前卷別用過的題目中補足
+                not_reusable = np.setdiff1d(np.arange(len(bank)), used[i])
+                extra = sampler.draw(
+                    bank.difficulty,
+                    min(short, max_overlap),
+                    0,
+                    bank_no=i,
+                    variant=variant,
+                    exclude=not_reusable,
+                    compat=compat,
+                    rng=rng,
+                )
+                positions = np.concatenate([positions, extra])
+            if duplicates is not None:
+                dedupe_rng = rng if rng is not None else np.random.default_rng(sampler.compat_seeds(i, variant))
+                positions = duplicates.dedupe(i, bank, positions, taken_groups, np.union1d(used[i], recent).tolist(),
+                                              dedupe_rng)
+            used[i] = np.union1d(used[i], positions)
+            selection[i] = positions
+        selections.append(selection)
+    return selections
+
+
+def selected_questions(banks, selection):
+    """依出題順序取出選中題目的標準欄位 DataFrame。"""
+    return pd.concat([banks[i].take(positions) for i, positions in selection.items()])
+
+
+def selected_banks(selection):
+    """各選中題目所屬的題庫（1 起算），順序與 selected_questions 相同。"""
+    return np.repeat([i + 1 for i in selection], [len(positions) for positions in selection.values()])
+
+
+def render_paper_set(output_format='docx', **kwargs):
+    """依輸出格式排版一份選題的各版本（模組層級函式，可送入行程池）。"""
+    if output_format not in RENDERERS:
+        raise ValueError(f"不支援的輸出格式：{output_format}")
+    return RENDERERS[output_format](**kwargs)
+
+
+def _get_pool(max_workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # Streamlit 伺服器有多個執行緒，fork 不安全，改用 spawn
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = max_workers
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def pool_workers(n_jobs, max_workers=None):
+    """決定排版使用的行程數：明確指定時照用，否則只有大量試卷才使用所有 CPU。"""
+    if max_workers is not None:
+        return max_workers
+    if n_jobs is not None and n_jobs >= POOL_MIN_JOBS:
+        return os.cpu_count() or 1
+    return 1
+
+
+def render_papers(jobs, max_workers=None, timings=NULL_TIMINGS):
+    """將多份試卷的排版分散到行程池，每卷的各版本在同一個工作中一次輸出。
+
+    jobs 為 {卷別: render_paper_set 的關鍵字參數}，回傳 {顯示名稱: DOCX 或 PDF bytes}。
+    在行程池中排版時只記錄整批的耗時。未指定 max_workers 時，少量試卷直接在本行程排版。
+    """
+    max_workers = pool_workers(len(jobs), max_workers)
+    if len(jobs) < 2 or max_workers == 1:
+        results = {paper_type: render_paper_set(**kwargs, timings=timings) for paper_type, kwargs in jobs.items()}
+    else:
+        pool = _get_pool(max_workers)
+        try:
+            with timings.stage('render_pool', papers=len(jobs), workers=max_workers):
+                futures = {paper_type: pool.submit(render_paper_set, **kwargs) for paper_type, kwargs in jobs.items()}
+                results = {paper_type: future.result() for paper_type, future in futures.items()}
+        except BrokenProcessPool:
+            _reset_pool()
+            raise
+    return {
+        output_name(paper_type, kind): data
+        for paper_type, outputs in results.items()
+        for kind, data in outputs.items()
+    }
+
+
+def render_stream(jobs, max_workers=None, window=None, n_jobs=None):
+    """依序排版大量試卷並逐份產出 (鍵, {版本: bytes})。
+
+    jobs 為 (鍵, render_paper_set 關鍵字參數) 的 iterable，可為產生器；行程池中同時
+    排版的試卷最多 window 份（預設為行程數的兩倍），記憶體用量不隨試卷份數增加。
+    n_jobs 為試卷份數，未指定 max_workers 時依此決定是否使用行程池。
+    """
+    max_workers = pool_workers(n_jobs, max_workers)
+    if max_workers == 1:
+        for key, kwargs in jobs:
+            yield key, render_paper_set(**kwargs)
+        return
+    window = window or 2 * max_workers
+    pool = _get_pool(max_workers)
+    pending = collections.deque()
+    try:
+        for key, kwargs in jobs:
+            pending.append((key, pool.submit(render_paper_set, **kwargs)))
+            if len(pending) >= window:
+                key, future = pending.popleft()
+                yield key, future.result()
+        while pending:
+            key, future = pending.popleft()
+            yield key, future.result()
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+
+
+def zip_papers(papers):
+    """將 {檔名: bytes} 打包成單一 ZIP（DOCX 本身已壓縮，直接存入）。"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for name, data in papers.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
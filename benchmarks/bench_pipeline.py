@@ -0,0 +1,198 @@
+"""讀題庫 → 抽題 → 排版 各階段的效能基準測試。
+
+以合成題庫（序號、難度、答案、題目、選項1-4）分別量測 Excel 解析、正規化、串流匯入、
+匯入欄式檔、抽題與 DOCX 排版（A/B 卷標準版與學生版），結果寫成 JSON，
+可用 --compare 與先前的結果比較：
+
+    python benchmarks/bench_pipeline.py --sizes 100 1000 10000 -o bench.json
+    python benchmarks/bench_pipeline.py -o new.json --compare bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch  # noqa: E402
+from bank_store import CompactBank, open_bank, write_bank  # noqa: E402
+from exam_docx import STANDARD, STUDENT, get_template, render_paper_set  # noqa: E402
+from question_bank import normalize_bank, stream_bank  # noqa: E402
+
+N_BANKS = 6
+TOTAL_DISTRIBUTION = [9, 9, 8, 8, 8, 8]
+HARD_DISTRIBUTIONS = [[4, 3, 3, 3, 3, 3], [2, 2, 2, 2, 2, 2]]
+_CHARS = np.array(list("海巡署教育訓練測考中心志願士兵司法警察專長班依規定下列何者正確錯誤應於得以處罰鍰新臺幣元以上"))
+
+
+def synthetic_bank(rows, seed):
+    """產生與實際題庫相同欄位的合成題庫 DataFrame。"""
+    rng = np.random.default_rng(seed)
+
+    def texts(low, high):
+        lengths = rng.integers(low, high, rows)
+        chars = _CHARS[rng.integers(0, len(_CHARS), lengths.sum())]
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        return ["".join(chars[bounds[i]:bounds[i + 1]]) for i in range(rows)]
+
+    return pd.DataFrame({
+        '序號': np.arange(1, rows + 1),
+        '難度': rng.choice(['難', '中', '易'], rows, p=[0.2, 0.5, 0.3]),
+        '答案': rng.integers(1, 5, rows),
+        '題目': texts(20, 80),
+        '選項1': texts(4, 16),
+        '選項2': texts(4, 16),
+        '選項3': texts(4, 16),
+        '選項4': texts(4, 16),
+    })
+
+
+def synthetic_files(rows, cache_dir):
+    """寫出（或沿用快取的）6 個合成題庫 Excel 檔，回傳各檔內容。"""
+    os.makedirs(cache_dir, exist_ok=True)
+    contents = []
+    for b in range(N_BANKS):
+        path = os.path.join(cache_dir, f"bank_{rows}_{b}.xlsx")
+        if not os.path.exists(path):
+            synthetic_bank(rows, seed=rows * 10 + b).to_excel(path, index=False)
+        with open(path, "rb") as fh:
+            contents.append(fh.read())
+    return contents
+
+
+def timed(fn, repeat):
+    """執行 repeat 次，回傳 (最後一次結果, 各次秒數)。"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+def summarize(samples):
+    return {"min": min(samples), "median": statistics.median(samples), "runs": len(samples)}
+
+
+def bench_size(rows, repeat, cache_dir):
+    contents = synthetic_files(rows, cache_dir)
+    stages = {}
+
+    raw, samples = timed(lambda: [pd.read_excel(io.BytesIO(data)) for data in contents], repeat)
+    stages["excel_parse"] = summarize(samples)
+
+    frames, samples = timed(lambda: [normalize_bank(df) for df in raw], repeat)
+    stages["normalize"] = summarize(samples)
+
+    # 匯入實際使用的串流路徑（openpyxl read_only，邊讀邊正規化）
+    _, samples = timed(lambda: [stream_bank(data) for data in contents], repeat)
+    stages["excel_stream"] = summarize(samples)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        def import_banks():
+            paths = []
+            for b, df in enumerate(frames):
+                path = os.path.join(store_dir, f"{b}.qbank")
+                write_bank(CompactBank.from_frame(df), path)
+                paths.append(path)
+            return paths
+
+        paths, samples = timed(import_banks, repeat)
+        stages["import_qbank"] = summarize(samples)
+
+        banks, samples = timed(lambda: [open_bank(path) for path in paths], repeat)
+        stages["open_qbank"] = summarize(samples)
+
+        selections, samples = timed(lambda: batch.select_variants(banks, 2, TOTAL_DISTRIBUTION, HARD_DISTRIBUTIONS), repeat)
+        stages["select_ab_compat"] = summarize(samples)
+
+        _, samples = timed(lambda: batch.select_variants(banks, 2, TOTAL_DISTRIBUTION, HARD_DISTRIBUTIONS, compat=False), repeat)
+        stages["select_ab_fast"] = summarize(samples)
+
+        questions, samples = timed(lambda: [batch.selected_questions(banks, selection) for selection in selections], repeat)
+        stages["materialize"] = summarize(samples)
+
+        # 範本只在每個行程第一次排版時建立，單獨計時
+        get_template.cache_clear()
+        _, samples = timed(get_template, 1)
+        stages["docx_template"] = summarize(samples)
+
+        for kind in (STANDARD, STUDENT):
+            _, samples = timed(lambda: [render_paper_set(q, "113-1", "期中", "法律", batch.paper_name(v), (kind,))
+                                        for v, q in enumerate(questions)], repeat)
+            stages[f"render_ab_{kind}"] = summarize(samples)
+
+        _, samples = timed(lambda: [render_paper_set(q, "113-1", "期中", "法律", batch.paper_name(v), (STANDARD, STUDENT))
+                                    for v, q in enumerate(questions)], repeat)
+        stages["render_ab_standard+student"] = summarize(samples)
+
+    return {"rows_per_bank": rows, "stages": stages}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    previous = {r["rows_per_bank"]: r["stages"] for r in baseline["results"]}
+    print(f"\n與 {baseline_path}（{baseline.get('revision')}）比較（median，>1 表示變慢）")
+    for result in current["results"]:
+        old_stages = previous.get(result["rows_per_bank"])
+        if not old_stages:
+            continue
+        for stage, stats in result["stages"].items():
+            if stage in old_stages and old_stages[stage]["median"] > 0:
+                ratio = stats["median"] / old_stages[stage]["median"]
+                flag = "  ⚠️" if ratio > 1.2 else ""
+                print(f"{result['rows_per_bank']:>7} {stage:<28} {ratio:6.2f}x{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="每個題庫的題數（100 至 100000）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "exam_bench_banks"), help="合成題庫 Excel 檔的快取位置")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--compare", help="先前的結果 JSON，用來比較是否退步")
+    args = parser.parse_args(argv)
+
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": [],
+    }
+    for rows in args.sizes:
+        result = bench_size(rows, args.repeat, args.cache_dir)
+        results["results"].append(result)
+        for stage, stats in result["stages"].items():
+            print(f"{rows:>7} {stage:<28} {stats['median'] * 1000:10.2f} ms")
+
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""跨題庫的近似重複題目索引（字元 bigram 的 MinHash + LSH）。
+
+各題庫的 MinHash 簽章依內容雜湊快取，建立索引的成本與題數成線性關係；
+抽題時同一群組（內容幾乎相同的題目）每份試卷最多只會出現一題。
+"""
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import sampler
+from question_bank import BANK_CACHE_SIZE
+
+NUM_PERM = 64
+BANDS = 16
+# 估計的 Jaccard 相似度達此值才視為重複
+SIMILARITY_THRESHOLD = 0.7
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+_rng = np.random.default_rng(20240601)
+_HASH_A = _rng.integers(1, 1 << 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_HASH_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)
+_EMPTY_SIGNATURE = np.uint32(0xFFFFFFFF)
+
+# 比對時忽略空白、標點與全形符號
+_IGNORED = re.compile(r'[\W_]+')
+
+_signature_cache = OrderedDict()
+_signature_lock = threading.Lock()
+
+
+def question_text(bank, position):
+    return ''.join(bank.text[col][position] for col in ('題目', '選項1', '選項2', '選項3', '選項4'))
+
+
+def minhash_signatures(texts):
+    """每段文字的 MinHash 簽章，shape (題數, NUM_PERM)，uint32。
+
+    所有文字接成一個碼位陣列後一次計算 bigram 雜湊，再以 reduceat 取各題最小值，
+    總成本與字數成線性關係。沒有任何 bigram 的題目簽章全為 0xFFFFFFFF。
+    """
+    normalized = [_IGNORED.sub('', text) for text in texts]
+    lengths = np.fromiter((len(text) for text in normalized), dtype=np.int64, count=len(normalized))
+    signatures = np.full((len(normalized), NUM_PERM), _EMPTY_SIGNATURE, dtype=np.uint32)
+    points = np.frombuffer(''.join(normalized).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if len(points) < 2:
+        return signatures
+
+    shingles = (points[:-1] << np.uint64(21)) | points[1:]
+    # 去掉跨越兩題邊界的 bigram
+    ends = np.cumsum(lengths)
+    keep = np.ones(len(shingles), dtype=bool)
+    keep[ends[(ends > 0) & (ends < len(points))] - 1] = False
+    shingles = shingles[keep]
+
+    counts = np.maximum(lengths - 1, 0)
+    has_shingles = counts > 0
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[has_shingles]
+    with np.errstate(over='ignore'):
+        for i in range(NUM_PERM):
+            hashed = ((shingles * _HASH_A[i] + _HASH_B[i]) & _MASK64) >> np.uint64(32)
+            signatures[has_shingles, i] = np.minimum.reduceat(hashed, starts).astype(np.uint32)
+    return signatures
+
+
+def bank_signatures(bank):
+    """題庫的 MinHash 簽章，依內容雜湊快取。"""
+    key = bank.digest
+    if key is not None:
+        with _signature_lock:
+            if key in _signature_cache:
+                _signature_cache.move_to_end(key)
+                return _signature_cache[key]
+    signatures = minhash_signatures([question_text(bank, i) for i in range(len(bank))])
+    if key is not None:
+        with _signature_lock:
+            _signature_cache[key] = signatures
+            while len(_signature_cache) > BANK_CACHE_SIZE:
+                _signature_cache.popitem(last=False)
+    return signatures
+
+
+def _band_keys(signatures, band, rows):
+    block = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+    keys = np.zeros(len(signatures), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for column in block.T:
+            keys = keys * np.uint64(1000003) + column
+    return keys
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def near_duplicate_groups(signatures, threshold=SIMILARITY_THRESHOLD, bands=BANDS):
+    """以 LSH 分桶找出候選配對並驗證相似度，回傳每題的群組代號（不重複的題目自成一組）。"""
+    n = len(signatures)
+    rows = signatures.shape[1] // bands
+    parent = list(range(n))
+    valid = ~np.all(signatures == _EMPTY_SIGNATURE, axis=1)
+    for band in range(bands):
+        keys = _band_keys(signatures, band, rows)
+        order = np.argsort(keys, kind='stable')
+        order = order[valid[order]]
+        sorted_keys = keys[order]
+        same = np.flatnonzero(sorted_keys[1:] == sorted_keys[:-1]) + 1
+        if not len(same):
+            continue
+        # 每個桶內只與桶的第一題比對，成本與桶大小成線性
+        run_start = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]))
+        first = order[run_start[np.searchsorted(run_start, same, side='right') - 1]]
+        members = order[same]
+        similarity = (signatures[first] == signatures[members]).mean(axis=1)
+        for a, b in zip(first[similarity >= threshold].tolist(), members[similarity >= threshold].tolist()):
+            root_a, root_b = _find(parent, a), _find(parent, b)
+            if root_a != root_b:
+                parent[root_b] = root_a
+    return np.array([_find(parent, i) for i in range(n)], dtype=np.int64)
+
+
+class DuplicateIndex:
+    """多個題庫的近似重複群組，只保存有兩題以上的群組。"""
+
+    def __init__(self, group_of):
+        # group_of[題庫序] = {列位置: 群組代號}
+        self.group_of = group_of
+        self.members = {}
+        for bank_no, groups in enumerate(group_of):
+            for position, group in groups.items():
+                self.members.setdefault(group, []).append((bank_no, position))
+
+    def __len__(self):
+        return len(self.members)
+
+    @classmethod
+    def build(cls, banks, threshold=SIMILARITY_THRESHOLD):
+        signatures = [bank_signatures(bank) for bank in banks]
+        if not signatures:
+            return cls([])
+        labels = near_duplicate_groups(np.concatenate(signatures), threshold)
+        sizes = np.bincount(labels, minlength=len(labels))
+        group_of = []
+        offset = 0
+        for sig in signatures:
+            bank_labels = labels[offset:offset + len(sig)]
+            duplicated = np.flatnonzero(sizes[bank_labels] > 1)
+            group_of.append(dict(zip(duplicated.tolist(), bank_labels[duplicated].tolist())))
+            offset += len(sig)
+        return cls(group_of)
+
+    def blocked(self, bank_no, taken):
+        """此題庫中屬於已選群組的列位置。"""
+        return [position for group in taken for b, position in self.members.get(group, ()) if b == bank_no]
+
+    def dedupe(self, bank_no, bank, positions, taken, excluded, rng):
+        """移除與 taken 群組重複的題目，並從相同難度補上不重複的題目（維持出題順序）。
+
+        taken 為本卷已使用的群組，會就地更新；excluded 為不可選的列位置。
+        """
+        groups = self.group_of[bank_no] if bank_no < len(self.group_of) else {}
+        if not groups:
+            return positions
+        result = []
+        excluded = set(excluded) | set(np.asarray(positions).tolist()) | set(self.blocked(bank_no, taken))
+        strata = bank.groups('難度')
+        for position in np.asarray(positions).tolist():
+            group = groups.get(position)
+            if group is None or group not in taken:
+                if group is not None:
+                    taken.add(group)
+                result.append(position)
+                continue
+            # 重複：改抽同難度、且不屬於已選群組的題目
+            stratum = strata.get(int(bank.difficulty[position]), np.empty(0, dtype=np.intp))
+            while True:
+                n_excluded = int(np.isin(stratum, np.fromiter(excluded, dtype=np.intp, count=len(excluded))).sum())
+                picked = sampler.sample_stratum(stratum, 1, rng, excluded, n_excluded)
+                if not len(picked):
+                    break
+                replacement = int(picked[0])
+                excluded.add(replacement)
+                group = groups.get(replacement)
+                if group is None or group not in taken:
+                    if group is not None:
+                        taken.add(group)
+                    result.append(replacement)
+                    break
+        return np.array(result, dtype=np.intp)
+
@@ -0,0 +1,141 @@
+"""Drive 題庫的本機快取：依檔案 ID 保存原始的 .xlsx 內容。
+
+以資料夾列表取得的 md5Checksum（無 md5 時用 modifiedTime）驗證快取是否仍有效，
+內容未變時完全不再下載；超過容量時依最近使用時間淘汰。磁碟上只存原始檔案，
+不使用 pickle（讀取他人放入的 pickle 檔會執行任意程式碼，pandas 升級後也無法讀回），
+解析後的 DataFrame 只保留在行程記憶體中。快取目錄只限目前使用者存取。
+"""
+import collections
+import io
+import json
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+import drive_client
+
+DRIVE_CACHE_DIR = os.environ.get(
+    'EXAM_DRIVE_CACHE', os.path.join(tempfile.gettempdir(), f"exam_drive_cache-{getattr(os, 'getuid', lambda: 'user')()}"))
+# 最多保留的題庫檔數
+DRIVE_CACHE_SIZE = 64
+
+_cache_lock = threading.Lock()
+
+
+def private_dir(path):
+    """建立只有目前使用者可存取的目錄；目錄已存在但屬於其他使用者時拒絕使用。"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if hasattr(os, 'getuid'):
+        if os.stat(path).st_uid != os.getuid():
+            raise PermissionError(f"快取目錄不屬於目前使用者：{path}")
+        os.chmod(path, 0o700)
+    return path
+
+
+def file_version(meta):
+    """檔案版本識別：優先使用 md5Checksum，Google 原生文件沒有 md5 時改用 modifiedTime。"""
+    return meta.get('md5Checksum') or meta.get('modifiedTime')
+
+
+class DriveCache:
+    """目錄中每個檔案 ID 對應 <id>.xlsx（原始內容）與 <id>.json（版本）。"""
+
+    def __init__(self, cache_dir=None, max_entries=DRIVE_CACHE_SIZE):
+        self.cache_dir = private_dir(cache_dir or DRIVE_CACHE_DIR)
+        self.max_entries = max_entries
+        # (檔案 ID, 版本) → 解析後的 DataFrame，同一伺服器行程中不重複解析
+        self._frames = collections.OrderedDict()
+
+    def _path(self, file_id, suffix):
+        return os.path.join(self.cache_dir, f"{file_id}{suffix}")
+
+    def _write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+    def cached_version(self, file_id):
+        try:
+            with open(self._path(file_id, '.json'), encoding='utf-8') as fh:
+                return json.load(fh).get('version')
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, meta):
+        version = file_version(meta)
+        return version is not None and self.cached_version(meta['id']) == version
+
+    def _remember(self, key, df):
+        with _cache_lock:
+            self._frames[key] = df
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+        return df
+
+    def get(self, meta):
+        """回傳快取中的 DataFrame；版本不符、不存在或無法讀取時回傳 None（視為未命中）。"""
+        if not self.is_fresh(meta):
+            return None
+        key = (meta['id'], file_version(meta))
+        df = self._frames.get(key)
+        if df is None:
+            try:
+                with open(self._path(meta['id'], '.xlsx'), 'rb') as fh:
+                    df = pd.read_excel(io.BytesIO(fh.read()), engine='openpyxl')
+            except Exception:
+                # 檔案損毀或無法解析時重新下載
+                return None
+        try:
+            # 以 .json 的修改時間記錄最近使用時間，供 LRU 淘汰
+            os.utime(self._path(meta['id'], '.json'))
+        except OSError:
+            return None
+        return self._remember(key, df)
+
+    def put(self, meta, data):
+        """保存下載的內容並解析，回傳 DataFrame。"""
+        file_id = meta['id']
+        df = pd.read_excel(io.BytesIO(data), engine='openpyxl')
+        with _cache_lock:
+            self._write(self._path(file_id, '.xlsx'), data)
+            # 版本檔最後寫入，確保內容完整後才視為有效
+            version = {'version': file_version(meta), 'name': meta.get('name'), 'modifiedTime': meta.get('modifiedTime')}
+            self._write(self._path(file_id, '.json'), json.dumps(version, ensure_ascii=False).encode('utf-8'))
+            self.evict()
+        return self._remember((file_id, file_version(meta)), df)
+
+    def evict(self):
+        """超過容量時刪除最久未使用的檔案。"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.path.getmtime(path), name[:-len('.json')]))
+                except OSError:
+                    continue
+        entries.sort()
+        for _, file_id in entries[:max(0, len(entries) - self.max_entries)]:
+            for suffix in ('.json', '.xlsx'):
+                try:
+                    os.remove(self._path(file_id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def fetch(self, session, files, max_workers=drive_client.MAX_WORKERS, base_url=drive_client.DRIVE_API_URL):
+        """取得多個檔案的 DataFrame，回傳 ({file_id: DataFrame}, 實際下載的檔案數)。
+
+        files 為資料夾列表回傳的中繼資料（含 id、md5Checksum、modifiedTime），
+        只有版本不符的檔案才會並行下載。
+        """
+        frames = {meta['id']: self.get(meta) for meta in files}
+        stale = [meta for meta in files if frames[meta['id']] is None]
+        if stale:
+            contents = drive_client.download_files(session, [meta['id'] for meta in stale], max_workers, base_url)
+            for meta in stale:
+                frames[meta['id']] = self.put(meta, contents[meta['id']].getvalue())
+        return frames, len(stale)
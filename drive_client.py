@@ -0,0 +1,128 @@
+"""Google Drive 存取：共用一個已授權的 HTTP 連線池，並行下載題庫檔案。"""
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 可改指向本機的假 Drive 伺服器做測試
+DRIVE_API_URL = os.environ.get("DRIVE_API_URL", "https://www.googleapis.com/drive/v3")
+SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+
+# 題庫檔多為數百 KB，單次請求串流讀取，每次讀 256 KB
+CHUNK_SIZE = 256 * 1024
+MAX_WORKERS = 6
+POOL_SIZE = 10
+TIMEOUT = 30
+FILE_FIELDS = "id, name, mimeType, parents, trashed, md5Checksum, modifiedTime, size"
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+PAGE_SIZE = 1000
+
+_refresh_lock = threading.Lock()
+
+
+def _mount_pool(session, pool_size):
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def create_session(service_account_info, pool_size=POOL_SIZE):
+    """以服務帳戶建立可重複使用的授權連線（應在整個伺服器行程中共用）。"""
+    from google.auth.transport.requests import AuthorizedSession
+    from google.oauth2 import service_account
+
+    credentials = service_account.Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+    return _mount_pool(AuthorizedSession(credentials), pool_size)
+
+
+def create_anonymous_session(pool_size=POOL_SIZE):
+    """不帶授權的連線，供本機假 Drive 伺服器測試使用。"""
+    return _mount_pool(requests.Session(), pool_size)
+
+
+def _ensure_fresh(session):
+    # AuthorizedSession 在多執行緒同時刷新權杖時沒有加鎖，並行請求前先統一刷新一次
+    credentials = getattr(session, "credentials", None)
+    if credentials is None or credentials.valid:
+        return
+    with _refresh_lock:
+        if not credentials.valid:
+            from google.auth.transport.requests import Request
+
+            credentials.refresh(Request())
+
+
+def _get_json(session, url, params):
+    _ensure_fresh(session)
+    response = session.get(url, params=params, timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def list_files(session, folder_id, base_url=DRIVE_API_URL):
+    """列出指定資料夾內的所有檔案（依 nextPageToken 逐頁取得，含 md5Checksum 與 modifiedTime）。"""
+    params = {
+        "q": f"'{folder_id}' in parents and trashed=false",
+        "fields": f"nextPageToken, files({FILE_FIELDS})",
+        "pageSize": PAGE_SIZE,
+        "supportsAllDrives": "true",
+        "includeItemsFromAllDrives": "true",
+    }
+    files = []
+    while True:
+        result = _get_json(session, f"{base_url}/files", params)
+        files.extend(result.get("files", []))
+        if not result.get("nextPageToken"):
+            return files
+        params["pageToken"] = result["nextPageToken"]
+
+
+def get_start_page_token(session, base_url=DRIVE_API_URL):
+    """取得目前的 changes 起始標記，之後的變動都可由此增量取得。"""
+    params = {"supportsAllDrives": "true"}
+    return _get_json(session, f"{base_url}/changes/startPageToken", params)["startPageToken"]
+
+
+def list_changes(session, page_token, base_url=DRIVE_API_URL):
+    """取得 page_token 之後的所有變動，回傳 (changes, 下次使用的標記)。"""
+    params = {
+        "pageToken": page_token,
+        "fields": f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))",
+        "pageSize": PAGE_SIZE,
+        "supportsAllDrives": "true",
+        "includeItemsFromAllDrives": "true",
+    }
+    changes = []
+    while True:
+        result = _get_json(session, f"{base_url}/changes", params)
+        changes.extend(result.get("changes", []))
+        if "newStartPageToken" in result:
+            return changes, result["newStartPageToken"]
+        params["pageToken"] = result["nextPageToken"]
+
+
+def download_file(session, file_id, base_url=DRIVE_API_URL, chunk_size=CHUNK_SIZE):
+    """以單一串流請求下載檔案內容。"""
+    with session.get(f"{base_url}/files/{file_id}", params={"alt": "media"}, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        buffer = io.BytesIO()
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            buffer.write(chunk)
+    return buffer.getvalue()
+
+
+def download_files(session, file_ids, max_workers=MAX_WORKERS, base_url=DRIVE_API_URL):
+    """並行下載多個檔案，總耗時約等於最慢的一個。
+
+    回傳 {file_id: BytesIO}，順序與 file_ids 相同。
+    """
+    _ensure_fresh(session)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_ids)) or 1) as pool:
+        futures = {file_id: pool.submit(download_file, session, file_id, base_url) for file_id in file_ids}
+        return {file_id: io.BytesIO(future.result()) for file_id, future in futures.items()}
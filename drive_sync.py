@@ -0,0 +1,176 @@
+"""題庫資料夾的本機鏡像：首次完整列出整棵資料夾樹，之後以 Changes API 增量更新。
+
+介面直接讀取記憶體中的鏡像，不必每次重新執行都呼叫 Drive；
+鏡像中的 md5Checksum 交給 drive_cache 判斷哪些題庫需要重新下載。
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import drive_client
+
+logger = logging.getLogger("exam.drive_sync")
+
+DRIVE_SYNC_DIR = os.environ.get('EXAM_DRIVE_SYNC', os.path.join(tempfile.gettempdir(), 'exam_drive_sync'))
+# 背景同步間隔秒數
+SYNC_INTERVAL = 30
+
+
+class DriveMirror:
+    """root_folder_id 底下所有資料夾與檔案的中繼資料，以及 changes 的 page token。
+
+    狀態寫在 <state_dir>/<root_folder_id>.json，伺服器重啟後可直接增量同步。
+    """
+
+    def __init__(self, root_folder_id, state_dir=None, base_url=drive_client.DRIVE_API_URL):
+        self.root_folder_id = root_folder_id
+        self.base_url = base_url
+        self.state_path = os.path.join(state_dir or DRIVE_SYNC_DIR, f"{root_folder_id}.json")
+        self.files = {}
+        self.page_token = None
+        self._lock = threading.RLock()
+        # 背景執行緒與介面可能同時同步，同一時間只允許一個同步
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            return
+        self.files = state.get('files', {})
+        self.page_token = state.get('page_token')
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.state_path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            json.dump({'page_token': self.page_token, 'files': self.files}, fh, ensure_ascii=False)
+        os.replace(tmp, self.state_path)
+
+    @property
+    def ready(self):
+        return self.page_token is not None
+
+    def _is_folder(self, files, file_id):
+        return file_id == self.root_folder_id or (
+            file_id in files and files[file_id].get('mimeType') == drive_client.FOLDER_MIME_TYPE)
+
+    def _list_tree(self, session, folder_id):
+        """逐層（含分頁）列出 folder_id 底下的所有項目。"""
+        found = {}
+        pending = [folder_id]
+        while pending:
+            for meta in drive_client.list_files(session, pending.pop(), self.base_url):
+                found[meta['id']] = meta
+                if meta.get('mimeType') == drive_client.FOLDER_MIME_TYPE:
+                    pending.append(meta['id'])
+        return found
+
+    def full_sync(self, session):
+        """完整列出整棵資料夾樹。先取得 page token，列出期間的變動之後仍會被增量同步補上。"""
+        with self._sync_lock:
+            page_token = drive_client.get_start_page_token(session, self.base_url)
+            files = self._list_tree(session, self.root_folder_id)
+            with self._lock:
+                self.files = files
+                self.page_token = page_token
+                self._save()
+            return set(files)
+
+    def sync(self, session):
+        """套用上次同步後的變動，回傳有變動（新增、修改、刪除）的檔案 ID。
+
+        變動套用在鏡像的副本上（新移入的資料夾需呼叫 Drive 列出內容），完成後才在鎖內換上，
+        同步期間介面的 children()、get() 讀取舊的鏡像，不必等待網路。
+        """
+        if not self.ready:
+            return self.full_sync(session)
+        with self._sync_lock:
+            changes, page_token = drive_client.list_changes(session, self.page_token, self.base_url)
+            # 只有持有 _sync_lock 的同步會修改 self.files，此處不需 _lock 即可複製
+            files = dict(self.files) if changes else self.files
+            changed = set()
+            for change in changes:
+                changed |= self._apply(session, files, change)
+            with self._lock:
+                self.files = files
+                self.page_token = page_token
+                if changes:
+                    self._save()
+            return changed
+
+    def _apply(self, session, files, change):
+        file_id = change['fileId']
+        meta = change.get('file')
+        if change.get('removed') or not meta or meta.get('trashed'):
+            return self._remove(files, file_id)
+        if not any(self._is_folder(files, parent) for parent in meta.get('parents', [])):
+            # 不在題庫資料夾樹內（或已移出）
+            return self._remove(files, file_id)
+        is_new_folder = file_id not in files and meta.get('mimeType') == drive_client.FOLDER_MIME_TYPE
+        files[file_id] = meta
+        changed = {file_id}
+        if is_new_folder:
+            # 整個資料夾移入時，其內容不會逐一出現在 changes 中
+            subtree = self._list_tree(session, file_id)
+            files.update(subtree)
+            changed |= set(subtree)
+        return changed
+
+    def _remove(self, files, file_id):
+        if file_id not in files:
+            return set()
+        removed = {file_id}
+        # 資料夾被刪除或移出時，一併移除其下所有項目
+        pending = [file_id]
+        while pending:
+            parent = pending.pop()
+            for child_id, meta in files.items():
+                if parent in meta.get('parents', []) and child_id not in removed:
+                    removed.add(child_id)
+                    pending.append(child_id)
+        for removed_id in removed:
+            files.pop(removed_id, None)
+        return removed
+
+    def children(self, folder_id=None):
+        """資料夾內的項目（依名稱排序），直接讀取本機鏡像。"""
+        folder_id = folder_id or self.root_folder_id
+        with self._lock:
+            items = [meta for meta in self.files.values() if folder_id in meta.get('parents', [])]
+        return sorted(items, key=lambda meta: meta.get('name', ''))
+
+    def find_child(self, folder_id, name):
+        return next((meta for meta in self.children(folder_id) if meta.get('name') == name), None)
+
+    def get(self, file_id):
+        with self._lock:
+            return self.files.get(file_id)
+
+    def start(self, session, interval=SYNC_INTERVAL):
+        """啟動背景同步執行緒（重複呼叫不會重複啟動）。"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(session, interval), name="drive-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, session, interval):
+        while not self._stop.wait(interval):
+            try:
+                changed = self.sync(session)
+                if changed:
+                    logger.info("synced %d changed files", len(changed))
+            except Exception:
+                logger.exception("Drive sync failed")
@@ -0,0 +1,133 @@
+"""命令列產生試卷，適合排程的批次作業：
+
+    python exam_cli.py 題庫資料夾 -o 輸出資料夾 --class-name 113-1 --exam-type 期中 --subject 法律 --student
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+from artifact_cache import ArtifactCache
+from exam_engine import ExamConfig, generate_exam, generate_student_papers, zip_exam
+from instrumentation import NULL_TIMINGS, Timings, enable_logging
+from usage_store import AVOID_REUSE_DAYS
+
+
+def find_bank_files(bank_dir):
+    # 依檔名排序，對應介面上傳的題庫順序
+    return sorted(
+        path for path in glob.glob(os.path.join(bank_dir, "*.xlsx"))
+        if not os.path.basename(path).startswith("~$")
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="志兵班試卷產生器（命令列版）")
+    parser.add_argument("bank_dir", help="存放題庫 Excel 檔的資料夾（依檔名排序）")
+    parser.add_argument("-o", "--output", default=".", help="試卷輸出資料夾")
+    parser.add_argument("--class-name", default="113-X", help="班級名稱，例如：113-1")
+    parser.add_argument("--exam-type", default="期中", choices=["期中", "期末"])
+    parser.add_argument("--subject", default="法律", choices=["法律", "專業"])
+    parser.add_argument("--show-answers", action="store_true", help="在試卷上顯示答案")
+    parser.add_argument("--student", action="store_true", help="另外輸出學生版")
+    parser.add_argument("--answer-key", action="store_true", help="另外輸出答案卷")
+    parser.add_argument("--variants", type=int, default=2, help="卷別數量（A、B、C…）")
+    parser.add_argument("--max-overlap", type=int, default=0, help="題庫不足時每卷每題庫可重用的題數")
+    parser.add_argument("--solver", action="store_true", help="整體求解各題庫與難度題數，無法滿足時指出原因")
+    parser.add_argument("--min-per-bank", type=int, default=None, help="搭配 --solver：每卷每個題庫的最低題數")
+    parser.add_argument("--seed", type=int, default=None, help="搭配 --solver：亂數種子")
+    parser.add_argument("--usage-history", action="store_true", help="排除其他班級近期用過的題目，並記錄本次出題")
+    parser.add_argument("--avoid-reuse-days", type=int, default=AVOID_REUSE_DAYS, help="搭配 --usage-history：排除的天數")
+    parser.add_argument("--usage-db", default=None, help="使用紀錄資料庫路徑（預設 ~/.exam_generator/usage.sqlite3）")
+    duplicates = parser.add_mutually_exclusive_group()
+    duplicates.add_argument("--dedupe", action="store_true",
+                            help="同一份試卷不出現近似重複的題目（預設只有 --solver 時檢查，相容模式須與舊版結果一致）")
+    duplicates.add_argument("--allow-duplicates", action="store_true", help="不檢查近似重複的題目")
+    parser.add_argument("--shuffle-options", action="store_true", help="各卷別重排選項順序並平衡答案分布")
+    parser.add_argument("--students", type=int, default=0,
+                        help="每位考生一份題序與選項順序不同的試卷，輸出含各卷答案的單一 ZIP")
+    parser.add_argument("--format", default="docx", choices=["docx", "pdf"], help="輸出格式（PDF 需安裝 reportlab）")
+    parser.add_argument("--columns", type=int, default=1, choices=[1, 2], help="版面欄數（2 為 A3 橫式雙欄）")
+    parser.add_argument("--no-cache", action="store_true", help="不使用已產生試卷的快取，一律重新產生")
+    parser.add_argument("--workers", type=int, default=None, help="排版使用的行程數（預設只有大量試卷才使用行程池）")
+    parser.add_argument("--zip", action="store_true", help="輸出單一 ZIP 檔")
+    parser.add_argument("--timings", action="store_true", help="以 JSON log 輸出各階段耗時")
+    parser.add_argument("--profile", action="store_true", help="以 cProfile 分析並輸出報表")
+    return parser
+
+
+def _write_student_papers(args, config, timings, start_time):
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, config.file_name(f"學生卷{config.students}份", ".zip"))
+    try:
+        generate_student_papers(find_bank_files(args.bank_dir), config, path, timings)
+    except ValueError as e:
+        print(f"錯誤：{e}", file=sys.stderr)
+        return 1
+    print(path)
+    print(f"試卷生成完成！耗時：{time.time() - start_time:.2f} 秒", file=sys.stderr)
+    if args.profile:
+        print(timings.profile_report(), file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = ExamConfig(
+        class_name=args.class_name,
+        exam_type=args.exam_type,
+        subject=args.subject,
+        show_answers=args.show_answers,
+        student_version=args.student,
+        answer_key=args.answer_key,
+        n_variants=args.variants,
+        max_overlap=args.max_overlap,
+        max_workers=args.workers,
+        solver=args.solver,
+        seed=args.seed,
+        usage_history=args.usage_history,
+        avoid_reuse_days=args.avoid_reuse_days,
+        usage_db=args.usage_db,
+        dedupe=True if args.dedupe else False if args.allow_duplicates else None,
+        output_format=args.format,
+        columns=args.columns,
+        shuffle_options=args.shuffle_options,
+        students=args.students,
+    )
+    if args.min_per_bank is not None:
+        config.bank_minimums = (args.min_per_bank,) * len(config.total_distribution)
+
+    timings = NULL_TIMINGS
+    if args.timings or args.profile:
+        enable_logging()
+        timings = Timings(profile=args.profile)
+
+    start_time = time.time()
+    if config.students:
+        return _write_student_papers(args, config, timings, start_time)
+    try:
+        artifacts = None if args.no_cache else ArtifactCache()
+        papers = generate_exam(find_bank_files(args.bank_dir), config, timings, artifacts)
+    except ValueError as e:
+        print(f"錯誤：{e}", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    if args.zip:
+        outputs = {config.file_name("試卷", ".zip"): zip_exam(papers, config)}
+    else:
+        outputs = {config.file_name(name): data for name, data in papers.items()}
+    for file_name, data in outputs.items():
+        with open(os.path.join(args.output, file_name), "wb") as fh:
+            fh.write(data)
+        print(os.path.join(args.output, file_name))
+
+    print(f"試卷生成完成！耗時：{time.time() - start_time:.2f} 秒", file=sys.stderr)
+    if args.profile:
+        print(timings.profile_report(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
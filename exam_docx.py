@@ -0,0 +1,317 @@
+import functools
+import io
+import re
+import struct
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.shared import Pt, Cm
+from docx.oxml.ns import qn
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.enum.section import WD_ORIENT, WD_SECTION
+from docx.oxml import OxmlElement
+
+import layout
+from instrumentation import NULL_TIMINGS
+
+# 版面樣式只在範本中定義一次，題目段落只引用樣式名稱
+TITLE_STYLE = 'ExamTitle'
+INFO_STYLE = 'ExamInfo'
+QUESTION_STYLE = 'ExamQuestion'
+
+# 版面共用的頁面設定（公分）：寬 29.7、高 42，與 Word 範本的 section 設定相同
+PAGE_WIDTH_CM, PAGE_HEIGHT_CM = 29.7, 42.0
+MARGIN_TOP_CM = MARGIN_BOTTOM_CM = 1.5 / 2.54
+MARGIN_LEFT_CM = MARGIN_RIGHT_CM = 2 / 2.54
+
+_DOCUMENT_PART = 'word/document.xml'
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_BREAKS = {'\n': '<w:br/>', '\r': '<w:br/>', '\t': '<w:tab/>'}
+_BREAK_CHARS = re.compile('[\n\r\t]')
+# ZIP 內固定使用 1980-01-01 的時間戳，相同內容輸出相同位元組
+_DOS_TIME, _DOS_DATE = 0, (0 << 9) | (1 << 5) | 1
+
+
+def _add_style(doc, name, size, alignment, space_after=None):
+    style = doc.styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+    style.base_style = doc.styles['Normal']
+    style.font.name = '標楷體'
+    style.font.size = Pt(size)
+    style.element.get_or_add_rPr().get_or_add_rFonts().set(qn('w:eastAsia'), '標楷體')
+    style.paragraph_format.alignment = alignment
+    if space_after is not None:
+        style.paragraph_format.left_indent = Cm(0)
+        style.paragraph_format.right_indent = Cm(0)
+        style.paragraph_format.space_after = Pt(space_after)
+    return style
+
+
+def build_template(columns=1):
+    """以 python-docx 建立含頁面設定與試卷樣式的空白範本，回傳 DOCX bytes。
+
+    columns=2 時為 A3 橫式雙欄版面，題目段落設為不可跨欄（keep_together）。
+    """
+    doc = Document()
+
+    # 設置頁面大小與邊距
+    section = doc.sections[-1]
+    if columns == 2:
+        section.page_height, section.page_width = Cm(layout.PAGE_HEIGHT_CM), Cm(layout.PAGE_WIDTH_CM)
+    else:
+        section.page_height, section.page_width = Cm(PAGE_HEIGHT_CM), Cm(PAGE_WIDTH_CM)
+    section.orientation = WD_ORIENT.LANDSCAPE
+    section.top_margin, section.bottom_margin = Cm(MARGIN_TOP_CM), Cm(MARGIN_BOTTOM_CM)
+    section.left_margin, section.right_margin = Cm(MARGIN_LEFT_CM), Cm(MARGIN_RIGHT_CM)
+    if columns == 2:
+        # 標題所在的單欄節之後接續（不換頁）雙欄節
+        section.start_type = WD_SECTION.CONTINUOUS
+        cols = section._sectPr.find(qn('w:cols'))
+        if cols is None:
+            cols = OxmlElement('w:cols')
+            section._sectPr.append(cols)
+        cols.set(qn('w:num'), '2')
+        cols.set(qn('w:space'), str(int(Cm(layout.COLUMN_GAP_CM).twips)))
+
+    _add_style(doc, TITLE_STYLE, 20, WD_PARAGRAPH_ALIGNMENT.CENTER)
+    _add_style(doc, INFO_STYLE, 16, WD_PARAGRAPH_ALIGNMENT.JUSTIFY)
+    question_style = _add_style(doc, QUESTION_STYLE, 16, WD_PARAGRAPH_ALIGNMENT.JUSTIFY, space_after=0)
+    if columns == 2:
+        question_style.paragraph_format.keep_together = True
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+class DocxTemplate:
+    """預先壓縮好的範本封裝，每份試卷只需重新產生 document.xml 的內文。"""
+
+    def __init__(self, data):
+        self.parts = []
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            for name in zf.namelist():
+                content = zf.read(name)
+                if name == _DOCUMENT_PART:
+                    xml = content.decode('utf-8')
+                    head, rest = xml.split('<w:body>', 1)
+                    self.document_head = (head + '<w:body>').encode('utf-8')
+                    tail = rest[rest.index('<w:sectPr'):]
+                    # 雙欄範本：標題與說明自成單欄的一節，題目與難度統計為雙欄的一節，
+                    # 兩者都以段落內的 sectPr 結束；其後的答案卷回到單欄，以整頁寬度輸出
+                    self.header_section = None
+                    self.column_section = None
+                    if 'w:num="2"' in tail:
+                        section = tail[:tail.index('</w:sectPr>') + len('</w:sectPr>')]
+                        self.column_section = f'<w:p><w:pPr>{section}</w:pPr></w:p>'
+                        section = section.replace('w:num="2"', 'w:num="1"').replace('<w:type w:val="continuous"/>', '')
+                        self.header_section = f'<w:p><w:pPr>{section}</w:pPr></w:p>'
+                        tail = tail.replace('w:num="2"', 'w:num="1"')
+                    self.document_tail = tail.encode('utf-8')
+                    self.parts.append((name, None))
+                else:
+                    self.parts.append((name, _deflate_member(name, [content])))
+
+    def write(self, out, body_chunks):
+        """將完整 DOCX 寫入 out；body_chunks 為內文 XML 字串的可迭代物件（可逐段產生）。"""
+        members = []
+        for name, member in self.parts:
+            if member is None:
+                chunks = _encoded(body_chunks)
+                member = _deflate_member(name, _chain([self.document_head], chunks, [self.document_tail]))
+            members.append(member)
+        _write_zip(out, members)
+
+    def render(self, body_chunks):
+        buffer = io.BytesIO()
+        self.write(buffer, body_chunks)
+        return buffer.getvalue()
+
+
+def _encoded(chunks):
+    for chunk in chunks:
+        yield chunk.encode('utf-8')
+
+
+def _chain(*iterables):
+    for iterable in iterables:
+        yield from iterable
+
+
+def _deflate_member(name, chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    crc = 0
+    size = 0
+    compressed = []
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        compressed.append(compressor.compress(chunk))
+    compressed.append(compressor.flush())
+    return name.encode('utf-8'), crc, size, b''.join(compressed)
+
+
+def _write_zip(out, members):
+    central = []
+    offset = 0
+    for name, crc, size, data in members:
+        header = struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, 0x0800, 8, _DOS_TIME, _DOS_DATE,
+                             crc, len(data), size, len(name), 0)
+        out.write(header)
+        out.write(name)
+        out.write(data)
+        central.append(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, 0x0800, 8, _DOS_TIME, _DOS_DATE,
+                                   crc, len(data), size, len(name), 0, 0, 0, 0, 0, offset) + name)
+        offset += len(header) + len(name) + len(data)
+    directory = b''.join(central)
+    out.write(directory)
+    out.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(members), len(members), len(directory), offset, 0))
+
+
+@functools.lru_cache(maxsize=2)
+def get_template(columns=1):
+    return DocxTemplate(build_template(columns))
+
+
+def _text(text):
+    text = escape(_INVALID_XML_CHARS.sub('', str(text)))
+    text = _BREAK_CHARS.sub(lambda m: f'</w:t>{_BREAKS[m.group()]}<w:t xml:space="preserve">', text)
+    return f'<w:t xml:space="preserve">{text}</w:t>'
+
+
+def paragraph(text, style=None, align=None, bold=False):
+    """產生一個段落的 XML；style 為範本中的段落樣式，align 為 w:jc 值。"""
+    ppr = ''
+    if style or align:
+        ppr = '<w:pPr>' + (f'<w:pStyle w:val="{style}"/>' if style else '') + (f'<w:jc w:val="{align}"/>' if align else '') + '</w:pPr>'
+    rpr = '<w:rPr><w:b/></w:rPr>' if bold else ''
+    return f'<w:p>{ppr}<w:r>{rpr}{_text(text)}</w:r></w:p>'
+
+
+PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+
+# 同一份選題可一次輸出的版本
+STANDARD = 'standard'        # 標準版：題目附難度，最後附答案卷
+WITH_ANSWERS = 'answers'     # 上簽出題版：題號前標示答案，不另附答案卷
+STUDENT = 'student'          # 學生版：刪除答案與難度
+ANSWER_KEY = 'key'           # 獨立答案卷
+
+
+# 內容區塊種類：各輸出格式（DOCX、PDF）依區塊種類決定樣式
+TITLE, INFO, QUESTION, SUMMARY, PAGE, KEY_TITLE, KEY_ROW = 'title', 'info', 'question', 'summary', 'page', 'key_title', 'key_row'
+
+
+def paper_blocks(questions, class_name, exam_type, subject, paper_type, outputs=(STANDARD,), serial=None):
+    """只走訪一次選好的題目，同時產生多個版本的內容區塊。
+
+    回傳 {版本: [(區塊種類, 內容)]}，答案卷的每一列內容為多個 "題號. 答案" 字串，
+    換頁區塊的內容為 None。各版本來自同一份記憶體中的選題，題目必然一致。
+    serial 為每位考生一份試卷時的試卷編號，印在說明與答案卷標題上。
+    """
+    bodies = {kind: [] for kind in outputs}
+    papers = [bodies[kind] for kind in (STANDARD, WITH_ANSWERS, STUDENT) if kind in bodies]
+
+    # 添加標題與考試信息
+    title = (TITLE, f"海巡署教育訓練測考中心{class_name}梯志願士兵司法警察專長班{exam_type}測驗階段考試（{subject}{paper_type}）")
+    info = (INFO, "選擇題：100％（共50題，每題2分）" + (f"　試卷編號：{serial}" if serial else ""))
+    for body in papers:
+        body.append(title)
+        body.append(info)
+
+    difficulty_counts = {'難': 0, '中': 0, '易': 0}
+    answer_key = []
+
+    # 將選取的題目依序加入文件
+    rows = zip(questions['答案'].tolist(), questions['題目'].tolist(), questions['難度'].tolist(),
+               questions['選項1'].tolist(), questions['選項2'].tolist(), questions['選項3'].tolist(), questions['選項4'].tolist())
+    for question_number, (answer, question_text, difficulty, *options) in enumerate(rows, start=1):
+        options_text = "".join([f"({i+1}){str(opt).strip()}" for i, opt in enumerate(options)])
+        answer_key.append((question_number, answer))
+        difficulty_counts[difficulty] += 1
+
+        if STANDARD in bodies:
+            bodies[STANDARD].append((QUESTION, f"{question_number}、{question_text} {options_text}（{difficulty}）"))
+        if WITH_ANSWERS in bodies:
+            bodies[WITH_ANSWERS].append((QUESTION, f"（{answer}）{question_number}、{question_text} {options_text}（{difficulty}）"))
+        if STUDENT in bodies:
+            bodies[STUDENT].append((QUESTION, f"(){question_number}、{question_text} {options_text}"))
+
+    summary = (SUMMARY, f"難：{difficulty_counts['難']}，中：{difficulty_counts['中']}，易：{difficulty_counts['易']}")
+    for kind in (STANDARD, WITH_ANSWERS):
+        if kind in bodies:
+            bodies[kind].append(summary)
+
+    key_title = (KEY_TITLE, f"{subject}{paper_type} {serial} 答案卷" if serial else f"{subject}{paper_type} 答案卷")
+    answers_per_row = 5
+    key_rows = [(KEY_ROW, [f"{q_num}. {ans}     " for q_num, ans in answer_key[start:start + answers_per_row]])
+                for start in range(0, len(answer_key), answers_per_row)]
+
+    if STANDARD in bodies:
+        bodies[STANDARD].append((PAGE, None))
+        bodies[STANDARD].append(key_title)
+        bodies[STANDARD].extend(key_rows)
+    if ANSWER_KEY in bodies:
+        bodies[ANSWER_KEY].append(key_title)
+        bodies[ANSWER_KEY].extend(key_rows)
+    return bodies
+
+
+def _block_xml(block, content):
+    if block == TITLE:
+        return paragraph(content, style=TITLE_STYLE)
+    if block == INFO:
+        return paragraph(content, style=INFO_STYLE)
+    if block == QUESTION:
+        return paragraph(content, style=QUESTION_STYLE)
+    if block == SUMMARY:
+        return paragraph(content, align='left')
+    if block == PAGE:
+        return PAGE_BREAK
+    if block == KEY_TITLE:
+        return paragraph(content, align='center', bold=True)
+    runs = ''.join(f'<w:r>{_text(cell)}</w:r>' for cell in content)
+    return f'<w:p><w:pPr><w:jc w:val="left"/></w:pPr>{runs}</w:p>'
+
+
+def paper_bodies(questions, class_name, exam_type, subject, paper_type, outputs=(STANDARD,), header_section=None,
+                 serial=None, column_section=None):
+    """同 paper_blocks，但回傳 {版本: 段落 XML 字串的 list}。
+
+    header_section 為雙欄範本結束標題節的段落，插在說明段落之後；column_section 為結束
+    雙欄題目節的段落，插在答案卷換頁之前（沒有答案卷時插在最後一題或難度統計之後）。
+    """
+    blocks = paper_blocks(questions, class_name, exam_type, subject, paper_type, outputs, serial)
+    bodies = {}
+    for kind, body in blocks.items():
+        xml = []
+        for block in body:
+            if block[0] == PAGE and column_section:
+                xml.append(column_section)
+            xml.append(_block_xml(*block))
+            if block[0] == INFO and header_section:
+                xml.append(header_section)
+        if column_section and body and body[-1][0] in (QUESTION, SUMMARY):
+            xml.append(column_section)
+        bodies[kind] = xml
+    return bodies
+
+
+def render_paper_set(questions, class_name, exam_type, subject, paper_type, outputs=(STANDARD,), columns=1,
+                     serial=None, timings=NULL_TIMINGS):
+    """一次輸出同一份選題的多個版本，回傳 {版本: DOCX bytes}。"""
+    with timings.stage('docx_template'):
+        template = get_template(columns)
+    with timings.stage('render_body', paper=paper_type):
+        bodies = paper_bodies(questions, class_name, exam_type, subject, paper_type, outputs, template.header_section,
+                              serial, template.column_section)
+    with timings.stage('docx_package', paper=paper_type):
+        return {kind: template.render(body) for kind, body in bodies.items()}
+
+
+def render_exam(questions, class_name, exam_type, subject, paper_type, show_answers=False, student_version=False):
+    """將選好的題目（標準欄位 DataFrame，依出題順序）輸出為 DOCX bytes。"""
+    kind = STUDENT if student_version else WITH_ANSWERS if show_answers else STANDARD
+    return render_paper_set(questions, class_name, exam_type, subject, paper_type, (kind,))[kind]
@@ -0,0 +1,259 @@
+"""試卷產生核心：不依賴 Streamlit，可供網頁介面、命令列與批次腳本共用。"""
+import dataclasses
+import io
+import os
+import zipfile
+from dataclasses import dataclass
+
+import numpy as np
+
+import batch
+import grading
+import planner
+import shuffle
+from artifact_cache import artifact_key
+from dedup import DuplicateIndex
+from bank_store import CompactBank
+from instrumentation import NULL_TIMINGS
+from question_bank import load_bank
+from usage_store import AVOID_REUSE_DAYS, UsageStore, bank_id
+
+# 每位考生一份試卷時，下載目錄中 ZIP 的名稱
+STUDENT_ARCHIVE = "學生卷"
+
+
+@dataclass
+class ExamConfig:
+    class_name: str = "113-X"
+    exam_type: str = "期中"
+    subject: str = "法律"
+    # 在試卷上顯示答案（上簽出題）
+    show_answers: bool = False
+    # 另外輸出學生版（刪除答案與難度）與獨立答案卷
+    student_version: bool = False
+    answer_key: bool = False
+    # 卷別數量（A、B、C…），各卷題目互不重複；題庫不足時每卷每題庫最多重用 max_overlap 題
+    n_variants: int = 2
+    max_overlap: int = 0
+    # 各題庫總抽題分配（總題數 50 題），A 卷偏難、B 卷偏易的難題分配
+    total_distribution: tuple = (9, 9, 8, 8, 8, 8)
+    a_hard_distribution: tuple = (4, 3, 3, 3, 3, 3)
+    b_hard_distribution: tuple = (2, 2, 2, 2, 2, 2)
+    # 與舊版相同的亂數種子與抽題順序
+    compat: bool = True
+    max_workers: int = None
+    # 以 planner 整體求解題數：總題數與難題數必定符合，題庫不足時直接指出無法滿足的限制
+    solver: bool = False
+    # 每卷每個題庫的最低題數（預設 1）與每卷各難度的題數（預設為難題分配的合計）
+    bank_minimums: tuple = None
+    difficulty_targets: tuple = None
+    seed: int = None
+    # 使用紀錄：排除其他班級 avoid_reuse_days 天內用過的題目（不足時才使用），並記錄本次出題
+    usage_history: bool = False
+    avoid_reuse_days: int = AVOID_REUSE_DAYS
+    usage_db: str = None
+    # 各題庫名稱（通常為檔名），使用紀錄依科目與題庫名稱識別題庫；未指定時取題庫來源的檔名，
+    # 沒有檔名時依題庫順序命名
+    bank_names: tuple = None
+    # 同一份試卷中，近似重複的題目（跨題庫）最多只出一題。None 時依抽題方式決定：相容模式
+    # （compat，與舊版結果一致）不檢查，整體求解與非相容模式檢查；明確指定時一律照用
+    dedupe: bool = None
+    # 輸出格式：docx 或 pdf（PDF 需安裝 reportlab）
+    output_format: str = "docx"
+    # 版面欄數：1 為原本的單欄版面，2 為 A3 橫式雙欄（題目不跨欄、不跨頁）
+    columns: int = 1
+    # 各卷別重排選項順序並平衡答案分布（亂數由 seed 與卷序推得）
+    shuffle_options: bool = False
+    # 每位考生一份題序與選項順序不同的試卷（0 為不使用）：只抽一份題目，由 generate_student_papers 輸出
+    students: int = 0
+
+    def file_name(self, name, suffix=None):
+        # 名稱已含副檔名時（例如答案資料 CSV）不再加上輸出格式
+        if suffix is None:
+            suffix = '' if os.path.splitext(name)[1] else '.' + self.output_format
+        return f"{self.class_name}_{self.exam_type}_{self.subject}_{name}{suffix}"
+
+
+def load_banks(banks, timings=NULL_TIMINGS):
+    """將題庫來源（路徑、bytes、上傳檔或 CompactBank）統一為 CompactBank。"""
+    loaded = []
+    for i, bank in enumerate(banks):
+        if isinstance(bank, CompactBank):
+            loaded.append(bank)
+            continue
+        try:
+            loaded.append(load_bank(bank, timings=timings, bank=i + 1, source=_source_name(bank))[1])
+        except Exception as e:
+            raise ValueError(f"處理檔案 {i+1} 時發生錯誤: {e}") from e
+    return loaded
+
+
+def _source_name(bank):
+    if isinstance(bank, str):
+        return os.path.basename(bank)
+    return getattr(bank, 'name', None)
+
+
+def usage_bank_ids(config, sources=()):
+    """各題庫在使用紀錄中的識別（usage_store.bank_id），不隨檔案內容改變。"""
+    names = list(config.bank_names or [_source_name(source) for source in sources])
+    names += [None] * (len(config.total_distribution) - len(names))
+    return [bank_id(config.subject, name or f"題庫{i + 1}") for i, name in enumerate(names)]
+
+
+def _check_config(banks, config):
+    if len(banks) != len(config.total_distribution):
+        raise ValueError(f"需要 {len(config.total_distribution)} 個題庫檔案，目前為 {len(banks)} 個")
+    if config.output_format not in batch.RENDERERS:
+        raise ValueError(f"不支援的輸出格式：{config.output_format}")
+    if config.columns not in (1, 2):
+        raise ValueError(f"版面欄數只能是 1 或 2，目前為 {config.columns}")
+
+
+def dedupe_enabled(config):
+    """是否檢查近似重複。相容模式需與舊版抽出相同的題目，除非明確開啟，否則不替換重複的題目。"""
+    if config.dedupe is None:
+        return config.solver or not config.compat
+    return config.dedupe
+
+
+def select_exam(banks, config, timings=NULL_TIMINGS, bank_ids=None):
+    """依設定抽出各卷題目（banks 為已載入的 CompactBank），回傳 (卷別名稱, 各卷選題)。
+
+    使用紀錄開啟時依 bank_ids（usage_bank_ids）查詢並記錄本次出題。
+    """
+    bank_ids = bank_ids or usage_bank_ids(config)
+    store = UsageStore(config.usage_db) if config.usage_history else None
+    history = None
+    if store is not None:
+        with timings.stage('usage_history'):
+            history = {i: store.recent_positions(bank, bank_ids[i], config.avoid_reuse_days,
+                                                 exclude_class=config.class_name)
+                       for i, bank in enumerate(banks)}
+
+    duplicates = None
+    if dedupe_enabled(config):
+        with timings.stage('dedup_index'):
+            duplicates = DuplicateIndex.build(banks)
+
+    paper_names = [batch.paper_name(v) for v in range(config.n_variants)]
+    hard_distributions = batch.default_hard_distributions(config.n_variants, config.a_hard_distribution, config.b_hard_distribution)
+    with timings.stage('select', variants=config.n_variants, solver=config.solver):
+        if config.solver:
+            selections = planner.select_planned(
+                banks, config.n_variants, config.total_distribution, hard_distributions, config.max_overlap,
+                config.bank_minimums, config.difficulty_targets, np.random.default_rng(config.seed),
+                paper_names, history, duplicates)
+        else:
+            selections = batch.select_variants(banks, config.n_variants, config.total_distribution,
+                                               hard_distributions, config.max_overlap, config.compat,
+                                               history=history, duplicates=duplicates)
+    if store is not None:
+        store.record_selections(banks, bank_ids, selections, paper_names, config.class_name, config.exam_type,
+                                config.subject)
+    return paper_names, selections
+
+
+def generate_exam(banks, config, timings=NULL_TIMINGS, artifacts=None):
+    """依設定產生所有試卷，回傳 {名稱: DOCX 或 PDF bytes}，名稱如 A卷、學生A卷、A卷答案卷。
+
+    另附 grading.MANIFEST_NAME（答案資料.csv）：各卷每題的來源、答案與選項排列，供批次閱卷使用。
+
+    timings 為 instrumentation.Timings 時記錄各階段與各題庫檔案的耗時。
+    artifacts 為 artifact_cache.ArtifactCache 時，相同題庫與設定直接取回先前產生的試卷。
+    """
+    _check_config(banks, config)
+
+    with timings.profiling():
+        bank_ids = usage_bank_ids(config, banks)
+        banks = load_banks(banks, timings)
+
+        key = artifact_key([bank.digest for bank in banks], config) if artifacts is not None else None
+        if key is not None:
+            with timings.stage('artifact_cache'):
+                papers = artifacts.get(key)
+            if papers is not None:
+                return papers
+
+        paper_names, selections = select_exam(banks, config, timings, bank_ids)
+
+        outputs = batch.paper_outputs(config.show_answers, config.student_version, config.answer_key)
+        jobs = {}
+        manifests = []
+        for variant, (paper_type, selection) in enumerate(zip(paper_names, selections)):
+            with timings.stage('materialize', paper=paper_type):
+                questions = batch.selected_questions(banks, selection)
+            perm = None
+            if config.shuffle_options:
+                with timings.stage('shuffle_options', paper=paper_type):
+                    questions, perm = shuffle.shuffle_options(questions, shuffle.variant_rng(config.seed, variant))
+            manifests.append(grading.paper_manifest(paper_type, questions, batch.selected_banks(selection), perm))
+            jobs[paper_type] = dict(questions=questions, class_name=config.class_name, exam_type=config.exam_type,
+                                    subject=config.subject, paper_type=paper_type, outputs=outputs,
+                                    columns=config.columns, output_format=config.output_format)
+        papers = batch.render_papers(jobs, config.max_workers, timings)
+        papers[grading.MANIFEST_NAME] = grading.manifest_csv(manifests)
+        if key is not None:
+            artifacts.put(key, papers)
+        return papers
+
+
+def student_serial(student, n_students):
+    """試卷編號：001、002…（超過 999 份時增加位數）。"""
+    return f"{student + 1:0{max(3, len(str(n_students)))}d}"
+
+
+def generate_student_papers(banks, config, out, timings=NULL_TIMINGS):
+    """只抽一份題目，為 config.students 位考生各輸出一份題序與選項順序不同的學生版試卷。
+
+    試卷逐份排版並直接寫入 out（路徑或可寫入的檔案物件）的 ZIP，記憶體用量不隨份數增加。
+    ZIP 內另附各卷的答案資料（grading.MANIFEST_NAME，試卷編號即為考生的試卷編號）與
+    排列 npz：orders[考生, 卷上題序] 為原題序、perms[考生, 卷上題序, 新位置] 為原選項序
+    （0 起算），即每份試卷的完整排列。
+    回傳 (試卷編號 list, 各卷答案陣列 (考生數, 題數)，1~4、無答案為 0)。
+    """
+    _check_config(banks, config)
+    if config.students < 1:
+        raise ValueError(f"考生人數至少為 1，目前為 {config.students}")
+
+    with timings.profiling():
+        bank_ids = usage_bank_ids(config, banks)
+        banks = load_banks(banks, timings)
+        paper_names, selections = select_exam(banks, dataclasses.replace(config, n_variants=1), timings, bank_ids)
+        paper_type = paper_names[0]
+        with timings.stage('materialize', paper=paper_type):
+            questions = batch.selected_questions(banks, selections[0])
+
+        with timings.stage('student_permutations', students=config.students):
+            answers = shuffle.answer_codes(questions)
+            orders, perms = shuffle.student_permutations(answers, shuffle.pinned_options(questions), config.students,
+                                                         shuffle.student_rng(config.seed))
+            keys = shuffle.permuted_answers(answers, orders, perms)
+        serials = [student_serial(i, config.students) for i in range(config.students)]
+
+        # 排版工作依序產生，只有行程池中的少數試卷同時存在於記憶體
+        papers = shuffle.student_papers(questions, orders, perms, answers)
+        jobs = ((serial, dict(questions=paper, class_name=config.class_name, exam_type=config.exam_type,
+                              subject=config.subject, paper_type=paper_type, outputs=(batch.STUDENT,),
+                              columns=config.columns, output_format=config.output_format, serial=serial))
+                for serial, paper in zip(serials, papers))
+        with timings.stage('render_students', students=config.students), \
+                zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for serial, outputs in batch.render_stream(jobs, config.max_workers, n_jobs=config.students):
+                archive.writestr(config.file_name(f"學生卷{serial}"), outputs[batch.STUDENT])
+
+            with timings.stage('manifest', students=config.students):
+                bank_numbers = batch.selected_banks(selections[0])
+                manifests = [grading.paper_manifest(serial, questions, bank_numbers, perms[i], orders[i], keys[i])
+                             for i, serial in enumerate(serials)]
+                archive.writestr(config.file_name(grading.MANIFEST_NAME), grading.manifest_csv(manifests))
+
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, serials=np.array(serials), orders=orders, perms=perms, answers=keys)
+            archive.writestr(config.file_name("學生卷排列", ".npz"), buffer.getvalue())
+        return serials, keys
+
+
+def zip_exam(papers, config):
+    """將 generate_exam 的結果以正式檔名打包成 ZIP。"""
+    return batch.zip_papers({config.file_name(name): data for name, data in papers.items()})
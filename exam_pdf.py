@@ -0,0 +1,246 @@
+"""PDF 輸出：不經過 Word，直接以 reportlab 將 paper_blocks 的內容排版為可列印的 PDF。
+
+頁面大小、邊界、字級與 Word 範本相同。字型依序使用 EXAM_PDF_FONT 指定的字型檔、
+系統中的標楷體（kaiu.ttf）或文鼎楷書（ukai.ttc）；都沒有時改用 reportlab 內建、
+不需字型檔的繁體中文 CID 字型，在一般 Linux 主機上也能輸出。reportlab 為選用套件，
+只有輸出 PDF 時才需要安裝。
+"""
+import functools
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from exam_docx import (INFO, KEY_ROW, KEY_TITLE, MARGIN_BOTTOM_CM, MARGIN_LEFT_CM, MARGIN_RIGHT_CM, MARGIN_TOP_CM,
+                       PAGE, PAGE_HEIGHT_CM, PAGE_WIDTH_CM, QUESTION, STANDARD, SUMMARY, TITLE, paper_blocks)
+import layout
+from instrumentation import NULL_TIMINGS
+from layout import COLUMN_GAP_CM, ColumnLayout, measure
+
+PDF_FONT_PATH = os.environ.get('EXAM_PDF_FONT')
+_FONT_CANDIDATES = (
+    '/usr/share/fonts/truetype/kaiu.ttf',
+    '/usr/share/fonts/TTF/kaiu.ttf',
+    os.path.expanduser('~/.fonts/kaiu.ttf'),
+    'C:/Windows/Fonts/kaiu.ttf',
+    '/usr/share/fonts/truetype/arphic/ukai.ttc',
+    '/usr/share/fonts/arphic-ukai/ukai.ttc',
+)
+FALLBACK_FONT = 'MSung-Light'
+# 需明確指定繁體中文的 CMap，否則 reportlab 會寫入與 CNS1 字集不符的簡體編碼
+FALLBACK_ENCODING = 'UniCNS-UCS2-H'
+
+# 各區塊的字級（pt）、對齊與段後距（pt），對應 Word 範本的樣式與預設段落格式
+STYLES = {
+    TITLE: (20, 'center', 10),
+    INFO: (16, 'justify', 10),
+    QUESTION: (16, 'justify', 0),
+    SUMMARY: (11, 'left', 10),
+    KEY_TITLE: (11, 'center', 10),
+    KEY_ROW: (11, 'left', 10),
+}
+# Word 預設的 1.15 倍行距
+LINE_SPACING = 1.15
+# 1 公分的 pt 數（與 reportlab.lib.units.cm 相同）
+CM = 72 / 2.54
+
+# 雙欄排版結果依（卷別、版本）保留，同一份試卷修改少數題目後重新輸出時只重排變動的部分
+LAYOUT_CACHE_SIZE = 16
+
+_layouts = OrderedDict()
+_layouts_lock = threading.Lock()
+
+
+def font_source():
+    """PDF 使用的字型來源：第一個存在的字型檔路徑，都沒有時為內建 CID 字型名稱（不需 reportlab）。"""
+    for path in ([PDF_FONT_PATH] if PDF_FONT_PATH else []) + list(_FONT_CANDIDATES):
+        if os.path.exists(path):
+            return path
+    return FALLBACK_FONT
+
+
+def get_font():
+    """註冊並回傳 PDF 使用的字型名稱。
+
+    每次依 font_source 決定字型，與 artifact_cache 的快取鍵一致；同一個來源只註冊一次。
+    """
+    return _register_font(font_source())
+
+
+@functools.lru_cache(maxsize=None)
+def _register_font(source):
+    # reportlab 只在實際輸出 PDF 時才載入，只產生 DOCX 的行程不必安裝或匯入
+    try:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+        from reportlab.pdfbase.ttfonts import TTFont
+    except ImportError:
+        raise ValueError("輸出 PDF 需要安裝 reportlab（pip install reportlab）") from None
+    if source != FALLBACK_FONT:
+        # 不同字型檔以不同名稱註冊，layout 依字型名稱快取的字寬不會混用
+        name = f'ExamKai-{hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]}'
+        pdfmetrics.registerFont(TTFont(name, source))
+        return name
+    font = UnicodeCIDFont(FALLBACK_FONT)
+    # 文字一律以 UCS-2 寫入，只需更正 PDF 中宣告的 CMap 名稱
+    font.encodingName = FALLBACK_ENCODING
+    pdfmetrics.registerFont(font)
+    return font.fontName
+
+
+class _PageWriter:
+    """以 reportlab canvas 由上而下逐行輸出。"""
+
+    def __init__(self, out, font, page_width_cm=PAGE_WIDTH_CM, page_height_cm=PAGE_HEIGHT_CM):
+        # 字型已由 get_font 註冊，此時 reportlab 必定已安裝
+        from reportlab.pdfgen import canvas
+
+        self.font = font
+        self.page_width, self.page_height = page_width_cm * CM, page_height_cm * CM
+        self.left = MARGIN_LEFT_CM * CM
+        self.width = self.page_width - self.left - MARGIN_RIGHT_CM * CM
+        self.top = self.page_height - MARGIN_TOP_CM * CM
+        self.bottom = MARGIN_BOTTOM_CM * CM
+        # invariant 讓相同內容輸出相同位元組（不寫入建立時間）
+        self.canvas = canvas.Canvas(out, pagesize=(self.page_width, self.page_height), invariant=1, pageCompression=1)
+        self.y = self.top
+        self.blank = True
+
+    def new_page(self):
+        self.canvas.showPage()
+        self.y = self.top
+        self.blank = True
+
+    def line(self, text, line_width, last, size, align, x, width, bold=False):
+        """在目前位置輸出一行並下移一行。"""
+        char_space = 0.0
+        if align == 'center':
+            x += (width - line_width) / 2
+        elif align == 'justify' and not last and len(text) > 1:
+            char_space = (width - line_width) / (len(text) - 1)
+        text_object = self.canvas.beginText(x, self.y - size * 0.88)
+        text_object.setFont(self.font, size)
+        text_object.setCharSpace(char_space)
+        if bold:
+            # CJK 字型沒有粗體，以填滿加外框模擬
+            text_object.setTextRenderMode(2)
+            self.canvas.setLineWidth(size / 30)
+        text_object.textOut(text)
+        self.canvas.drawText(text_object)
+        self.y -= size * LINE_SPACING
+        self.blank = False
+
+    def paragraph(self, block, content):
+        """以整頁寬度輸出一個區塊，超出頁面時自動換頁。"""
+        size, align, space_after = STYLES[block]
+        for text, line_width, last in measure(_block_text(block, content), self.font, size, self.width):
+            if self.y - size * LINE_SPACING < self.bottom and not self.blank:
+                self.new_page()
+            self.line(text, line_width, last, size, align, self.left, self.width, bold=block == KEY_TITLE)
+        self.y -= space_after
+
+    def save(self):
+        self.canvas.save()
+
+
+def _block_text(block, content):
+    return ''.join(content) if block == KEY_ROW else content
+
+
+def _write_blocks(writer, blocks):
+    for block, content in blocks:
+        if block == PAGE:
+            writer.new_page()
+        else:
+            writer.paragraph(block, content)
+
+
+def _write_columns(writer, blocks, column_layout=None):
+    """標題與說明跨欄置頂，題目與難度統計依序排入左右兩欄，換頁後的答案卷以整頁寬度輸出。
+
+    回傳這次使用的 ColumnLayout。
+    """
+    first = next((i for i, (block, _) in enumerate(blocks) if block == QUESTION), len(blocks))
+    last = next((i for i, (block, _) in enumerate(blocks) if block == PAGE), len(blocks))
+    _write_blocks(writer, blocks[:first])
+
+    gap = COLUMN_GAP_CM * CM
+    column_width = (writer.width - gap) / 2
+    flow = blocks[first:last]
+    measured = [measure(_block_text(block, content), writer.font, STYLES[block][0], column_width)
+                for block, content in flow]
+    heights = [len(lines) * STYLES[block][0] * LINE_SPACING + STYLES[block][2]
+               for (block, _), lines in zip(flow, measured)]
+    column_height, first_page_height = writer.top - writer.bottom, writer.y - writer.bottom
+    if (column_layout is None or column_layout.column_height != column_height
+            or column_layout.first_page_height != first_page_height):
+        # 標題行數不同時欄高也不同，先前的排法不能沿用
+        column_layout = ColumnLayout(column_height, first_page_height)
+    column_layout.pack(flow, heights)
+
+    for page_no, page in enumerate(column_layout.pages()):
+        if page_no:
+            writer.new_page()
+        top = writer.y
+        for column, (start, end) in enumerate(page):
+            writer.y = top
+            x = writer.left + column * (column_width + gap)
+            for (block, _), lines in zip(flow[start:end], measured[start:end]):
+                size, align, space_after = STYLES[block]
+                for text, line_width, last_line in lines:
+                    writer.line(text, line_width, last_line, size, align, x, column_width)
+                writer.y -= space_after
+    _write_blocks(writer, blocks[last:])
+    return column_layout
+
+
+def write_pdf(out, blocks, columns=1, column_layout=None):
+    """將 paper_blocks 的單一版本內容寫入 out（檔案或 BytesIO）。
+
+    columns=2 時以 A3 橫式雙欄排版；傳入先前使用的 layout.ColumnLayout 時只重排變動的部分。
+    回傳這次使用的 ColumnLayout（單欄時為 None），可供下次輸出同一份試卷時傳入。
+    """
+    font = get_font()
+    if columns == 2:
+        writer = _PageWriter(out, font, layout.PAGE_WIDTH_CM, layout.PAGE_HEIGHT_CM)
+        column_layout = _write_columns(writer, blocks, column_layout)
+    else:
+        writer = _PageWriter(out, font)
+        _write_blocks(writer, blocks)
+        column_layout = None
+    writer.save()
+    return column_layout
+
+
+def _take_layout(key):
+    # 取出時即自快取移除，同一個 ColumnLayout 不會同時被兩個執行緒修改
+    with _layouts_lock:
+        return _layouts.pop(key, None)
+
+
+def _keep_layout(key, column_layout):
+    with _layouts_lock:
+        _layouts[key] = column_layout
+        while len(_layouts) > LAYOUT_CACHE_SIZE:
+            _layouts.popitem(last=False)
+
+
+def render_paper_set(questions, class_name, exam_type, subject, paper_type, outputs=(STANDARD,), columns=1,
+                     serial=None, timings=NULL_TIMINGS):
+    """一次輸出同一份選題的多個版本，回傳 {版本: PDF bytes}。"""
+    with timings.stage('pdf_font'):
+        get_font()
+    with timings.stage('render_body', paper=paper_type):
+        bodies = paper_blocks(questions, class_name, exam_type, subject, paper_type, outputs, serial)
+    papers = {}
+    with timings.stage('pdf_package', paper=paper_type):
+        for kind, blocks in bodies.items():
+            buffer = io.BytesIO()
+            if columns == 2:
+                key = (paper_type, kind)
+                _keep_layout(key, write_pdf(buffer, blocks, columns, _take_layout(key)))
+            else:
+                write_pdf(buffer, blocks, columns)
+            papers[kind] = buffer.getvalue()
+    return papers
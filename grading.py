@@ -0,0 +1,135 @@
+"""答案資料（manifest）與批次閱卷。
+
+每次產生試卷都另外輸出一份 CSV，每列為一份試卷的一題：試卷編號、題號、原題號
+（同一份選題中的順序）、題庫、序號、難度、正確答案與選項排列。選項排列為四個數字，
+依序為卷面 (1)~(4) 對應的原選項，例如 "3124" 表示卷面 (1) 為原本的選項 3。
+閱卷時將答案資料整理成（試卷 × 題號）的答案矩陣，所有考生的作答一次比對完成。
+
+    python grading.py 答案資料.csv 作答.csv -o 成績.csv
+"""
+import argparse
+import io
+import sys
+
+import numpy as np
+import pandas as pd
+
+# generate_exam 結果中答案資料的名稱（已含副檔名）
+MANIFEST_NAME = "答案資料.csv"
+MANIFEST_COLUMNS = ['試卷編號', '題號', '原題號', '題庫', '序號', '難度', '答案', '選項排列']
+PAPER_ID = '試卷編號'
+IDENTITY_PERMUTATION = '1234'
+
+
+def paper_manifest(paper_id, questions, bank_numbers, perm=None, order=None, answers=None):
+    """一份試卷的答案資料 DataFrame。
+
+    questions 為選題（原題序）的標準欄位 DataFrame，bank_numbers 為各題所屬題庫（1 起算）；
+    order 為卷上各題對應的原題序（None 為原順序），perm 為依卷上題序排列的選項排列
+    （None 為未重排），answers 為卷上各題的答案陣列（1~4，無答案為 0；None 時取 questions 的答案欄）。
+    """
+    n = len(questions)
+    order = np.arange(n) if order is None else np.asarray(order, dtype=np.intp)
+    if perm is None:
+        permutations = np.full(n, IDENTITY_PERMUTATION, dtype=object)
+    else:
+        digits = np.asarray(perm, dtype=np.uint8) + ord('1')
+        permutations = np.array([row.tobytes().decode('ascii') for row in digits], dtype=object)
+    if answers is None:
+        answers = questions['答案'].to_numpy(dtype=object)[order]
+    else:
+        answers = np.where(np.asarray(answers) > 0, np.asarray(answers).astype(str), '')
+    return pd.DataFrame({
+        '試卷編號': paper_id,
+        '題號': np.arange(1, n + 1),
+        '原題號': order + 1,
+        '題庫': np.asarray(bank_numbers)[order],
+        '序號': questions['序號'].to_numpy(dtype=object)[order],
+        '難度': questions['難度'].to_numpy(dtype=object)[order],
+        '答案': answers,
+        '選項排列': permutations,
+    }, columns=MANIFEST_COLUMNS)
+
+
+def manifest_csv(manifests):
+    """將多份試卷的答案資料合併為 CSV bytes（加上 BOM，Excel 才能正確開啟中文）。"""
+    return pd.concat(manifests, ignore_index=True).to_csv(index=False).encode('utf-8-sig')
+
+
+def read_csv(source):
+    """讀取答案資料或作答 CSV（路徑、bytes、檔案物件或 DataFrame），所有欄位保留為文字。"""
+    if isinstance(source, pd.DataFrame):
+        return source
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return pd.read_csv(source, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+
+
+def answer_matrix(manifest):
+    """回傳 (試卷編號 Index, 答案矩陣)：矩陣為 (試卷數, 最大題數) 的 uint8，1~4，無答案或無此題為 0。"""
+    manifest = read_csv(manifest)
+    paper_ids = pd.Index(pd.unique(manifest[PAPER_ID].astype(str)))
+    rows = paper_ids.get_indexer(manifest[PAPER_ID].astype(str))
+    questions = manifest['題號'].astype(int).to_numpy() - 1
+    answers = pd.to_numeric(manifest['答案'], errors='coerce').fillna(0).to_numpy(dtype=np.uint8)
+    keys = np.zeros((len(paper_ids), questions.max() + 1 if len(questions) else 0), dtype=np.uint8)
+    keys[rows, questions] = answers
+    return paper_ids, keys
+
+
+def grade(sheets, manifest, total_score=100):
+    """依答案資料批次閱卷，回傳各考生的答對題數與分數。
+
+    sheets 為作答 CSV（路徑、bytes、檔案物件或 DataFrame）：一列一位考生，須有「試卷編號」欄與
+    以題號（1、2…）為名的作答欄，其他欄位（學號、姓名等）原樣保留在結果中。未作答或無法辨識的
+    作答視為答錯；無答案的題目不計分，分數依該卷有答案的題數平均配分。
+    """
+    sheets = read_csv(sheets)
+    if PAPER_ID not in sheets.columns:
+        raise ValueError(f"作答資料缺少「{PAPER_ID}」欄")
+    paper_ids, keys = answer_matrix(manifest)
+
+    rows = paper_ids.get_indexer(sheets[PAPER_ID].astype(str).str.strip())
+    if (rows < 0).any():
+        unknown = sorted(set(sheets[PAPER_ID][rows < 0].astype(str)))
+        raise ValueError(f"答案資料中沒有這些試卷編號：{'、'.join(unknown)}")
+
+    question_columns = [str(q) for q in range(1, keys.shape[1] + 1)]
+    responses = np.zeros((len(sheets), keys.shape[1]), dtype=np.uint8)
+    present = [q for q, column in enumerate(question_columns) if column in sheets.columns]
+    if present:
+        values = sheets[[question_columns[q] for q in present]].apply(pd.to_numeric, errors='coerce')
+        responses[:, present] = values.where(values.isin([1, 2, 3, 4]), 0).to_numpy(dtype=np.uint8)
+
+    paper_keys = keys[rows]
+    correct = (responses == paper_keys) & (paper_keys > 0)
+    n_correct = correct.sum(axis=1)
+    n_scored = np.maximum((paper_keys > 0).sum(axis=1), 1)
+
+    identity = [column for column in sheets.columns if column not in question_columns]
+    result = sheets[identity].copy()
+    result['答對題數'] = n_correct
+    result['分數'] = np.round(n_correct * total_score / n_scored, 2)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="依答案資料批次閱卷")
+    parser.add_argument("manifest", help="產生試卷時輸出的答案資料 CSV")
+    parser.add_argument("sheets", help="作答 CSV（試卷編號欄加上以題號為名的作答欄）")
+    parser.add_argument("-o", "--output", default=None, help="成績 CSV 輸出路徑（預設輸出到標準輸出）")
+    args = parser.parse_args(argv)
+    try:
+        scores = grade(args.sheets, args.manifest)
+    except ValueError as e:
+        print(f"錯誤：{e}", file=sys.stderr)
+        return 1
+    if args.output:
+        scores.to_csv(args.output, index=False, encoding='utf-8-sig')
+    else:
+        scores.to_csv(sys.stdout, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""輕量的分階段計時與選用的 cProfile 分析。"""
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger("exam.timing")
+
+
+def enable_logging(level=logging.INFO):
+    """讓計時 log 輸出到 stderr（每行一筆 JSON）；重複呼叫不會重複加 handler。"""
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+
+
+class Timings:
+    """記錄各階段（與各題庫檔案）的耗時，並輸出結構化 log。
+
+    profile=True 時以 cProfile 記錄整段流程，可由 profile_report() 取得報表。
+    """
+
+    def __init__(self, profile=False):
+        self.records = []
+        self.profiler = cProfile.Profile() if profile else None
+
+    @contextmanager
+    def stage(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            record = {"stage": name, "seconds": seconds, **labels}
+            self.records.append(record)
+            logger.info(json.dumps({"event": "stage", **record}, ensure_ascii=False))
+
+    @contextmanager
+    def profiling(self):
+        if self.profiler is None:
+            yield
+            return
+        self.profiler.enable()
+        try:
+            yield
+        finally:
+            self.profiler.disable()
+
+    def totals(self):
+        """依階段加總秒數（保留首次出現的順序）。"""
+        totals = {}
+        for record in self.records:
+            totals[record["stage"]] = totals.get(record["stage"], 0.0) + record["seconds"]
+        return totals
+
+    def profile_report(self, limit=30, sort="cumulative"):
+        if self.profiler is None:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class NullTimings:
+    """未要求計時時使用，所有操作皆為空。"""
+
+    records = ()
+    profiler = None
+
+    def stage(self, name, **labels):
+        return nullcontext()
+
+    def profiling(self):
+        return nullcontext()
+
+    def totals(self):
+        return {}
+
+    def profile_report(self, limit=30, sort="cumulative"):
+        return ""
+
+
+NULL_TIMINGS = NullTimings()
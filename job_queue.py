@@ -0,0 +1,296 @@
+"""背景產生試卷的工作佇列：網頁只負責送出工作與查詢進度，不會在按鈕中卡住。
+
+工作狀態存在 SQLite，由伺服器行程中的派工執行緒依優先順序交給 spawn 行程池執行；
+互動式的小型工作（兩份卷別以內）優先於大量卷別或每位考生一份試卷的批次工作。完成的試卷以工作代號
+存入 artifact_store 供下載。伺服器重新啟動後，尚未開始的工作會繼續執行。
+相同題庫與設定的請求若已在佇列中或執行中，直接共用同一個工作。
+
+多個伺服器行程可共用同一個 EXAM_JOB_DIR：派工時以單一 UPDATE 認領工作，只有狀態仍為
+排隊中才會成功，同一個工作不會執行兩次。執行中的工作記錄所屬行程並定期更新心跳，
+只有所屬行程已結束或心跳逾時的工作才會重新排入佇列。
+"""
+import dataclasses
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import partial
+
+from artifact_cache import ArtifactCache, artifact_key
+from artifact_store import ArtifactStore
+from instrumentation import Timings, enable_logging
+
+JOB_DIR = os.environ.get('EXAM_JOB_DIR', os.path.join(tempfile.gettempdir(), 'exam_jobs'))
+# 同時執行的工作數；保留一個 CPU 給 Streamlit 本身
+JOB_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+POLL_INTERVAL = 0.2
+# 執行中工作的心跳間隔；超過 STALE_AFTER 秒沒有心跳的工作視為所屬行程已中斷
+HEARTBEAT_INTERVAL = 5
+STALE_AFTER = 60
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+INTERACTIVE, BATCH = 0, 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    banks TEXT NOT NULL,
+    config TEXT NOT NULL,
+    artifact_key TEXT,
+    profile INTEGER NOT NULL DEFAULT 0,
+    profile_report TEXT,
+    stage TEXT,
+    error TEXT,
+    timings TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    owner TEXT,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority, created);
+CREATE INDEX IF NOT EXISTS jobs_artifact ON jobs (artifact_key, status);
+"""
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _owner_alive(owner):
+    """所屬行程是否仍在執行；只能判斷同一台主機上的行程，其他主機一律視為仍在執行（改依心跳判斷）。"""
+    host, _, pid = (owner or '').rsplit(':', 1)[0].rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit() or os.name != 'posix':
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _update(db_path, job_id, **fields):
+    columns = ', '.join(f'{name} = ?' for name in fields)
+    with _connect(db_path) as conn:
+        conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', [*fields.values(), job_id])
+
+
+class _JobTimings(Timings):
+    """記錄耗時之外，進入每個階段時把目前階段寫回工作狀態，供網頁顯示進度。"""
+
+    def __init__(self, db_path, job_id, profile=False):
+        super().__init__(profile=profile)
+        self.db_path = db_path
+        self.job_id = job_id
+
+    @contextmanager
+    def stage(self, name, **labels):
+        _update(self.db_path, self.job_id, stage=json.dumps({'stage': name, **labels}, ensure_ascii=False))
+        with super().stage(name, **labels):
+            yield
+
+
+def run_job(job_id, db_path, download_dir=None, store_dir=None):
+    """在工作行程中執行一個已認領的工作（需為模組層級函式，spawn 行程才能載入）。"""
+    from exam_engine import STUDENT_ARCHIVE, ExamConfig, generate_exam, generate_student_papers
+    from question_bank import load_stored_bank
+
+    # spawn 行程不會繼承伺服器的 logging 設定，與命令列相同輸出各階段耗時
+    enable_logging()
+    with _connect(db_path) as conn:
+        row = conn.execute('SELECT banks, config, profile FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    timings = _JobTimings(db_path, job_id, bool(row['profile']))
+    try:
+        banks = [load_stored_bank(digest, store_dir, timings, bank=i + 1)
+                 for i, digest in enumerate(json.loads(row['banks']))]
+        config = ExamConfig(**json.loads(row['config']))
+        # 工作本身已在獨立行程中，排版不再另開行程池
+        config.max_workers = 1
+        if config.students:
+            # 每位考生一份試卷時逐份寫入下載目錄中的 ZIP
+            ArtifactStore(download_dir).put_stream(
+                STUDENT_ARCHIVE, lambda fh: generate_student_papers(banks, config, fh, timings), handle=job_id)
+        else:
+            # 效能分析需要實際執行各階段，不取用快取
+            papers = generate_exam(banks, config, timings, None if row['profile'] else ArtifactCache())
+            ArtifactStore(download_dir).put(papers, handle=job_id)
+    except Exception as e:
+        _update(db_path, job_id, status=FAILED, error=str(e), finished=time.time(),
+                timings=json.dumps(timings.records, ensure_ascii=False))
+        return FAILED
+    _update(db_path, job_id, status=DONE, stage=None, finished=time.time(),
+            timings=json.dumps(timings.records, ensure_ascii=False), profile_report=timings.profile_report())
+    return DONE
+
+
+class JobQueue:
+    """SQLite 工作佇列加上派工執行緒與 spawn 行程池（整個伺服器行程共用一個）。"""
+
+    def __init__(self, job_dir=None, max_workers=None, store_dir=None, download_dir=None):
+        self.job_dir = job_dir or JOB_DIR
+        self.db_path = os.path.join(self.job_dir, 'jobs.sqlite3')
+        self.max_workers = max_workers or JOB_WORKERS
+        self.store_dir = store_dir
+        # 完成的試卷以工作代號為代號存放
+        self.downloads = ArtifactStore(download_dir)
+        # 認領工作時記錄的識別（主機:行程代號:佇列代號）
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.job_dir, exist_ok=True)
+        with _connect(self.db_path) as conn:
+            # WAL 模式記錄在資料庫檔案中，設定一次即可讓輪詢與工作行程的寫入互不阻塞
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+        # 上次伺服器結束時中斷的工作重新排入佇列；其他仍在執行的伺服器行程的工作不受影響
+        self.requeue_stale()
+        self._last_heartbeat = 0.0
+        self._pool = None
+        self._running = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, bank_digests, config, priority=None, profile=False):
+        """送出工作，回傳工作代號。config 為 exam_engine.ExamConfig；profile 為真時以 cProfile 執行。"""
+        if priority is None:
+            priority = INTERACTIVE if config.n_variants <= 2 and not config.students else BATCH
+        key = None if profile else artifact_key(bank_digests, config)
+        job_id = uuid.uuid4().hex
+        with _connect(self.db_path) as conn:
+            if key is not None:
+                same = conn.execute('SELECT id FROM jobs WHERE artifact_key = ? AND status IN (?, ?)',
+                                    (key, QUEUED, RUNNING)).fetchone()
+                if same is not None:
+                    return same['id']
+            conn.execute(
+                'INSERT INTO jobs (id, status, priority, banks, config, artifact_key, profile, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, QUEUED, priority, json.dumps(list(bank_digests)),
+                 json.dumps(dataclasses.asdict(config), ensure_ascii=False), key, int(profile), time.time()))
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def status(self, job_id):
+        """回傳工作狀態 dict（status、stage、error、timings、profile_report、created、started、finished），不存在時為 None。"""
+        with _connect(self.db_path) as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['stage'] = json.loads(job['stage']) if job['stage'] else None
+        job['timings'] = json.loads(job['timings']) if job['timings'] else []
+        if job['status'] == QUEUED:
+            with _connect(self.db_path) as conn:
+                job['position'] = conn.execute(
+                    'SELECT COUNT(*) FROM jobs WHERE status = ? AND (priority < ? OR (priority = ? AND created < ?))',
+                    (QUEUED, row['priority'], row['priority'], row['created'])).fetchone()[0]
+        return job
+
+    def result(self, job_id):
+        """完成的工作的試卷 {顯示名稱: DOCX bytes}；網頁介面改以 self.downloads 依工作代號讀檔。"""
+        return self.downloads.read_all(job_id)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._dispatch, name='exam-job-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _finished(self, job_id, future):
+        # run_job 會自行記錄結果；工作行程異常結束時在此補記為失敗
+        if future.exception() is not None:
+            _update(self.db_path, job_id, status=FAILED, error=str(future.exception()), finished=time.time())
+        self._wakeup.set()
+
+    def requeue_stale(self, now=None):
+        """將所屬行程已結束或心跳逾時的執行中工作重新排入佇列，回傳重新排入的工作數。"""
+        now = now or time.time()
+        with _connect(self.db_path) as conn:
+            rows = conn.execute('SELECT id, owner, heartbeat FROM jobs WHERE status = ?', (RUNNING,)).fetchall()
+            stale = [(row['id'], row['owner']) for row in rows
+                     if row['owner'] != self.owner
+                     and (row['heartbeat'] is None or row['heartbeat'] < now - STALE_AFTER
+                          or not _owner_alive(row['owner']))]
+            # 條件中再次確認狀態與所屬行程，其他行程在此期間更新過的工作不受影響
+            conn.executemany('UPDATE jobs SET status = ?, owner = NULL, heartbeat = NULL, started = NULL, stage = NULL '
+                             'WHERE id = ? AND status = ? AND owner IS ?',
+                             [(QUEUED, job_id, RUNNING, owner) for job_id, owner in stale])
+        return len(stale)
+
+    def _heartbeat(self):
+        now = time.time()
+        if now - self._last_heartbeat < HEARTBEAT_INTERVAL:
+            return
+        self._last_heartbeat = now
+        with _connect(self.db_path) as conn:
+            conn.execute('UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = ?', (now, self.owner, RUNNING))
+        self.requeue_stale(now)
+
+    def _claim(self, job_id):
+        """以單一 UPDATE 認領排隊中的工作並記錄開始時間；其他行程已認領時回傳 False。"""
+        now = time.time()
+        with _connect(self.db_path) as conn:
+            cursor = conn.execute(
+                'UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, started = ? WHERE id = ? AND status = ?',
+                (RUNNING, self.owner, now, now, job_id, QUEUED))
+        return cursor.rowcount == 1
+
+    def _next_jobs(self, limit):
+        with _connect(self.db_path) as conn:
+            rows = conn.execute(
+                'SELECT id FROM jobs WHERE status = ? ORDER BY priority, created LIMIT ?', (QUEUED, limit)).fetchall()
+        return [row['id'] for row in rows]
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            self._running = {job_id: f for job_id, f in self._running.items() if not f.done()}
+            self._heartbeat()
+            free = self.max_workers - len(self._running)
+            if free > 0:
+                for job_id in self._next_jobs(free):
+                    if not self._claim(job_id):
+                        continue
+                    if self._pool is None:
+                        self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+                    try:
+                        future = self._pool.submit(run_job, job_id, self.db_path,
+                                                   self.downloads.store_dir, self.store_dir)
+                    except BrokenProcessPool:
+                        # 先前的工作行程異常結束使行程池無法使用：重建行程池，工作放回佇列由下一輪執行
+                        _update(self.db_path, job_id, status=QUEUED, owner=None, heartbeat=None, started=None)
+                        self._pool.shutdown(wait=False)
+                        self._pool = None
+                        break
+                    except Exception as e:
+                        _update(self.db_path, job_id, status=FAILED, error=str(e), finished=time.time())
+                        continue
+                    future.add_done_callback(partial(self._finished, job_id))
+                    self._running[job_id] = future
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+
@@ -0,0 +1,151 @@
+"""雙欄版面引擎：依實際字型寬度量測題目，將題目依序排入 A3 橫式的左右兩欄。
+
+每題的斷行結果依（文字、字型、字級、欄寬）快取，題目不會被拆到兩欄或兩頁。
+題目必須依題號順序排列，因此「放不下就換欄」的貪婪排法即可得到最少的欄數（頁數）；
+最後一頁再平衡左右兩欄的高度。修改少數題目後重新排版時，只重新量測變動的題目，
+並從變動處所在的欄開始重排，排到與先前結果相同的位置後直接沿用。
+"""
+import functools
+
+# 雙欄版面使用真正的 A3 橫式（寬 42、高 29.7 公分），兩欄間距 1 公分
+PAGE_WIDTH_CM, PAGE_HEIGHT_CM = 42.0, 29.7
+COLUMN_GAP_CM = 1.0
+COLUMNS_PER_PAGE = 2
+MEASURE_CACHE_SIZE = 65536
+
+# 每個字型、字級的字元寬度只量測一次
+_char_widths = {}
+
+
+def char_width(char, font, size):
+    key = (char, font, size)
+    width = _char_widths.get(key)
+    if width is None:
+        # 只有量測新字元時才需要 reportlab（由 exam_pdf.get_font 確認已安裝）
+        from reportlab.pdfbase import pdfmetrics
+
+        width = _char_widths[key] = pdfmetrics.stringWidth(char, font, size)
+    return width
+
+
+def wrap(text, font, size, width):
+    """依字型寬度將文字斷行，回傳 [(行文字, 行寬, 是否為段落最後一行)]。
+
+    中文可在任意字元間斷行；英數字詞盡量不從中間斷開。
+    """
+    lines = []
+    for paragraph in str(text).replace('\r', '\n').split('\n'):
+        line, line_width = [], 0.0
+        for char in paragraph:
+            w = char_width(char, font, size)
+            if line and line_width + w > width:
+                cut = len(line)
+                if char.isascii() and char.isalnum():
+                    # 英數字詞改從最後一個空白處斷行
+                    space = next((i for i in range(len(line) - 1, -1, -1) if line[i] == ' '), None)
+                    if space is not None and space > 0:
+                        cut = space + 1
+                head, line = line[:cut], line[cut:]
+                lines.append((''.join(head), sum(char_width(c, font, size) for c in head), False))
+                line_width = sum(char_width(c, font, size) for c in line)
+            line.append(char)
+            line_width += w
+        lines.append((''.join(line), line_width, True))
+    return lines
+
+
+@functools.lru_cache(maxsize=MEASURE_CACHE_SIZE)
+def measure(text, font, size, width):
+    """快取的斷行結果（tuple），同一題在不同卷別、版本或重新排版時不再重新量測。"""
+    return tuple(wrap(text, font, size, width))
+
+
+def balance(heights, capacity):
+    """將依序排列的題目分成兩欄，回傳使較高一欄最矮的分割點（第二欄的起點）。"""
+    total = sum(heights)
+    best, best_split = None, len(heights)
+    left = 0.0
+    for split in range(len(heights) + 1):
+        if left > capacity:
+            break
+        tallest = max(left, total - left)
+        if tallest <= capacity and (best is None or tallest < best):
+            best, best_split = tallest, split
+        if split < len(heights):
+            left += heights[split]
+    return best_split
+
+
+class ColumnLayout:
+    """依序將題目高度排入欄位；第一頁的欄位高度可扣除標題所佔的空間。
+
+    columns 為每欄的 (起始題, 結束題) 區間，連續兩欄為一頁。pack 可重複呼叫，
+    只重排與上一次不同的部分。
+    """
+
+    def __init__(self, column_height, first_page_height=None, columns_per_page=COLUMNS_PER_PAGE):
+        self.column_height = column_height
+        self.first_page_height = column_height if first_page_height is None else first_page_height
+        self.columns_per_page = columns_per_page
+        self.keys = []
+        self.heights = []
+        self.columns = []
+        # 最近一次 pack 實際重新放置的題數
+        self.repacked = 0
+
+    def capacity(self, column):
+        return self.first_page_height if column < self.columns_per_page else self.column_height
+
+    def pack(self, keys, heights):
+        """排入新的題目序列，回傳每欄的 (起始, 結束) 區間。"""
+        keys, heights = list(keys), list(heights)
+        old_keys, old_columns = self.keys, self.columns
+        prefix = 0
+        while prefix < min(len(keys), len(old_keys)) and keys[prefix] == old_keys[prefix]:
+            prefix += 1
+        suffix = 0
+        while (suffix < min(len(keys), len(old_keys)) - prefix
+               and keys[len(keys) - 1 - suffix] == old_keys[len(old_keys) - 1 - suffix]):
+            suffix += 1
+        delta = len(keys) - len(old_keys)
+        old_starts = {start: column for column, (start, _) in enumerate(old_columns)}
+
+        # 保留變動處之前的欄；結束於變動處的欄也要重排，變動後的題目可能放得進去
+        columns = []
+        for start, end in old_columns:
+            if end >= prefix:
+                break
+            columns.append((start, end))
+        position = columns[-1][1] if columns else 0
+
+        self.repacked = 0
+        while position < len(keys):
+            column = len(columns)
+            old_column = old_starts.get(position - delta)
+            if (position >= len(keys) - suffix and old_column is not None
+                    and (old_column == column or min(old_column, column) >= self.columns_per_page)):
+                # 之後的題目與上次相同、起點相同且之後各欄高度相同，排法必然相同
+                columns.extend((start + delta, end + delta) for start, end in old_columns[old_column:])
+                break
+            capacity, used, end = self.capacity(column), 0.0, position
+            while end < len(keys) and (end == position or used + heights[end] <= capacity):
+                used += heights[end]
+                end += 1
+            self.repacked += end - position
+            columns.append((position, end))
+            position = end
+
+        self.keys, self.heights, self.columns = keys, heights, columns
+        return columns
+
+    def pages(self, balance_last=True):
+        """依頁分組的欄位區間；最後一頁兩欄的高度平衡（不影響頁數）。"""
+        pages = [self.columns[i:i + self.columns_per_page] for i in range(0, len(self.columns), self.columns_per_page)]
+        if balance_last and pages and self.columns_per_page == 2:
+            last = pages[-1]
+            start, end = last[0][0], last[-1][1]
+            capacity = self.capacity(len(self.columns) - len(last))
+            split = start + balance(self.heights[start:end], capacity)
+            if start < split < end or len(last) == 2:
+                pages[-1] = [(start, split), (split, end)]
+        return pages
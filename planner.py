@@ -0,0 +1,340 @@
+"""以整體限制求解各卷的抽題題數，再依題數從難度索引抽題。
+
+限制包含：每卷總題數、各難度題數、每個題庫的最低題數，以及卷別之間的重用上限
+（每卷每題庫最多重用 max_overlap 題先前卷別的題目）。各卷以最小成本流求出
+{題庫, 難度} 的題數，盡量貼近原本的各題庫題數與難題分配；無解時立即拋出
+InfeasibleSelection，並指出是哪一個限制無法滿足，不會默默少出題。
+"""
+import numpy as np
+
+import sampler
+from bank_store import DIFFICULTY_CODES
+
+_EMPTY = np.empty(0, dtype=np.intp)
+_INF = 1 << 30
+
+# 成本：未滿足題庫最低題數視同無解，其次盡量不重用、不用其他班級近期用過的題目、不偏離原本的分配
+_MINIMUM_COST = -1000
+_REUSE_COST = 20
+_RECENT_COST = 10
+_EXTRA_BANK_COST = 3
+_EXTRA_HARD_COST = 2
+_MEDIUM_COST = 1
+
+
+class InfeasibleSelection(ValueError):
+    """限制無法同時滿足。constraint 為限制類型（total、difficulty、bank_minimum、duplicates）。"""
+
+    def __init__(self, message, constraint, paper=None):
+        super().__init__(message)
+        self.constraint = constraint
+        self.paper = paper
+
+
+class _FlowGraph:
+    """節點數很少（約 20 個）的最小成本流，以 Bellman-Ford 逐次找最短增廣路徑。"""
+
+    def __init__(self):
+        self.edges = []
+        self.adjacent = {}
+
+    def add(self, u, v, capacity, cost=0):
+        if capacity <= 0:
+            return None
+        index = len(self.edges)
+        self.edges.append([u, v, capacity, cost, 0])
+        self.edges.append([v, u, 0, -cost, 0])
+        self.adjacent.setdefault(u, []).append(index)
+        self.adjacent.setdefault(v, []).append(index + 1)
+        return index
+
+    def flow(self, index):
+        return 0 if index is None else self.edges[index][4]
+
+    def solve(self, source, sink, demand):
+        total = 0
+        while total < demand:
+            distance = {source: 0}
+            previous = {}
+            for _ in range(len(self.adjacent)):
+                updated = False
+                for u in list(distance):
+                    for index in self.adjacent.get(u, ()):
+                        _, v, capacity, cost, flow = self.edges[index]
+                        if capacity - flow > 0 and distance[u] + cost < distance.get(v, _INF):
+                            distance[v] = distance[u] + cost
+                            previous[v] = index
+                            updated = True
+                if not updated:
+                    break
+            if sink not in distance:
+                break
+            path = []
+            node = sink
+            while node != source:
+                path.append(previous[node])
+                node = self.edges[previous[node]][0]
+            amount = min(demand - total, min(self.edges[i][2] - self.edges[i][4] for i in path))
+            for i in path:
+                self.edges[i][4] += amount
+                self.edges[i ^ 1][4] -= amount
+            total += amount
+        return total
+
+
+def _pool_label(difficulties):
+    return '／'.join(name for name, code in DIFFICULTY_CODES.items() if code in difficulties)
+
+
+def plan_paper(supply, reusable, total, targets, bank_minimums, preferred, preferred_hard, prefer_easy=False,
+               max_overlap=0, paper=None, recent=None):
+    """求出一卷各 {題庫, 難度} 的抽題數。
+
+    supply、reusable、recent 為 (題庫數, 3) 的可用題數（未用過／先前卷別用過／其他班級
+    近期用過）；targets 為 {難度代碼: 題數}，未指定的難度合併補足其餘題數。
+    max_overlap 為每個題庫可重用的題數（整數，或每個題庫一個值）。
+    回傳 (新題數, 近期用過題數, 重用題數)，皆為 {(題庫, 難度代碼或難度代碼 tuple): 題數}。
+    """
+    if recent is None:
+        recent = np.zeros_like(supply)
+    prefix = f"{paper}：" if paper else ""
+    n_banks = len(supply)
+    overlap = np.broadcast_to(np.asarray(max_overlap, dtype=np.int64), n_banks)
+    targeted = sorted(targets)
+    rest = tuple(code for code in DIFFICULTY_CODES.values() if code not in targets)
+    rest_total = total - sum(targets.values())
+    if rest_total < 0:
+        raise InfeasibleSelection(f"{prefix}各難度指定題數合計 {sum(targets.values())} 題，超過總題數 {total} 題",
+                                  'difficulty', paper)
+    if sum(bank_minimums) > total:
+        raise InfeasibleSelection(f"{prefix}各題庫最低題數合計 {sum(bank_minimums)} 題，超過總題數 {total} 題",
+                                  'bank_minimum', paper)
+
+    # 題數未指定的難度：偏易的卷別先補易題，其他卷別合併成一組均勻抽樣
+    if prefer_easy or not rest:
+        rest_groups = [((code,), _MEDIUM_COST if code != DIFFICULTY_CODES['易'] else 0) for code in rest]
+    else:
+        rest_groups = [(rest, 0)]
+
+    graph = _FlowGraph()
+    source, sink, rest_node = 'S', 'T', 'R'
+    for code in targeted:
+        graph.add(('D', code), sink, targets[code])
+    graph.add(rest_node, sink, rest_total)
+
+    minimum_edges = {}
+    fresh_edges = {}
+    recent_edges = {}
+    reuse_edges = {}
+    for b in range(n_banks):
+        bank = ('B', b)
+        minimum_edges[b] = graph.add(source, bank, bank_minimums[b], _MINIMUM_COST)
+        graph.add(source, bank, max(preferred[b] - bank_minimums[b], 0))
+        graph.add(source, bank, _INF, _EXTRA_BANK_COST)
+
+        for code in targeted:
+            available = int(supply[b][code])
+            if code == DIFFICULTY_CODES['難']:
+                # 先用原本分配給此題庫的難題數，其餘難題改由其他題庫補
+                within = min(available, preferred_hard[b])
+                fresh_edges[(b, code, 0)] = graph.add(bank, ('D', code), within)
+                fresh_edges[(b, code, 1)] = graph.add(bank, ('D', code), available - within, _EXTRA_HARD_COST)
+            else:
+                fresh_edges[(b, code, 0)] = graph.add(bank, ('D', code), available)
+        for group, cost in rest_groups:
+            fresh_edges[(b, group, 0)] = graph.add(bank, rest_node, int(sum(supply[b][code] for code in group)), cost)
+
+        # 其他班級近期用過的題目，新題目不足時才使用
+        for code in targeted:
+            recent_edges[(b, code)] = graph.add(bank, ('D', code), int(recent[b][code]), _RECENT_COST)
+        for group, cost in rest_groups:
+            recent_edges[(b, group)] = graph.add(bank, rest_node, int(sum(recent[b][code] for code in group)),
+                                                 _RECENT_COST + cost)
+
+        if overlap[b] > 0:
+            reuse = ('U', b)
+            graph.add(bank, reuse, int(overlap[b]), _REUSE_COST)
+            for code in targeted:
+                reuse_edges[(b, code)] = graph.add(reuse, ('D', code), int(reusable[b][code]))
+            for group, cost in rest_groups:
+                reuse_edges[(b, group)] = graph.add(reuse, rest_node, int(sum(reusable[b][code] for code in group)), cost)
+
+    flowed = graph.solve(source, sink, total)
+
+    if flowed < total:
+        for code in targeted:
+            available = int(sum(supply[b][code] + recent[b][code] + min(reusable[b][code], overlap[b])
+                                for b in range(n_banks)))
+            if available < targets[code]:
+                raise InfeasibleSelection(
+                    f"{prefix}需要{_pool_label((code,))}題 {targets[code]} 題，但各題庫可用的只有 {available} 題",
+                    'difficulty', paper)
+        available = int(sum(sum(supply[b][code] + recent[b][code] for code in rest)
+                            + min(sum(reusable[b][code] for code in rest), overlap[b]) for b in range(n_banks)))
+        if rest and available < rest_total:
+            raise InfeasibleSelection(
+                f"{prefix}需要{_pool_label(rest)}題 {rest_total} 題，但各題庫可用的只有 {available} 題",
+                'difficulty', paper)
+        raise InfeasibleSelection(
+            f"{prefix}需要 {total} 題，但在各難度與重用限制下只能選出 {flowed} 題", 'total', paper)
+    for b in range(n_banks):
+        if graph.flow(minimum_edges[b]) < bank_minimums[b]:
+            available = int(sum(supply[b]) + sum(recent[b]) + min(sum(reusable[b]), overlap[b]))
+            raise InfeasibleSelection(
+                f"{prefix}題庫 {b + 1} 至少需 {bank_minimums[b]} 題，但可用的只有 {available} 題",
+                'bank_minimum', paper)
+
+    fresh = {}
+    for (b, key, _), index in fresh_edges.items():
+        if graph.flow(index):
+            fresh[(b, key)] = fresh.get((b, key), 0) + graph.flow(index)
+    recently_used = {(b, key): graph.flow(index) for (b, key), index in recent_edges.items() if graph.flow(index)}
+    reused = {(b, key): graph.flow(index) for (b, key), index in reuse_edges.items() if graph.flow(index)}
+    return fresh, recently_used, reused
+
+
+def _check_totals(banks, n_variants, total, targets, max_overlap):
+    """跨卷別的必要條件，在逐卷求解前先檢查，快速指出不足的限制。"""
+    reuse_allowance = max_overlap * len(banks) * (n_variants - 1)
+    rows = sum(len(bank) for bank in banks)
+    if n_variants * total > rows + reuse_allowance:
+        raise InfeasibleSelection(
+            f"{n_variants} 份試卷共需 {n_variants * total} 題，題庫只有 {rows} 題"
+            + (f"（含可重用 {reuse_allowance} 題）" if reuse_allowance else "（可調高卷別間可重用題數）"),
+            'total')
+    for code in DIFFICULTY_CODES.values():
+        needed = sum(t.get(code, 0) for t in targets)
+        available = sum(len(bank.groups('難度').get(code, _EMPTY)) for bank in banks)
+        if needed > available + reuse_allowance:
+            raise InfeasibleSelection(
+                f"{n_variants} 份試卷共需{_pool_label((code,))}題 {needed} 題，題庫只有 {available} 題", 'difficulty')
+
+
+def _draw_group(bank, group, count, rng, excluded):
+    """從 group 難度中抽出 count 個不在 excluded 的題目（成本只與題數相關）。"""
+    strata = bank.groups('難度')
+    if len(group) == 1:
+        stratum = strata.get(group[0], _EMPTY)
+    else:
+        stratum = np.sort(np.concatenate([strata.get(code, _EMPTY) for code in group]))
+    n_excluded = sum(1 for pos in excluded if bank.difficulty[pos] in group)
+    return sampler.sample_stratum(stratum, count, rng, excluded, n_excluded)
+
+
+def _pick(bank, candidates, group, count, rng):
+    pool = np.array(sorted(pos for pos in candidates if bank.difficulty[pos] in group), dtype=np.intp)
+    return rng.choice(pool, count, replace=False)
+
+
+def _difficulty_counts(banks, position_sets, n_codes):
+    """每個題庫的列位置集合中各難度的題數，shape (題庫數, 難度數)。"""
+    counts = np.zeros((len(banks), n_codes), dtype=np.int64)
+    for b, (bank, positions) in enumerate(zip(banks, position_sets)):
+        if positions:
+            counts[b] = np.bincount(bank.difficulty[np.fromiter(positions, dtype=np.intp, count=len(positions))],
+                                    minlength=n_codes)
+    return counts
+
+
+def _draw_planned(b, bank, plan, rng, excluded, recent, used):
+    """依 plan_paper 的結果從一個題庫抽題（excluded 為不可抽的新題目，recent、used 為可用的舊題目）。"""
+    fresh, recently_used, reused = plan
+    parts = []
+    for (bank_no, key), count in fresh.items():
+        if bank_no == b:
+            parts.append(_draw_group(bank, key if isinstance(key, tuple) else (key,), count, rng, excluded))
+    for (bank_no, key), count in recently_used.items():
+        if bank_no == b:
+            parts.append(_pick(bank, recent, key if isinstance(key, tuple) else (key,), count, rng))
+    for (bank_no, key), count in reused.items():
+        if bank_no == b:
+            parts.append(_pick(bank, used, key if isinstance(key, tuple) else (key,), count, rng))
+    return rng.permutation(np.concatenate(parts).astype(np.intp)) if parts else _EMPTY
+
+
+def select_planned(banks, n_variants, total_distribution, hard_distributions, max_overlap=0, bank_minimums=None,
+                   difficulty_targets=None, rng=None, paper_names=None, history=None, duplicates=None):
+    """與 batch.select_variants 相同的回傳格式，但每卷題數與難度分配由 plan_paper 求解。
+
+    difficulty_targets 為每卷一個 {難度: 題數}（難度可為「難」或代碼），預設為各卷難題分配的合計；
+    bank_minimums 預設每個題庫至少 1 題。history 為 {題庫序: 列位置陣列}（其他班級近期用過的題目），
+    只在新題目不足時才使用。duplicates 為 dedup.DuplicateIndex，每份試卷每個近似重複群組最多一題。
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    total = sum(total_distribution)
+    bank_minimums = list(bank_minimums) if bank_minimums is not None else [min(1, t) for t in total_distribution]
+    if difficulty_targets is None:
+        difficulty_targets = [{'難': sum(hard)} for hard in hard_distributions]
+    targets = [{DIFFICULTY_CODES.get(k, k): int(v) for k, v in t.items()} for t in difficulty_targets]
+    paper_names = paper_names or [f"第 {v + 1} 卷" for v in range(n_variants)]
+    _check_totals(banks, n_variants, total, targets, max_overlap)
+
+    n_codes = len(DIFFICULTY_CODES)
+    history = history or {}
+    used = [set() for _ in banks]
+    recent = [set(np.asarray(history.get(b, ()), dtype=np.intp).tolist()) for b in range(len(banks))]
+    used_counts = np.zeros((len(banks), n_codes), dtype=np.int64)
+    recent_counts = np.zeros((len(banks), n_codes), dtype=np.int64)
+    for b, bank in enumerate(banks):
+        for pos in recent[b]:
+            recent_counts[b, bank.difficulty[pos]] += 1
+    sizes = np.array([[len(bank.groups('難度').get(code, _EMPTY)) for code in range(n_codes)] for bank in banks])
+    selections = []
+    hard = DIFFICULTY_CODES['難']
+    for variant in range(n_variants):
+        paper = paper_names[variant]
+        selection = {b: _EMPTY for b in range(len(banks))}
+        taken_groups = set()
+        # 近似重複的題目被移除而不足時，以其餘題數重新求解，改由其他題庫或難度補足
+        for attempt in range(total + 1):
+            selected = sum(len(positions) for positions in selection.values())
+            if selected == total:
+                break
+            # 本卷已選的題目與已選群組的重複題目都不可再抽
+            hidden = [set(selection[b].tolist()) | (set(duplicates.blocked(b, taken_groups)) if duplicates is not None else set())
+                      for b in range(len(banks))]
+            chosen = _difficulty_counts(banks, [selection[b].tolist() for b in range(len(banks))], n_codes)
+            supply = sizes - used_counts - recent_counts - _difficulty_counts(
+                banks, [hidden[b] - used[b] - recent[b] for b in range(len(banks))], n_codes)
+            reusable = used_counts - _difficulty_counts(banks, [hidden[b] & used[b] for b in range(len(banks))], n_codes)
+            recent_supply = recent_counts - _difficulty_counts(
+                banks, [hidden[b] & recent[b] for b in range(len(banks))], n_codes)
+            try:
+                plan = plan_paper(
+                    supply, reusable, total - selected,
+                    {code: max(count - int(chosen[:, code].sum()), 0) for code, count in targets[variant].items()},
+                    [max(minimum - int(chosen[b].sum()), 0) for b, minimum in enumerate(bank_minimums)],
+                    [max(t - int(chosen[b].sum()), 0) for b, t in enumerate(total_distribution)],
+                    [max(h - int(chosen[b, hard]), 0) for b, h in enumerate(hard_distributions[variant])],
+                    variant % 2 == 1,
+                    [max_overlap - len(set(selection[b].tolist()) & used[b]) for b in range(len(banks))],
+                    paper, recent_supply)
+            except InfeasibleSelection as e:
+                if not attempt:
+                    raise
+                raise InfeasibleSelection(
+                    f"{paper}：近似重複的題目過多，排除重複後只能選出 {selected} 題（需要 {total} 題）",
+                    'duplicates', paper) from e
+            added = 0
+            for b, bank in enumerate(banks):
+                positions = _draw_planned(b, bank, plan, rng, used[b] | recent[b] | hidden[b],
+                                          recent[b] - hidden[b], used[b] - hidden[b])
+                if duplicates is not None:
+                    positions = duplicates.dedupe(b, bank, positions, taken_groups, used[b] | recent[b] | hidden[b],
+                                                  rng)
+                selection[b] = np.concatenate([selection[b], positions]).astype(np.intp)
+                added += len(positions)
+            if not added:
+                raise InfeasibleSelection(
+                    f"{paper}：近似重複的題目過多，排除重複後只能選出 {selected} 題（需要 {total} 題）",
+                    'duplicates', paper)
+        for b, bank in enumerate(banks):
+            for pos in selection[b].tolist():
+                if pos in recent[b]:
+                    recent[b].discard(pos)
+                    recent_counts[b, bank.difficulty[pos]] -= 1
+                if pos not in used[b]:
+                    used[b].add(pos)
+                    used_counts[b, bank.difficulty[pos]] += 1
+        selections.append(selection)
+    return selections
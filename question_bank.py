@@ -0,0 +1,203 @@
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from bank_store import DIFFICULTY_CODES, TEXT_COLUMNS, BankBuilder, cell_text, open_bank, write_bank
+from instrumentation import NULL_TIMINGS
+
+# 題庫標準欄位
+EXPECTED_COLUMNS = ['序號', '難度', '答案', '題目', '選項1', '選項2', '選項3', '選項4']
+DIFFICULTIES = ['難', '中', '易']
+ANSWERS = ['1', '2', '3', '4']
+
+# 跨 Streamlit 重新執行共用的解析快取（依內容雜湊，最多保留的題庫數）
+BANK_CACHE_SIZE = 32
+
+# 匯入後的 .qbank 檔存放位置，多個 worker 行程共用
+BANK_STORE_DIR = os.environ.get('EXAM_BANK_STORE', os.path.join(tempfile.gettempdir(), 'exam_bank_store'))
+
+_bank_cache = OrderedDict()
+_bank_cache_lock = threading.Lock()
+
+
+def read_upload(file):
+    """取得上傳檔案（或路徑、bytes）的完整內容。"""
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return bytes(file)
+    if isinstance(file, str) or hasattr(file, '__fspath__'):
+        with open(file, 'rb') as fh:
+            return fh.read()
+    if hasattr(file, 'getvalue'):
+        return file.getvalue()
+    file.seek(0)
+    return file.read()
+
+
+def bank_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def map_columns(columns):
+    """依欄名（部分比對）找出各標準欄位所在的位置，回傳 {標準欄位: 位置}。"""
+    if len(columns) < 5:
+        raise ValueError("列數不足，請確保題庫格式正確！")
+    positions = {}
+    for expected in EXPECTED_COLUMNS:
+        for i, current in enumerate(columns):
+            if current is not None and expected.lower().strip() in str(current).lower().strip():
+                positions.setdefault(expected, i)
+    missing = [col for col in EXPECTED_COLUMNS if col not in positions]
+    if missing:
+        raise ValueError(f"缺少必要欄位：{missing}")
+    return positions
+
+
+def normalize_bank(df):
+    """將原始題庫對應到標準欄位，並清理難度與答案。
+
+    欄位不符時拋出 ValueError。保留原始列索引，供抽題時對應題目。
+    """
+    if len(df.columns) < 5:
+        raise ValueError("列數不足，請確保題庫格式正確！")
+
+    current_columns = df.columns.tolist()
+    mapping = {}
+    for expected in EXPECTED_COLUMNS:
+        for current in current_columns:
+            if expected.lower().strip() in str(current).lower().strip():
+                mapping[current] = expected
+
+    df = df.rename(columns=mapping)
+    missing = [col for col in EXPECTED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"缺少必要欄位：{missing}")
+
+    df = df.dropna(subset=['題目', '答案'])[EXPECTED_COLUMNS].copy()
+
+    df['難度'] = df['難度'].astype(str).str.strip()
+    df.loc[~df['難度'].isin(DIFFICULTIES), '難度'] = '中'
+
+    # 含空白列的答案欄會被讀成浮點數（2.0），先去掉小數點再比對
+    df['答案'] = df['答案'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    df.loc[~df['答案'].isin(ANSWERS), '答案'] = '1'
+    return df
+
+
+def read_bank(data):
+    """解析一份 Excel 題庫並正規化（不經快取）。"""
+    return normalize_bank(pd.read_excel(io.BytesIO(data)))
+
+
+_ANSWER_SUFFIX = re.compile(r'\.0$')
+
+
+def stream_bank(data, digest=None):
+    """以 openpyxl read_only 逐列讀取第一個工作表，邊讀邊正規化並直接建立 CompactBank。
+
+    只讀取標準欄位所在的範圍，不建立完整的 DataFrame，記憶體用量只與精簡後的題庫大小相關。
+    規則與 normalize_bank 相同：略過題目或答案空白的列，難度預設「中」，答案預設 1。
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        positions = map_columns(header)
+        first, last = min(positions.values()), max(positions.values())
+        # 轉為讀取範圍內的相對位置
+        columns = {col: pos - first for col, pos in positions.items()}
+        question, answer, difficulty = columns['題目'], columns['答案'], columns['難度']
+        text_columns = [columns[col] for col in TEXT_COLUMNS]
+
+        builder = BankBuilder()
+        rows = sheet.iter_rows(min_row=2, min_col=first + 1, max_col=last + 1, values_only=True)
+        for index, row in enumerate(rows):
+            if len(row) <= max(question, answer):
+                continue
+            if row[question] is None or row[question] == '' or row[answer] is None or row[answer] == '':
+                continue
+            level = DIFFICULTY_CODES.get(str(row[difficulty]).strip() if row[difficulty] is not None else None, DIFFICULTY_CODES['中'])
+            choice = _ANSWER_SUFFIX.sub('', str(row[answer]).strip())
+            builder.append(index, level, int(choice) if choice in ANSWERS else 1,
+                           [cell_text(row[i]) for i in text_columns])
+    finally:
+        workbook.close()
+    return builder.build(digest)
+
+
+def import_bank(data, store_dir=None, digest=None, timings=NULL_TIMINGS, **labels):
+    """將 Excel 題庫匯入為 .qbank 欄式檔，已匯入過則直接沿用。回傳檔案路徑。"""
+    digest = digest or bank_digest(data)
+    path = os.path.join(store_dir or BANK_STORE_DIR, f'{digest}.qbank')
+    if not os.path.exists(path):
+        with timings.stage('excel_stream', **labels):
+            bank = stream_bank(data, digest)
+        with timings.stage('import', **labels):
+            write_bank(bank, path)
+    return path
+
+
+def load_bank(file, store_dir=None, timings=NULL_TIMINGS, **labels):
+    """讀取題庫，同一份內容只解析一次。
+
+    回傳 (內容雜湊, CompactBank)。題庫以 mmap 映射匯入後的 .qbank 檔，
+    重新啟動或其他行程讀取同一份題庫時不必再經過 openpyxl。
+    timings 與 labels（例如 bank=1）用於記錄各階段耗時。
+    """
+    with timings.stage('read_upload', **labels):
+        data = read_upload(file)
+        digest = bank_digest(data)
+
+    with _bank_cache_lock:
+        if digest in _bank_cache:
+            _bank_cache.move_to_end(digest)
+            return digest, _bank_cache[digest]
+
+    path = import_bank(data, store_dir, digest, timings, **labels)
+    return digest, _open_cached(digest, path, timings, **labels)
+
+
+def load_stored_bank(digest, store_dir=None, timings=NULL_TIMINGS, **labels):
+    """依內容雜湊開啟已匯入的題庫（例如背景工作行程），尚未匯入時拋出 ValueError。"""
+    with _bank_cache_lock:
+        if digest in _bank_cache:
+            _bank_cache.move_to_end(digest)
+            return _bank_cache[digest]
+    path = os.path.join(store_dir or BANK_STORE_DIR, f'{digest}.qbank')
+    if not os.path.exists(path):
+        raise ValueError(f"找不到已匯入的題庫 {digest[:12]}，請重新上傳")
+    return _open_cached(digest, path, timings, **labels)
+
+
+def _open_cached(digest, path, timings=NULL_TIMINGS, **labels):
+    with timings.stage('open', **labels):
+        bank = open_bank(path)
+        # 載入時即建立難度索引，之後每次抽題都直接使用
+        bank.groups('難度')
+
+    with _bank_cache_lock:
+        _bank_cache[digest] = bank
+        _bank_cache.move_to_end(digest)
+        while len(_bank_cache) > BANK_CACHE_SIZE:
+            _bank_cache.popitem(last=False)
+    return bank
+
+
+def clear_bank_cache():
+    with _bank_cache_lock:
+        _bank_cache.clear()
+
+
+if __name__ == '__main__':
+    # 匯入步驟：python question_bank.py 題庫1.xlsx 題庫2.xlsx ...
+    import sys
+
+    for name in sys.argv[1:]:
+        print(name, '->', import_bank(read_upload(name)))
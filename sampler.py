@@ -0,0 +1,145 @@
+import numpy as np
+
+from bank_store import DIFFICULTY_CODES, group_positions
+
+HARD = DIFFICULTY_CODES['難']
+EASY = DIFFICULTY_CODES['易']
+
+_EMPTY = np.empty(0, dtype=np.intp)
+
+
+def compat_seeds(bank_no, variant):
+    """舊版 generate_exam 的亂數種子：A 卷 variant=0，B 卷 variant=1。
+
+    回傳 (洗牌種子, 抽題種子)。
+    """
+    return bank_no + 100 * (variant + 1), variant + 1 + bank_no
+
+
+def _pandas_sample(pool, n, seed):
+    # 等同 DataFrame.sample(n=n, random_state=seed)：RandomState(seed).permutation(len)[:n]
+    if n <= 0:
+        return _EMPTY
+    return pool[np.random.RandomState(seed).permutation(len(pool))[:n]]
+
+
+def _available(n_rows, exclude):
+    if exclude is None or len(exclude) == 0:
+        return np.arange(n_rows, dtype=np.intp)
+    mask = np.ones(n_rows, dtype=bool)
+    mask[np.asarray(list(exclude) if isinstance(exclude, (set, frozenset)) else exclude, dtype=np.intp)] = False
+    return np.flatnonzero(mask)
+
+
+def draw_compat(difficulty, total, hard, shuffle_seed, seed, prefer_easy=False, exclude=None):
+    """與舊版 pandas 抽題流程逐題相同的選題，只操作列位置陣列。
+
+    difficulty 為難度代碼陣列；exclude 為需排除的列位置（B 卷排除 A 卷已抽的題目）。
+    回傳選中題目的列位置，順序即出題順序。
+    """
+    pool = _available(len(difficulty), exclude)
+    shuffled = pool[np.random.RandomState(shuffle_seed).permutation(len(pool))]
+    codes = difficulty[shuffled]
+
+    df_hard = shuffled[codes == HARD]
+    picked_hard = _pandas_sample(df_hard, min(hard, len(df_hard)), seed)
+    remaining = total - len(picked_hard)
+    df_remaining = shuffled[~np.isin(shuffled, picked_hard)]
+
+    if prefer_easy:
+        # B 卷：難題之後優先以易題補足
+        df_easy = shuffled[codes == EASY]
+        picked_easy = _pandas_sample(df_easy, min(remaining, len(df_easy)), seed)
+        remaining -= len(picked_easy)
+        df_remaining = df_remaining[~np.isin(df_remaining, picked_easy)]
+        parts = [picked_hard, picked_easy]
+    else:
+        parts = [picked_hard]
+
+    parts.append(_pandas_sample(df_remaining, min(remaining, len(df_remaining)), seed))
+    selected = np.concatenate(parts)
+    return selected[np.random.RandomState(seed).permutation(len(selected))]
+
+
+def _excluded_set(exclude):
+    if exclude is None:
+        return set()
+    if isinstance(exclude, (set, frozenset)):
+        return set(exclude)
+    return set(np.asarray(exclude, dtype=np.intp).tolist())
+
+
+def sample_stratum(stratum, k, rng, excluded, n_excluded):
+    """從 stratum（列位置陣列；整數 n 表示 0..n-1）不放回抽出 k 個不在 excluded 的列位置。
+
+    n_excluded 為 stratum 中已被排除的數量。可用題目佔多數時以拒絕抽樣處理，
+    成本只與 k 相關；大部分已被排除時才掃描整個 stratum。
+    """
+    size = stratum if isinstance(stratum, (int, np.integer)) else len(stratum)
+    available = size - n_excluded
+    k = min(k, available)
+    if k <= 0:
+        return _EMPTY
+    if available - k < size // 2:
+        candidates = np.arange(size, dtype=np.intp) if isinstance(stratum, (int, np.integer)) else stratum
+        if excluded:
+            candidates = candidates[~np.isin(candidates, np.fromiter(excluded, dtype=np.intp, count=len(excluded)))]
+        return rng.choice(candidates, k, replace=False).astype(np.intp, copy=False)
+
+    picked = []
+    seen = set()
+    while len(picked) < k:
+        draws = rng.integers(0, size, 2 * (k - len(picked)))
+        for pos in (draws if isinstance(stratum, (int, np.integer)) else stratum[draws]).tolist():
+            if pos not in excluded and pos not in seen:
+                seen.add(pos)
+                picked.append(pos)
+                if len(picked) == k:
+                    break
+    return np.array(picked, dtype=np.intp)
+
+
+def draw_fast(difficulty, total, hard, rng, prefer_easy=False, exclude=None, strata=None):
+    """相同的抽題規則，但以單一 Generator 直接在各難度的列位置索引上抽樣。
+
+    strata 為 CompactBank.groups('難度')；有索引時成本只與抽題數及已排除的題數相關，
+    與題庫大小無關。不重現舊版結果，適合一次產生大量卷別。
+    """
+    if strata is None:
+        strata = group_positions(difficulty)
+    excluded = _excluded_set(exclude)
+    excluded_counts = np.zeros(len(DIFFICULTY_CODES), dtype=np.intp)
+    if excluded:
+        excluded_counts = np.bincount(difficulty[np.fromiter(excluded, dtype=np.intp, count=len(excluded))],
+                                      minlength=len(DIFFICULTY_CODES))
+
+    picked_hard = sample_stratum(strata.get(HARD, _EMPTY), hard, rng, excluded, excluded_counts[HARD])
+    remaining = total - len(picked_hard)
+    parts = [picked_hard]
+    excluded.update(picked_hard.tolist())
+
+    if prefer_easy and remaining > 0:
+        picked_easy = sample_stratum(strata.get(EASY, _EMPTY), remaining, rng, excluded, excluded_counts[EASY])
+        remaining -= len(picked_easy)
+        excluded.update(picked_easy.tolist())
+        parts.append(picked_easy)
+
+    if remaining > 0:
+        parts.append(sample_stratum(len(difficulty), remaining, rng, excluded, len(excluded)))
+
+    selected = np.concatenate(parts).astype(np.intp, copy=False)
+    return rng.permutation(selected)
+
+
+def draw(difficulty, total, hard, bank_no, variant, prefer_easy=False, exclude=None, compat=True, rng=None, strata=None):
+    """依卷別抽出一個題庫的題目列位置。
+
+    compat=True 時種子由題庫序與卷別推得，與舊版 A 卷／B 卷結果一致（需重現整個題庫的洗牌）；
+    否則使用 rng（未提供時依相同種子建立），並以 strata 難度索引抽樣。
+    """
+    shuffle_seed, seed = compat_seeds(bank_no, variant)
+    if compat:
+        return draw_compat(difficulty, total, hard, shuffle_seed, seed, prefer_easy, exclude)
+    if rng is None:
+        rng = np.random.default_rng([shuffle_seed, seed])
+    return draw_fast(difficulty, total, hard, rng, prefer_easy, exclude, strata)
@@ -0,0 +1,154 @@
+"""各卷別的選項順序重排：以陣列運算一次完成所有題目的選項排列與答案換算。
+
+「以上皆是」「以上皆非」等依位置成立的選項固定在原位；選項內容提到其他選項
+（例如「(1)(2)皆正確」）的題目整題不重排。重排時同時平衡整份試卷各答案位置的
+題數，避免沿用題庫本身偏向 (1) 的答案分布。亂數由種子與卷序推得，標準版、
+學生版與答案卷都由同一份重排結果產生，必定一致。每位考生一份試卷時另外打亂題序，
+每份試卷只需保存題序與選項排列兩個小整數陣列即可還原內容與答案。
+"""
+import numpy as np
+import pandas as pd
+
+OPTION_COLUMNS = ['選項1', '選項2', '選項3', '選項4']
+N_OPTIONS = len(OPTION_COLUMNS)
+# 未指定種子時使用的固定種子，相同設定仍產生相同的卷別
+DEFAULT_SEED = 20240901
+
+# 依位置成立、必須留在原位的選項
+PINNED_PATTERN = r'^\s*(?:以上|上述|前述|全部|皆|均)|(?:皆|均|都)(?:是|非|不是|正確|錯誤|對|錯|不對)\s*$'
+# 提到其他選項編號的選項（整題不重排）
+REFERENCE_PATTERN = r'[（(]\s*[1-4１-４]\s*[)）]|選項\s*[1-4１-４]|[1-4１-４]\s*[、,，及和與]\s*[1-4１-４]'
+
+
+def variant_rng(seed, variant):
+    """第 variant 卷的選項重排亂數。"""
+    return np.random.default_rng([DEFAULT_SEED if seed is None else seed, variant])
+
+
+def student_rng(seed):
+    """每位考生一份試卷時的亂數（與各卷別的亂數序列不重疊）。"""
+    return np.random.default_rng([DEFAULT_SEED if seed is None else seed, 0, 1])
+
+
+def pinned_options(questions):
+    """回傳 (題數, 4) 的布林陣列：True 表示該選項固定在原位。"""
+    # 依列展開成一維，一次比對所有選項
+    stacked = pd.Series(questions[OPTION_COLUMNS].to_numpy(dtype=object).ravel()).astype(str)
+    pinned = np.array(stacked.str.contains(PINNED_PATTERN, regex=True), dtype=bool).reshape(-1, N_OPTIONS)
+    references = stacked.str.contains(REFERENCE_PATTERN, regex=True).to_numpy().reshape(-1, N_OPTIONS)
+    # 有選項提到其他選項的題目，整題固定
+    pinned[references.any(axis=1)] = True
+    return pinned
+
+
+def option_permutations(answers, pinned, rng):
+    """產生每題的選項排列 perm（perm[題, 新位置] = 原選項序，0 起算）。
+
+    answers 為原答案位置（0 起算，-1 表示無答案）。先在未固定的位置間隨機排列，
+    再將正確答案換到目標位置，使整份試卷各答案位置的題數盡量相同。
+    """
+    n = len(answers)
+    rows = np.arange(n)[:, None]
+    slots = np.broadcast_to(np.arange(N_OPTIONS), (n, N_OPTIONS))
+
+    # 未固定的選項隨機排序，固定的選項排在最後並保持原順序，再依序填入未固定與固定的位置
+    keys = np.where(pinned, 2.0 + slots, rng.random((n, N_OPTIONS)))
+    option_order = np.argsort(keys, axis=1, kind='stable')
+    slot_order = np.argsort(pinned, axis=1, kind='stable')
+    perm = np.empty((n, N_OPTIONS), dtype=np.intp)
+    perm[rows, slot_order] = option_order
+
+    has_answer = answers >= 0
+    answer_index = np.where(has_answer, answers, 0)
+    movable = has_answer & ~pinned[np.arange(n), answer_index] & ((~pinned).sum(axis=1) >= 2)
+    if not movable.any():
+        return perm
+
+    # 各位置的目標題數：固定不動的答案先計入，其餘題目補到平均
+    fixed_counts = np.bincount(answer_index[has_answer & ~movable], minlength=N_OPTIONS)
+    n_movable = int(movable.sum())
+    desired = (has_answer.sum() + np.arange(N_OPTIONS)[::-1]) // N_OPTIONS
+    need = np.maximum(desired - fixed_counts, 0).astype(float)
+    need = need / need.sum() * n_movable if need.sum() else np.full(N_OPTIONS, n_movable / N_OPTIONS)
+    counts = np.floor(need).astype(np.intp)
+    remainder = n_movable - counts.sum()
+    counts[np.argsort(counts - need, kind='stable')[:remainder]] += 1
+    targets = rng.permutation(np.repeat(np.arange(N_OPTIONS), counts))
+
+    # 目標位置未固定時，將正確答案與該位置的選項互換
+    movable_rows = np.flatnonzero(movable)
+    current = np.argmax(perm[movable_rows] == answer_index[movable_rows, None], axis=1)
+    swap = ~pinned[movable_rows, targets]
+    movable_rows, current, targets = movable_rows[swap], current[swap], targets[swap]
+    answer_options = perm[movable_rows, current]
+    perm[movable_rows, current] = perm[movable_rows, targets]
+    perm[movable_rows, targets] = answer_options
+    return perm
+
+
+def answer_codes(questions):
+    """答案欄轉為 0 起算的位置陣列，無答案為 -1。"""
+    return np.array([int(a) - 1 if a in ('1', '2', '3', '4') else -1 for a in questions['答案'].tolist()],
+                    dtype=np.intp)
+
+
+def apply_permutation(questions, perm, answers=None, order=None):
+    """依題序 order（None 為原順序）與選項排列 perm 產生新的題目 DataFrame，並換算答案。"""
+    if answers is None:
+        answers = answer_codes(questions)
+    if order is not None:
+        questions, answers = questions.iloc[order], answers[order]
+    rows = np.arange(len(questions))[:, None]
+
+    permuted = questions.copy()
+    permuted[OPTION_COLUMNS] = questions[OPTION_COLUMNS].to_numpy(dtype=object)[rows, perm]
+    new_answers = np.argmax(perm == answers[:, None], axis=1) + 1
+    permuted['答案'] = np.where(answers >= 0, new_answers.astype(str), questions['答案'].to_numpy(dtype=object))
+    return permuted
+
+
+def shuffle_options(questions, rng):
+    """重排選項並換算答案，回傳 (新的題目 DataFrame, perm)。
+
+    questions 為 bank_store.CompactBank.take 格式（答案為 '1'~'4' 字串，無答案為 ''）。
+    """
+    answers = answer_codes(questions)
+    perm = option_permutations(answers, pinned_options(questions), rng)
+    return apply_permutation(questions, perm, answers), perm
+
+
+def student_permutations(answers, pinned, n_students, rng):
+    """每位考生各自的題目順序與選項排列。
+
+    回傳 (orders, perms)：orders[考生] 為卷上各題對應的原題序（uint16），
+    perms[考生] 為依卷上題序排列的選項排列（uint8），每位考生的答案分布各自平衡。
+    """
+    n = len(answers)
+    orders = np.argsort(rng.random((n_students, n)), axis=1)
+    perms = np.empty((n_students, n, N_OPTIONS), dtype=np.uint8)
+    for student, order in enumerate(orders):
+        perms[student] = option_permutations(answers[order], pinned[order], rng)
+    return orders.astype(np.uint16), perms
+
+
+def student_papers(questions, orders, perms, answers=None):
+    """依序產生各考生的題目 DataFrame。欄位只轉換一次為陣列，每份試卷只做索引運算。"""
+    if answers is None:
+        answers = answer_codes(questions)
+    columns = {name: questions[name].to_numpy(dtype=object) for name in questions.columns}
+    options = questions[OPTION_COLUMNS].to_numpy(dtype=object)
+    rows = np.arange(len(questions))[:, None]
+    for order, perm, key in zip(orders.astype(np.intp), perms, permuted_answers(answers, orders, perms)):
+        paper = {name: values[order] for name, values in columns.items()}
+        permuted = options[order][rows, perm]
+        for slot, name in enumerate(OPTION_COLUMNS):
+            paper[name] = permuted[:, slot]
+        paper['答案'] = np.where(key > 0, key.astype(str), paper['答案'])
+        yield pd.DataFrame(paper, columns=questions.columns)
+
+
+def permuted_answers(answers, orders, perms):
+    """由原答案與各考生的排列換算各卷答案（1~4，無答案為 0），shape (考生數, 題數)。"""
+    original = answers[orders.astype(np.intp)]
+    new = np.argmax(perms == original[..., None], axis=2) + 1
+    return np.where(original >= 0, new, 0).astype(np.uint8)
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import artifact_cache
+import exam_pdf
+from artifact_cache import ArtifactCache, artifact_key
+from exam_engine import ExamConfig
+
+
+def test_failed_put_leaves_no_temporary_file(tmp_path, monkeypatch):
+    cache = ArtifactCache(str(tmp_path))
+
+    def broken_zip(papers):
+        raise OSError("磁碟已滿")
+
+    monkeypatch.setattr(artifact_cache.batch, 'zip_papers', broken_zip)
+    with pytest.raises(OSError):
+        cache.put('key', {'A卷': b'a'})
+    assert os.listdir(tmp_path) == []
+
+
+def test_round_trip(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    cache.put('key', {'A卷': b'a', 'B卷': b'b'})
+    assert cache.get('key') == {'A卷': b'a', 'B卷': b'b'}
+    assert cache.get('missing') is None
+
+
+def test_pdf_key_follows_font_source(tmp_path, monkeypatch):
+    font = tmp_path / 'kaiu.ttf'
+    font.write_bytes(b'font v1')
+    monkeypatch.setattr(exam_pdf, 'font_source', lambda: str(font))
+    pdf, docx = ExamConfig(output_format='pdf'), ExamConfig(output_format='docx')
+
+    pdf_key, docx_key = artifact_key(['digest'], pdf), artifact_key(['digest'], docx)
+    font.write_bytes(b'font version 2')
+    assert artifact_key(['digest'], pdf) != pdf_key
+    # DOCX 不嵌入字型，快取鍵不受影響
+    assert artifact_key(['digest'], docx) == docx_key
+
+    monkeypatch.setattr(exam_pdf, 'font_source', lambda: exam_pdf.FALLBACK_FONT)
+    assert artifact_key(['digest'], pdf) not in (pdf_key, None)
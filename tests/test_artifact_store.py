@@ -0,0 +1,29 @@
+import pytest
+
+from artifact_store import ArtifactStore
+
+
+def test_round_trip(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    handle = store.put({'A卷': b'a', 'B卷': b'b'})
+    assert store.names(handle) == ['A卷', 'B卷']
+    assert store.read_all(handle) == {'A卷': b'a', 'B卷': b'b'}
+
+
+def test_expired_handle_raises_file_not_found(tmp_path):
+    store = ArtifactStore(str(tmp_path), ttl=0)
+    handle = store.put({'A卷': b'a'})
+    store.cleanup(now=float('inf'))
+
+    assert store.names(handle) is None
+    with pytest.raises(FileNotFoundError):
+        store.path(handle, 'A卷')
+    with pytest.raises(FileNotFoundError):
+        store.zip_path(handle)
+
+
+def test_unknown_name_raises_file_not_found(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    handle = store.put({'A卷': b'a'})
+    with pytest.raises(FileNotFoundError):
+        store.open(handle, 'B卷')
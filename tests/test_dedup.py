@@ -0,0 +1,63 @@
+import numpy as np
+
+import batch
+from bank_store import DIFFICULTY_CODES, BankBuilder
+from dedup import DuplicateIndex, minhash_signatures, near_duplicate_groups
+from exam_engine import ExamConfig, dedupe_enabled, select_exam
+
+rng = np.random.default_rng(7)
+
+
+def random_text(n=30):
+    return ''.join(chr(0x4e00 + int(code)) for code in rng.integers(0, 20000, n))
+
+
+def make_bank(texts, difficulties=None):
+    builder = BankBuilder()
+    for i, text in enumerate(texts):
+        level = DIFFICULTY_CODES[difficulties[i]] if difficulties else DIFFICULTY_CODES['中']
+        builder.append(i, level, 1, [str(i + 1), text, '甲', '乙', '丙', '丁'])
+    return builder.build()
+
+
+def test_near_duplicates_share_a_group():
+    base = random_text()
+    texts = [base, base + '。', '（' + base + '）', random_text(), random_text()]
+    groups = near_duplicate_groups(minhash_signatures(texts))
+    assert groups[0] == groups[1] == groups[2]
+    assert len({groups[0], groups[3], groups[4]}) == 3
+
+
+def test_index_spans_banks():
+    base = random_text()
+    banks = [make_bank([base, random_text()]), make_bank([random_text(), base + '？'])]
+    index = DuplicateIndex.build(banks)
+    assert len(index) == 1
+    assert index.group_of[0][0] == index.group_of[1][1]
+
+
+def test_compat_selection_ignores_duplicates_unless_enabled():
+    base = random_text()
+    difficulties = ['難', '中', '易'] * 10
+    banks = [make_bank([base + '題' * (i % 3) if i < 9 else random_text() for i in range(30)], difficulties)
+             for _ in range(2)]
+    config = ExamConfig(total_distribution=(8, 8), a_hard_distribution=(3, 3), b_hard_distribution=(2, 2))
+    assert not dedupe_enabled(config)
+    assert dedupe_enabled(ExamConfig(solver=True))
+    assert dedupe_enabled(ExamConfig(dedupe=True))
+
+    # 相容模式預設與舊版（不檢查重複）抽出相同的題目
+    _, selections = select_exam(banks, config)
+    legacy = batch.select_variants(banks, 2, config.total_distribution, [(3, 3), (2, 2)])
+    for paper, expected in zip(selections, legacy):
+        for b in expected:
+            np.testing.assert_array_equal(paper[b], expected[b])
+
+    # 明確開啟時每卷每個重複群組最多一題
+    index = DuplicateIndex.build(banks)
+    config.dedupe = True
+    _, selections = select_exam(banks, config)
+    for paper in selections:
+        groups = [index.group_of[b][pos] for b, positions in paper.items() for pos in positions.tolist()
+                  if pos in index.group_of[b]]
+        assert len(groups) == len(set(groups))
@@ -0,0 +1,35 @@
+import io
+import os
+import stat
+
+import pandas as pd
+
+from drive_cache import DriveCache
+
+
+def xlsx_bytes(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, engine='openpyxl')
+    return buffer.getvalue()
+
+
+def test_cache_hit_reads_raw_xlsx(tmp_path):
+    df = pd.DataFrame({'序號': [1, 2], '題目': ['甲', '乙']})
+    meta = {'id': 'bank1', 'md5Checksum': 'v1'}
+    DriveCache(str(tmp_path)).put(meta, xlsx_bytes(df))
+
+    # 新的快取物件（例如伺服器重新啟動）只能從磁碟上的 .xlsx 讀回
+    cached = DriveCache(str(tmp_path)).get(meta)
+    pd.testing.assert_frame_equal(cached, df)
+    assert sorted(os.listdir(tmp_path)) == ['bank1.json', 'bank1.xlsx']
+    assert stat.S_IMODE(os.stat(tmp_path).st_mode) == 0o700
+
+
+def test_stale_or_unreadable_entry_is_a_miss(tmp_path):
+    meta = {'id': 'bank1', 'md5Checksum': 'v1'}
+    DriveCache(str(tmp_path)).put(meta, xlsx_bytes(pd.DataFrame({'序號': [1]})))
+
+    assert DriveCache(str(tmp_path)).get({'id': 'bank1', 'md5Checksum': 'v2'}) is None
+    with open(tmp_path / 'bank1.xlsx', 'wb') as fh:
+        fh.write(b'not an xlsx file')
+    assert DriveCache(str(tmp_path)).get(meta) is None
@@ -0,0 +1,153 @@
+"""以本機的假 Drive 伺服器測試 drive_client（DRIVE_API_URL 指向 http://127.0.0.1:<port>）。"""
+import importlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import drive_client
+
+DOWNLOAD_DELAY = 0.2
+
+
+class FakeDrive:
+    """最小的 Drive v3 API：分頁列出檔案、changes 變動紀錄與檔案下載。"""
+
+    def __init__(self, files, page_size=2):
+        self.files = files
+        self.page_size = page_size
+        self.changes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def page(self, items, token):
+        start = int(token or 0)
+        end = start + self.page_size
+        return items[start:end], (str(end) if end < len(items) else None)
+
+    def list_files(self, query):
+        metadata = [{"id": file_id, "name": f"{file_id}.xlsx", "mimeType": "application/octet-stream",
+                     "md5Checksum": str(len(data))} for file_id, data in self.files.items()]
+        files, token = self.page(metadata, query.get("pageToken", [None])[0])
+        return {"files": files, **({"nextPageToken": token} if token else {})}
+
+    def list_changes(self, query):
+        start = int(query["pageToken"][0])
+        changes, token = self.page(self.changes[start:], None)
+        result = {"changes": changes}
+        if start + len(changes) < len(self.changes):
+            result["nextPageToken"] = str(start + len(changes))
+        else:
+            result["newStartPageToken"] = str(len(self.changes))
+        return result
+
+    def download(self, file_id):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(DOWNLOAD_DELAY)
+        with self.lock:
+            self.in_flight -= 1
+        return self.files[file_id]
+
+
+def make_handler(drive):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            drive.requests.append(url.path)
+            if url.path == "/files":
+                body = json.dumps(drive.list_files(query)).encode()
+            elif url.path == "/changes/startPageToken":
+                body = json.dumps({"startPageToken": str(len(drive.changes))}).encode()
+            elif url.path == "/changes":
+                body = json.dumps(drive.list_changes(query)).encode()
+            elif url.path.startswith("/files/") and query.get("alt") == ["media"]:
+                file_id = url.path.rsplit("/", 1)[-1]
+                if file_id not in drive.files:
+                    self.send_error(404)
+                    return
+                body = drive.download(file_id)
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    fake = FakeDrive({f"bank{i}": os.urandom(1000 + i) for i in range(6)})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(fake))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("DRIVE_API_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    # 重新載入模組，讓預設的 base_url 改用環境變數指定的假伺服器
+    importlib.reload(drive_client)
+    yield fake
+    server.shutdown()
+    server.server_close()
+    monkeypatch.delenv("DRIVE_API_URL")
+    importlib.reload(drive_client)
+
+
+def test_list_files_follows_pagination(drive):
+    session = drive_client.create_anonymous_session()
+    files = drive_client.list_files(session, "folder")
+    assert [f["id"] for f in files] == list(drive.files)
+    # 6 個檔案、每頁 2 個
+    assert drive.requests.count("/files") == 3
+
+
+def test_download_files_runs_concurrently(drive):
+    session = drive_client.create_anonymous_session()
+    file_ids = list(drive.files)
+    start = time.perf_counter()
+    result = drive_client.download_files(session, file_ids)
+    elapsed = time.perf_counter() - start
+
+    assert list(result) == file_ids
+    assert all(result[file_id].getvalue() == drive.files[file_id] for file_id in file_ids)
+    assert drive.max_in_flight > 1
+    # 依序下載至少需要 6 × DOWNLOAD_DELAY
+    assert elapsed < len(file_ids) * DOWNLOAD_DELAY
+
+
+def test_download_missing_file_raises(drive):
+    session = drive_client.create_anonymous_session()
+    with pytest.raises(Exception):
+        drive_client.download_files(session, ["missing"])
+
+
+def test_changes_feed_returns_changes_since_token(drive):
+    session = drive_client.create_anonymous_session()
+    token = drive_client.get_start_page_token(session)
+    assert drive_client.list_changes(session, token) == ([], token)
+
+    drive.changes.extend([
+        {"fileId": "bank0", "removed": False, "file": {"id": "bank0", "name": "bank0.xlsx"}},
+        {"fileId": "bank1", "removed": True},
+        {"fileId": "bank2", "removed": False, "file": {"id": "bank2", "name": "bank2.xlsx"}},
+    ])
+    changes, new_token = drive_client.list_changes(session, token)
+    # 3 筆變動跨兩頁
+    assert [change["fileId"] for change in changes] == ["bank0", "bank1", "bank2"]
+    assert changes[1]["removed"] is True
+    assert new_token == "3"
+    assert drive_client.list_changes(session, new_token) == ([], new_token)
@@ -0,0 +1,49 @@
+import threading
+
+import drive_client
+from drive_sync import DriveMirror
+
+FOLDER = drive_client.FOLDER_MIME_TYPE
+
+
+def test_reads_do_not_wait_for_folder_listing(tmp_path, monkeypatch):
+    mirror = DriveMirror('root', state_dir=str(tmp_path))
+    mirror.files = {'bank0': {'id': 'bank0', 'name': 'bank0.xlsx', 'parents': ['root']}}
+    mirror.page_token = '1'
+
+    listing = threading.Event()
+    release = threading.Event()
+
+    def list_changes(session, page_token, base_url):
+        # 整個資料夾移入：需要另外列出其內容
+        return [{'fileId': 'folder', 'file': {'id': 'folder', 'name': '新資料夾', 'mimeType': FOLDER,
+                                              'parents': ['root']}}], '2'
+
+    def list_files(session, folder_id, base_url):
+        listing.set()
+        assert release.wait(5)
+        return [{'id': 'bank1', 'name': 'bank1.xlsx', 'parents': [folder_id]}] if folder_id == 'folder' else []
+
+    monkeypatch.setattr(drive_client, 'list_changes', list_changes)
+    monkeypatch.setattr(drive_client, 'list_files', list_files)
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(changed=mirror.sync(None)))
+    thread.start()
+    assert listing.wait(5)
+
+    # 同步正在等待 Drive 時，介面仍可立即讀取（尚未更新的）鏡像
+    reader = threading.Thread(target=lambda: result.update(children=mirror.children(), bank=mirror.get('bank0')))
+    reader.start()
+    reader.join(1)
+    assert not reader.is_alive()
+    assert [meta['id'] for meta in result['children']] == ['bank0']
+    assert result['bank']['name'] == 'bank0.xlsx'
+
+    release.set()
+    thread.join(5)
+    assert result['changed'] == {'folder', 'bank1'}
+    assert mirror.get('bank1')['parents'] == ['folder']
+    assert mirror.page_token == '2'
+    # 重新載入狀態檔也得到同步後的鏡像
+    assert set(DriveMirror('root', state_dir=str(tmp_path)).files) == {'bank0', 'folder', 'bank1'}
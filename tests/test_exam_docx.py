@@ -0,0 +1,53 @@
+import io
+
+import docx
+import pandas as pd
+from docx.oxml.ns import qn
+
+from exam_docx import ANSWER_KEY, STANDARD, STUDENT, render_paper_set
+
+
+def questions(n=6):
+    return pd.DataFrame({
+        '序號': [str(i) for i in range(n)],
+        '難度': ['難', '中', '易'] * (n // 3),
+        '答案': ['1', '2', '3'] * (n // 3),
+        '題目': [f'第{i}題' for i in range(n)],
+        '選項1': '甲', '選項2': '乙', '選項3': '丙', '選項4': '丁',
+    })
+
+
+def section_columns(data):
+    """依序回傳各節的欄數與該節第一段的文字。"""
+    body = docx.Document(io.BytesIO(data)).element.body
+    sections, first = [], None
+    for element in body:
+        if element.tag == qn('w:p'):
+            text = ''.join(t.text or '' for t in element.iter(qn('w:t')))
+            first = text if first is None else first
+            sect = element.find(f"{qn('w:pPr')}/{qn('w:sectPr')}")
+        else:
+            sect = element if element.tag == qn('w:sectPr') else None
+        if sect is not None:
+            sections.append((sect.find(qn('w:cols')).get(qn('w:num')), first))
+            first = None
+    return sections
+
+
+def test_two_column_answer_key_is_full_width():
+    papers = render_paper_set(questions(), '一甲', '期中考', '數學', 'A卷', (STANDARD, STUDENT, ANSWER_KEY), columns=2)
+
+    title, flow, key = section_columns(papers[STANDARD])
+    assert title[0] == '1' and title[1].startswith('海巡署')
+    assert flow == ('2', '1、第0題 (1)甲(2)乙(3)丙(4)丁（難）')
+    # 答案卷（換頁之後）回到單欄
+    assert key[0] == '1'
+
+    assert [num for num, _ in section_columns(papers[STUDENT])] == ['1', '2', '1']
+    assert [num for num, _ in section_columns(papers[ANSWER_KEY])] == ['1']
+
+
+def test_one_column_has_a_single_section():
+    papers = render_paper_set(questions(), '一甲', '期中考', '數學', 'A卷', (STANDARD,))
+    # 單欄範本只有文件結尾的一節（未指定欄數）
+    assert [num for num, _ in section_columns(papers[STANDARD])] == [None]
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from grading import grade, manifest_csv, paper_manifest
+from shuffle import OPTION_COLUMNS, shuffle_options
+
+
+def make_questions(n=10):
+    return pd.DataFrame({
+        '序號': [str(i + 1) for i in range(n)],
+        '難度': ['中'] * n,
+        '答案': [str(i % 4 + 1) if i != 2 else '' for i in range(n)],
+        '題目': [f'題目{i}' for i in range(n)],
+        **{column: [f'{column}-{i}' for i in range(n)] for column in OPTION_COLUMNS},
+    })
+
+
+def make_manifest():
+    questions = make_questions()
+    shuffled, perm = shuffle_options(questions, np.random.default_rng(2))
+    order = np.arange(len(questions))[::-1]
+    return questions, shuffled, manifest_csv([
+        paper_manifest('A', questions, [1] * len(questions)),
+        paper_manifest('B', questions, [1] * len(questions), perm=perm[order], order=order,
+                       answers=shuffled['答案'].replace('', '0').astype(int).to_numpy()[order]),
+    ])
+
+
+def test_perfect_sheets_get_full_score():
+    questions, shuffled, manifest = make_manifest()
+    a = {str(q + 1): answer for q, answer in enumerate(questions['答案'])}
+    b = {str(q + 1): answer for q, answer in enumerate(shuffled['答案'].to_numpy()[::-1])}
+    sheets = pd.DataFrame([{'學號': 's1', '試卷編號': 'A', **a}, {'學號': 's2', '試卷編號': 'B', **b}])
+
+    result = grade(sheets, manifest)
+    assert result['學號'].tolist() == ['s1', 's2']
+    # 無答案的題目不計分
+    assert result['答對題數'].tolist() == [9, 9]
+    assert result['分數'].tolist() == [100, 100]
+
+
+def test_wrong_and_missing_answers_lose_points():
+    questions, _, manifest = make_manifest()
+    sheet = {str(q + 1): answer for q, answer in enumerate(questions['答案'])}
+    sheet['1'] = '2'
+    del sheet['10']
+    result = grade(pd.DataFrame([{'試卷編號': 'A', **sheet}]), manifest, total_score=90)
+    assert result['答對題數'].tolist() == [7]
+    assert result['分數'].tolist() == [70]
+
+
+def test_unknown_paper_raises():
+    _, _, manifest = make_manifest()
+    with pytest.raises(ValueError):
+        grade(pd.DataFrame([{'試卷編號': 'Z', '1': '1'}]), manifest)
@@ -0,0 +1,47 @@
+import json
+import socket
+import time
+
+from job_queue import QUEUED, RUNNING, STALE_AFTER, JobQueue, _connect
+
+
+def insert_job(queue, job_id, status=QUEUED, owner=None, heartbeat=None):
+    with _connect(queue.db_path) as conn:
+        conn.execute('INSERT INTO jobs (id, status, priority, banks, config, created, owner, heartbeat) '
+                     'VALUES (?, ?, 0, ?, ?, ?, ?, ?)',
+                     (job_id, status, json.dumps([]), json.dumps({}), time.time(), owner, heartbeat))
+
+
+def job_status(queue, job_id):
+    with _connect(queue.db_path) as conn:
+        return conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()['status']
+
+
+def test_claim_is_atomic_across_queues(tmp_path):
+    first = JobQueue(str(tmp_path), download_dir=str(tmp_path / 'downloads'))
+    second = JobQueue(str(tmp_path), download_dir=str(tmp_path / 'downloads'))
+    insert_job(first, 'job')
+
+    assert first._claim('job')
+    assert not second._claim('job')
+    assert job_status(first, 'job') == RUNNING
+    # 認領時記錄開始時間，耗時不含排隊等候
+    with _connect(first.db_path) as conn:
+        row = conn.execute('SELECT created, started FROM jobs WHERE id = ?', ('job',)).fetchone()
+    assert row['started'] >= row['created']
+
+
+def test_startup_requeues_only_stale_jobs(tmp_path):
+    live = JobQueue(str(tmp_path), download_dir=str(tmp_path / 'downloads'))
+    now = time.time()
+    dead_owner = f"{socket.gethostname()}:{2 ** 22 + 12345}:dead"
+    insert_job(live, 'live', RUNNING, live.owner, now)
+    insert_job(live, 'dead-owner', RUNNING, dead_owner, now)
+    insert_job(live, 'timed-out', RUNNING, 'other-host:1:abcd', now - STALE_AFTER - 1)
+    insert_job(live, 'other-host', RUNNING, 'other-host:1:abcd', now)
+
+    restarted = JobQueue(str(tmp_path), download_dir=str(tmp_path / 'downloads'))
+    assert job_status(restarted, 'live') == RUNNING
+    assert job_status(restarted, 'dead-owner') == QUEUED
+    assert job_status(restarted, 'timed-out') == QUEUED
+    assert job_status(restarted, 'other-host') == RUNNING
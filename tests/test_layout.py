@@ -0,0 +1,57 @@
+import numpy as np
+
+from layout import ColumnLayout, balance
+
+
+def make_heights(n, seed=4):
+    return np.random.default_rng(seed).integers(20, 120, n).astype(float).tolist()
+
+
+def test_balance_minimizes_the_taller_column():
+    assert balance([1, 1, 1, 1], 10) == 2
+    assert balance([5, 1, 1, 1, 1, 1], 10) == 1
+    # 高度相同時取較早的分割點；無法分成兩欄時全部留在第一欄
+    assert balance([4, 4, 4], 8) == 1
+    assert balance([4, 4, 4], 5) == 3
+
+
+def test_single_page_pack_matches_balance():
+    heights = make_heights(12)
+    column_layout = ColumnLayout(column_height=1000, first_page_height=800)
+    column_layout.pack(range(len(heights)), heights)
+    split = balance(heights, 800)
+    assert 0 < split < len(heights)
+    assert column_layout.pages() == [[(0, split), (split, len(heights))]]
+
+
+def test_pack_fills_columns_and_balances_last_page():
+    heights = make_heights(60)
+    column_layout = ColumnLayout(column_height=700, first_page_height=500)
+    columns = column_layout.pack(range(len(heights)), heights)
+    assert columns[0][0] == 0 and columns[-1][1] == len(heights)
+    for column, (start, end) in enumerate(columns):
+        assert sum(heights[start:end]) <= column_layout.capacity(column)
+        # 欄位已滿：下一題放不進來
+        if end < len(heights):
+            assert sum(heights[start:end + 1]) > column_layout.capacity(column)
+
+    pages = column_layout.pages()
+    assert len(pages) == (len(columns) + 1) // 2
+    (start, split), (_, end) = pages[-1]
+    assert split == start + balance(heights[start:end], column_layout.capacity(2 * (len(pages) - 1)))
+
+
+def test_incremental_pack_matches_fresh_pack():
+    heights = make_heights(60)
+    keys = [f'q{i}' for i in range(len(heights))]
+    column_layout = ColumnLayout(column_height=700, first_page_height=500)
+    column_layout.pack(keys, heights)
+
+    # 替換中間一題並刪除一題
+    keys[30], heights[30] = 'new', 35.0
+    del keys[45], heights[45]
+    columns = column_layout.pack(keys, heights)
+    fresh = ColumnLayout(column_height=700, first_page_height=500)
+    assert columns == fresh.pack(keys, heights)
+    assert column_layout.pages() == fresh.pages()
+    assert column_layout.repacked < len(keys)
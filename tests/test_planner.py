@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from bank_store import DIFFICULTY_CODES, BankBuilder
+from dedup import DuplicateIndex
+from planner import InfeasibleSelection, select_planned
+
+rng = np.random.default_rng(11)
+
+
+def random_text(n=30):
+    return ''.join(chr(0x4e00 + int(code)) for code in rng.integers(0, 20000, n))
+
+
+def make_bank(texts, difficulties=None):
+    builder = BankBuilder()
+    for i, text in enumerate(texts):
+        level = DIFFICULTY_CODES[difficulties[i]] if difficulties else DIFFICULTY_CODES['中']
+        builder.append(i, level, 1, [str(i + 1), text, '甲', '乙', '丙', '丁'])
+    return builder.build()
+
+
+def test_duplicates_are_refilled_from_other_banks():
+    base = random_text()
+    # 題庫 1 的 8 題彼此近似重複，只能提供 3 題不重複的題目，其餘由題庫 2 補足
+    crowded = make_bank([base + '題' * k for k in range(8)] + [random_text(), random_text()])
+    banks = [crowded, make_bank([random_text() for _ in range(10)])]
+    index = DuplicateIndex.build(banks)
+
+    [paper] = select_planned(banks, 1, [5, 5], [[0, 0]], rng=np.random.default_rng(0), duplicates=index)
+    assert sum(len(positions) for positions in paper.values()) == 10
+    assert len(paper[0]) == 3
+    groups = [index.group_of[b][pos] for b, positions in paper.items() for pos in positions.tolist()
+              if pos in index.group_of[b]]
+    assert len(groups) == len(set(groups)) == 1
+
+
+def test_too_many_duplicates_raises():
+    base = random_text()
+    banks = [make_bank([base + '題' * k for k in range(8)] + [random_text(), random_text()]),
+             make_bank([base + '問' * k for k in range(10)])]
+    with pytest.raises(InfeasibleSelection) as e:
+        select_planned(banks, 1, [5, 5], [[0, 0]], rng=np.random.default_rng(0),
+                       duplicates=DuplicateIndex.build(banks))
+    assert e.value.constraint == 'duplicates'
+
+
+def test_plan_meets_totals_and_difficulty_targets():
+    levels = ['難'] * 6 + ['中'] * 10 + ['易'] * 8
+    banks = [make_bank([random_text() for _ in levels], levels), make_bank([random_text() for _ in levels], levels)]
+    papers = select_planned(banks, 2, [6, 4], [[2, 1], [1, 1]], bank_minimums=[2, 2],
+                            difficulty_targets=[{'難': 3, '易': 2}, {'難': 2}], rng=np.random.default_rng(1))
+
+    hard, easy = DIFFICULTY_CODES['難'], DIFFICULTY_CODES['易']
+    for paper, (n_hard, n_easy) in zip(papers, [(3, 2), (2, None)]):
+        codes = np.concatenate([banks[b].difficulty[positions] for b, positions in paper.items()])
+        assert len(codes) == 10
+        assert (codes == hard).sum() == n_hard
+        if n_easy is not None:
+            assert (codes == easy).sum() == n_easy
+        assert all(len(positions) >= 2 for positions in paper.values())
+        assert all(len(set(positions.tolist())) == len(positions) for positions in paper.values())
+    # 預設兩卷不重複使用題目
+    for b in range(2):
+        assert not set(papers[0][b].tolist()) & set(papers[1][b].tolist())
+
+
+@pytest.mark.parametrize('kwargs,constraint', [
+    (dict(n_variants=3, total_distribution=[5, 5], hard_distributions=[[0, 0]] * 3), 'total'),
+    (dict(n_variants=1, total_distribution=[5, 5], hard_distributions=[[4, 4]]), 'difficulty'),
+    (dict(n_variants=1, total_distribution=[5, 5], hard_distributions=[[0, 0]], bank_minimums=[6, 5]),
+     'bank_minimum'),
+])
+def test_infeasible_constraints_raise(kwargs, constraint):
+    levels = ['難'] * 3 + ['中'] * 9
+    banks = [make_bank([random_text() for _ in levels], levels), make_bank([random_text() for _ in levels], levels)]
+    with pytest.raises(InfeasibleSelection) as e:
+        select_planned(banks, rng=np.random.default_rng(0), **kwargs)
+    assert e.value.constraint == constraint
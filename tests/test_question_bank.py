@@ -0,0 +1,50 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+import question_bank
+from bank_store import CompactBank
+from question_bank import load_bank, read_bank, stream_bank
+
+
+def make_workbook():
+    df = pd.DataFrame({
+        '序號': [1, 2, 3, 4, 5, 6],
+        '難度 ': ['難', ' 易', '', '中', '其他', '難'],
+        '答案': [2, 3.0, '4', None, 'x', 1],
+        '題目': ['甲題', '乙題', '丙題', '丁題', None, '己題'],
+        '選項1': ['a', 'b', 'c', 'd', 'e', 1.5],
+        '選項2': ['a2', 'b2', None, 'd2', 'e2', 'f2'],
+        '選項3': ['a3', 'b3', 'c3', 'd3', 'e3', 'f3'],
+        '選項4': ['a4', 'b4', 'c4', 'd4', 'e4', 'f4'],
+        '備註': ['', '', '', '', '', ''],
+    })
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def assert_same_bank(left, right):
+    assert len(left) == len(right)
+    assert np.array_equal(left.index, right.index)
+    assert np.array_equal(left.difficulty, right.difficulty)
+    assert np.array_equal(left.answer, right.answer)
+    pd.testing.assert_frame_equal(left.to_frame(), right.to_frame())
+
+
+def test_stream_bank_matches_normalize_bank():
+    data = make_workbook()
+    streamed = stream_bank(data)
+    # 題目或答案空白的列被略過，其餘保留原始列索引
+    assert streamed.index.tolist() == [0, 1, 2, 5]
+    assert_same_bank(streamed, CompactBank.from_frame(read_bank(data)))
+
+
+def test_load_bank_returns_streamed_bank(tmp_path):
+    question_bank.clear_bank_cache()
+    data = make_workbook()
+    digest, bank = load_bank(data, store_dir=str(tmp_path))
+    assert bank.digest == digest
+    assert_same_bank(bank, stream_bank(data))
+    question_bank.clear_bank_cache()
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bank_store import DIFFICULTY_CODES
+from sampler import compat_seeds, draw_compat
+
+
+def legacy_select(df, total, hard, seed_shuffle, random_seed, prefer_easy=False):
+    """舊版 generate_exam 以 DataFrame.sample 抽題的流程。"""
+    df = df.sample(frac=1, random_state=seed_shuffle)
+    df_hard = df[df['難度'] == '難']
+    df_easy = df[df['難度'] == '易']
+    n_hard = min(hard, len(df_hard))
+    additional_hard = df_hard.sample(n=n_hard, random_state=random_seed) if n_hard > 0 else pd.DataFrame()
+    df_remaining = df[~df.index.isin(additional_hard.index)]
+    remaining = total - len(additional_hard)
+    parts = [additional_hard]
+    if prefer_easy:
+        n_easy = min(remaining, len(df_easy))
+        additional_easy = df_easy.sample(n=n_easy, random_state=random_seed) if n_easy > 0 else pd.DataFrame()
+        df_remaining = df_remaining[~df_remaining.index.isin(additional_easy.index)]
+        remaining -= len(additional_easy)
+        parts.append(additional_easy)
+    n_rest = min(remaining, len(df_remaining))
+    parts.append(df_remaining.sample(n=n_rest, random_state=random_seed) if n_rest > 0 else pd.DataFrame())
+    return pd.concat(parts).sample(frac=1, random_state=random_seed).index.tolist()
+
+
+def make_frame(n, seed=3):
+    levels = np.random.default_rng(seed).choice(['難', '中', '易'], n, p=[0.2, 0.5, 0.3])
+    return pd.DataFrame({'難度': levels})
+
+
+@pytest.mark.parametrize('bank_no,variant,prefer_easy', [(0, 0, False), (1, 0, False), (0, 1, True), (2, 1, True)])
+def test_draw_compat_matches_dataframe_sample(bank_no, variant, prefer_easy):
+    df = make_frame(200)
+    difficulty = df['難度'].map(DIFFICULTY_CODES).to_numpy(dtype=np.uint8)
+    shuffle_seed, seed = compat_seeds(bank_no, variant)
+
+    expected = legacy_select(df, 30, 8, shuffle_seed, seed, prefer_easy)
+    selected = draw_compat(difficulty, 30, 8, shuffle_seed, seed, prefer_easy)
+    assert selected.tolist() == expected
+
+
+def test_draw_compat_matches_dataframe_sample_with_exclusions():
+    df = make_frame(120, seed=5)
+    difficulty = df['難度'].map(DIFFICULTY_CODES).to_numpy(dtype=np.uint8)
+    used = draw_compat(difficulty, 25, 5, *compat_seeds(0, 0))
+
+    # B 卷排除 A 卷已抽的題目，且難題不足時以其他題目補足
+    expected = legacy_select(df[~df.index.isin(used)], 25, 40, *compat_seeds(0, 1), prefer_easy=True)
+    selected = draw_compat(difficulty, 25, 40, *compat_seeds(0, 1), prefer_easy=True, exclude=used)
+    assert selected.tolist() == expected
+    assert not set(selected) & set(used)
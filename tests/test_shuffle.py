@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from shuffle import OPTION_COLUMNS, answer_codes, pinned_options, shuffle_options, student_papers, student_permutations
+
+
+def make_questions(n=40):
+    rows = []
+    for i in range(n):
+        options = [f'第{i}題{name}' for name in '甲乙丙丁']
+        if i % 5 == 0:
+            options[3] = '以上皆是'
+        if i % 7 == 0:
+            options[2] = '(1)(2)皆正確'
+        rows.append({'序號': str(i + 1), '難度': '中', '答案': str(i % 4 + 1) if i != 3 else '', '題目': f'題目{i}',
+                     **dict(zip(OPTION_COLUMNS, options))})
+    return pd.DataFrame(rows)
+
+
+def correct_text(questions):
+    return [row[f'選項{row["答案"]}'] if row['答案'] else None for _, row in questions.iterrows()]
+
+
+def test_shuffle_remaps_answers_and_keeps_pinned_options():
+    questions = make_questions()
+    shuffled, perm = shuffle_options(questions, np.random.default_rng(0))
+
+    # 換算後的答案仍指向同一個選項內容，無答案的題目保持空白
+    assert correct_text(shuffled) == correct_text(questions)
+    assert shuffled.loc[3, '答案'] == ''
+    for i in range(len(questions)):
+        assert sorted(shuffled.loc[i, OPTION_COLUMNS]) == sorted(questions.loc[i, OPTION_COLUMNS])
+
+    pinned = pinned_options(questions)
+    assert pinned[5, 3] and not pinned[5, :3].any()
+    assert pinned[7].all()
+    original = questions[OPTION_COLUMNS].to_numpy()
+    assert (shuffled[OPTION_COLUMNS].to_numpy()[pinned] == original[pinned]).all()
+    assert (perm[pinned] == np.nonzero(pinned)[1]).all()
+    # 確實有重排
+    assert (perm != np.arange(4)).any()
+
+
+def test_student_papers_keep_answers_consistent():
+    questions = make_questions(12)
+    answers = answer_codes(questions)
+    orders, perms = student_permutations(answers, pinned_options(questions), 3, np.random.default_rng(1))
+    for order, paper in zip(orders, student_papers(questions, orders, perms, answers)):
+        expected = [correct_text(questions)[i] for i in order.astype(np.intp)]
+        assert correct_text(paper) == expected
@@ -0,0 +1,85 @@
+"""題目使用紀錄：跨班級、跨次數保存哪些題目已經出過，抽題時可排除其他班級近期用過的題目。
+
+題庫以「科目/題庫名稱」識別（見 bank_id），題目以序號識別：題庫在 Excel 中重新存檔、
+修改或新增題目後，先前的使用紀錄仍然有效。紀錄存在 SQLite（依題庫、日期建索引），
+即使累積多年紀錄，查詢一個題庫的近期已用題目也只會讀取該題庫在期間內的索引範圍。
+"""
+import datetime
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+USAGE_DB_PATH = os.environ.get('EXAM_USAGE_DB', os.path.join(os.path.expanduser('~'), '.exam_generator', 'usage.sqlite3'))
+# 預設排除其他班級一年內用過的題目
+AVOID_REUSE_DAYS = 365
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    bank_id TEXT NOT NULL,
+    serial TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    used_on TEXT NOT NULL,
+    exam_type TEXT,
+    subject TEXT,
+    paper TEXT NOT NULL,
+    -- 同時作為查詢索引：依題庫、日期範圍取出序號與班級，不必讀取資料列
+    UNIQUE (bank_id, used_on, serial, class_name, paper)
+);
+"""
+
+
+def bank_id(subject, name):
+    """使用紀錄中的題庫識別：科目加上題庫名稱（檔名去掉副檔名）。"""
+    return f"{subject}/{os.path.splitext(os.path.basename(name))[0]}"
+
+
+class UsageStore:
+    """SQLite 使用紀錄。每個執行緒使用各自的連線。"""
+
+    def __init__(self, path=None):
+        self.path = path or USAGE_DB_PATH
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def record(self, identity, serials, class_name, paper, exam_type=None, subject=None, used_on=None):
+        """記錄一份試卷從某題庫（bank_id）使用的題目序號（沒有序號的題目無法識別，不記錄）。"""
+        used_on = (used_on or datetime.date.today()).isoformat()
+        rows = [(identity, str(serial), class_name, used_on, exam_type, subject, paper) for serial in serials if serial != '']
+        with self._connect() as conn:
+            conn.executemany('INSERT OR IGNORE INTO usage VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def recent_serials(self, identity, days=AVOID_REUSE_DAYS, exclude_class=None, today=None):
+        """回傳某題庫（bank_id）在最近 days 天內被使用過的題目序號（可排除本班自己的紀錄）。"""
+        since = ((today or datetime.date.today()) - datetime.timedelta(days=days)).isoformat()
+        query = 'SELECT DISTINCT serial FROM usage WHERE bank_id = ? AND used_on >= ?'
+        params = [identity, since]
+        if exclude_class is not None:
+            query += ' AND class_name != ?'
+            params.append(exclude_class)
+        return {row[0] for row in self._connect().execute(query, params)}
+
+    def recent_positions(self, bank, identity, days=AVOID_REUSE_DAYS, exclude_class=None, today=None):
+        """將 identity（bank_id）近期用過的序號對應為 bank（CompactBank）目前的列位置陣列。"""
+        serials = self.recent_serials(identity, days, exclude_class, today)
+        return bank.positions_of(serials) if serials else np.empty(0, dtype=np.intp)
+
+    def record_selections(self, banks, bank_ids, selections, paper_names, class_name, exam_type=None, subject=None,
+                          used_on=None):
+        """記錄 select_variants / select_planned 的結果，bank_ids 為各題庫的 bank_id。"""
+        for selection, paper in zip(selections, paper_names):
+            for i, positions in selection.items():
+                self.record(bank_ids[i], banks[i].text['序號'].take(positions), class_name, paper,
+                            exam_type, subject, used_on)